@@ -0,0 +1,510 @@
+"""
+Array-backed storage for the abstract syntax tree of very large programs.
+
+Pass an AstArena to the Parser as its builder and it stores every node as
+a row of parallel arrays instead of a Python object:
+
+    arena = Parser(tokens, AstArena()).parse()
+    print(arena.render_tree())
+
+The text of a Number literal is read into an int or a float once, when it
+is added to the string table, and later stages take the value from there.
+"""
+
+from array import array
+
+from lexer import Token
+
+# Node kinds and the operator kinds, named like the operator tokens
+NODE_KINDS = (
+    "Program",
+    "VariableDeclaration",
+    "Identifier",
+    "Number",
+    "EmptyStatement",
+    "Assignment",
+    "Increment",
+    "Decrement",
+    "If",
+    "TrueBranch",
+    "FalseBranch",
+    "While",
+    "DoWhile",
+    "Input",
+    "Output",
+    "LT",
+    "LE",
+    "GT",
+    "GE",
+    "EQ",
+    "NE",
+    "AND",
+    "OR",
+    "PLUS",
+    "MINUS",
+    "TIMES",
+    "DIVIDE",
+    "MOD",
+    "POW",
+    "InputTarget",
+)
+NODE_KIND_CODES = {kind: code for code, kind in enumerate(NODE_KINDS)}
+
+(
+    PROGRAM,
+    VARIABLE_DECLARATION,
+    IDENTIFIER,
+    NUMBER,
+    EMPTY_STATEMENT,
+    ASSIGNMENT,
+    INCREMENT,
+    DECREMENT,
+    IF,
+    TRUE_BRANCH,
+    FALSE_BRANCH,
+    WHILE,
+    DO_WHILE,
+    INPUT,
+    OUTPUT,
+    LT,
+    LE,
+    GT,
+    GE,
+    EQ,
+    NE,
+    AND,
+    OR,
+    PLUS,
+    MINUS,
+    TIMES,
+    DIVIDE,
+    MOD,
+    POW,
+    INPUT_TARGET,
+) = range(len(NODE_KINDS))
+
+# Values shown for the kinds whose value is always the same. Their value
+# column is free, so an Input keeps the name of its target there.
+FIXED_VALUES = {
+    PROGRAM: "main",
+    ASSIGNMENT: "=",
+    INCREMENT: "++",
+    DECREMENT: "--",
+    IF: "if",
+    TRUE_BRANCH: "true_branch",
+    FALSE_BRANCH: "false_branch",
+    WHILE: "while",
+    DO_WHILE: "do_while",
+    INPUT: "cin",
+    OUTPUT: "cout",
+}
+
+NO_NODE = -1
+
+# What a string of the table stands for as a Number literal: nothing, an
+# int or a float kept in the literal columns, or an int that does not fit
+# in 64 bits, whose value is not kept
+NOT_LITERAL, INT_LITERAL, REAL_LITERAL, WIDE_LITERAL = range(4)
+NO_LITERAL = (NOT_LITERAL, 0)
+
+MIN_INT = -(2**63)
+MAX_INT = 2**63 - 1
+
+
+def read_literal(text):
+    """The literal type and the int or float of the text of a Number"""
+    if "." in text:
+        return REAL_LITERAL, float(text)
+    value = int(text)
+    if not MIN_INT <= value <= MAX_INT:
+        return WIDE_LITERAL, 0
+    return INT_LITERAL, value
+
+
+class AstArena:
+    """
+    Struct-of-arrays storage for an AST.
+
+    Every node is an index into parallel arrays: its kind code, its value
+    as an index into a string table shared by every node, the index of its
+    first child and of its next sibling, and its source span as the line
+    and column of its first and last tokens. Traversals run over the
+    arrays, and NodeView objects are only built when asked for. Three more
+    arrays, parallel to the string table, keep the literal type and the
+    value of the strings that are Number literals.
+    """
+
+    __slots__ = (
+        "kinds",
+        "value_ids",
+        "first_children",
+        "next_siblings",
+        "start_linenos",
+        "start_lexposes",
+        "end_linenos",
+        "end_lexposes",
+        "strings",
+        "literal_types",
+        "literal_ints",
+        "literal_reals",
+        "root",
+        "_string_ids",
+        "_tokens",
+    )
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.value_ids = array("I")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.start_linenos = array("I")
+        self.start_lexposes = array("I")
+        self.end_linenos = array("I")
+        self.end_lexposes = array("I")
+        # Index 0 stands for no value
+        self.strings = [None]
+        self.literal_types = array("B", [NOT_LITERAL])
+        self.literal_ints = array("q", [0])
+        self.literal_reals = array("d", [0.0])
+        self.root = NO_NODE
+        self._string_ids = {None: 0}
+        self._tokens = None
+
+    def add(self, kind, value, children, first, last):
+        """
+        Appends a node whose children are already in the arena.
+
+        Args:
+            kind (int): The kind code of the node
+            value (str): Its value, None if it has none
+            children (list[int]): Its children, in order
+            first (int): Index of its first token
+            last (int): Index of its last token
+
+        Returns:
+            int: The index of the node
+        """
+        first_token = self._tokens[first]
+        last_token = self._tokens[last]
+        return self.add_spanned(
+            kind,
+            value,
+            children,
+            first_token.lineno,
+            first_token.lexpos,
+            last_token.lineno,
+            last_token.lexpos,
+        )
+
+    def add_spanned(
+        self, kind, value, children, start_lineno, start_lexpos, end_lineno, end_lexpos
+    ):
+        """
+        Appends a node like add, with its span given as the line and column
+        of its first and last tokens, for arenas built from another arena.
+        """
+        index = len(self.kinds)
+        value_id = self._string_ids.get(value)
+        if value_id is None:
+            # The text of a Number is never the value of another kind
+            value_id = self.intern(
+                value, read_literal(value) if kind == NUMBER else NO_LITERAL
+            )
+        self.kinds.append(kind)
+        self.value_ids.append(value_id)
+        if children:
+            self.first_children.append(children[0])
+            next_siblings = self.next_siblings
+            for child, sibling in zip(children, children[1:]):
+                next_siblings[child] = sibling
+        else:
+            self.first_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.start_linenos.append(start_lineno)
+        self.start_lexposes.append(start_lexpos)
+        self.end_linenos.append(end_lineno)
+        self.end_lexposes.append(end_lexpos)
+        return index
+
+    def intern(self, value, literal=NO_LITERAL):
+        """
+        The id of a value in the string table. A new one is added with the
+        literal type and value it stands for, as read_literal gives them.
+        """
+        value_id = self._string_ids.get(value)
+        if value_id is None:
+            value_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            literal_type, number = literal
+            self.literal_types.append(literal_type)
+            if literal_type == REAL_LITERAL:
+                self.literal_ints.append(0)
+                self.literal_reals.append(number)
+            else:
+                self.literal_ints.append(number)
+                self.literal_reals.append(0.0)
+        return value_id
+
+    # Builder methods called by the Parser
+
+    def begin(self, tokens):
+        # A program recovered from no tokens at all still has a span
+        self._tokens = tokens if tokens else [Token("EOF", "", 1, 1)]
+
+    def finish(self, program):
+        self.root = program
+        self._tokens = None
+        return self
+
+    def program(self, first, last, declarations, statements):
+        return self.add(PROGRAM, None, declarations + statements, first, last)
+
+    def variable_declaration(self, first, last, type, identifiers):
+        return self.add(VARIABLE_DECLARATION, type, identifiers, first, last)
+
+    def identifier(self, first, last, name):
+        return self.add(IDENTIFIER, name, None, first, last)
+
+    def number(self, first, last, value):
+        return self.add(NUMBER, value, None, first, last)
+
+    def empty_statement(self, first, last):
+        return self.add(EMPTY_STATEMENT, None, None, first, last)
+
+    def assignment(self, first, last, target, expression):
+        return self.add(ASSIGNMENT, None, [target, expression], first, last)
+
+    def increment(self, first, last, target):
+        return self.add(INCREMENT, None, [target], first, last)
+
+    def decrement(self, first, last, target):
+        return self.add(DECREMENT, None, [target], first, last)
+
+    def if_statement(self, first, last, condition, true_branch, false_branch=None):
+        children = [condition, true_branch]
+        if false_branch is not None:
+            children.append(false_branch)
+        return self.add(IF, None, children, first, last)
+
+    def true_branch(self, first, last, statements):
+        return self.add(TRUE_BRANCH, None, statements, first, last)
+
+    def false_branch(self, first, last, statements):
+        return self.add(FALSE_BRANCH, None, statements, first, last)
+
+    def while_loop(self, first, last, condition, body):
+        return self.add(WHILE, None, [condition] + body, first, last)
+
+    def do_while_loop(self, first, last, body, condition):
+        return self.add(DO_WHILE, None, body + [condition], first, last)
+
+    def input(self, first, last, target):
+        # The target stays out of the tree, like in the Input nodes, marked
+        # so it is not taken for a use of the variable
+        self.kinds[target] = INPUT_TARGET
+        return self.add(INPUT, self.value(target), None, first, last)
+
+    def output(self, first, last, expression):
+        return self.add(OUTPUT, None, [expression], first, last)
+
+    def binary_operation(self, first, last, name, value, left, right):
+        return self.add(NODE_KIND_CODES[name], value, [left, right], first, last)
+
+    # Reading the nodes
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def name(self, index):
+        return NODE_KINDS[self.kinds[index]]
+
+    def value(self, index):
+        """The value of a node as the Node classes show it"""
+        kind = self.kinds[index]
+        if kind in FIXED_VALUES:
+            return FIXED_VALUES[kind]
+        return self.strings[self.value_ids[index]]
+
+    def target(self, index):
+        """Name of the identifier read by an Input node"""
+        return self.strings[self.value_ids[index]]
+
+    def literal(self, index):
+        """The int or float of a Number node, None if it does not fit in 64 bits"""
+        value_id = self.value_ids[index]
+        literal_type = self.literal_types[value_id]
+        if literal_type == INT_LITERAL:
+            return self.literal_ints[value_id]
+        if literal_type == REAL_LITERAL:
+            return self.literal_reals[value_id]
+        return None
+
+    def is_real(self, index):
+        """Whether a Number node is a float literal"""
+        return self.literal_types[self.value_ids[index]] == REAL_LITERAL
+
+    def input_target(self, index):
+        """Index of the InputTarget node of an Input node, added right before it"""
+        target = index - 1
+        if self.kinds[index] != INPUT or self.kinds[target] != INPUT_TARGET:
+            raise ValueError(f"Node {index} is not an Input after its target")
+        return target
+
+    def span(self, index):
+        """Line and column of the first and last tokens of a node"""
+        return (
+            self.start_linenos[index],
+            self.start_lexposes[index],
+            self.end_linenos[index],
+            self.end_lexposes[index],
+        )
+
+    def children(self, index):
+        """Yields the indexes of the children of a node"""
+        child = self.first_children[index]
+        next_siblings = self.next_siblings
+        while child != NO_NODE:
+            yield child
+            child = next_siblings[child]
+
+    def preorder(self, index=None):
+        """Yields (index, depth) of a node and its descendants, in order"""
+        first_children = self.first_children
+        next_siblings = self.next_siblings
+        node = self.root if index is None else index
+        if node == NO_NODE:
+            return
+        ancestors = []
+        while True:
+            yield node, len(ancestors)
+            child = first_children[node]
+            if child != NO_NODE:
+                ancestors.append(node)
+                node = child
+                continue
+            while ancestors and next_siblings[node] == NO_NODE:
+                node = ancestors.pop()
+            if not ancestors:
+                return
+            node = next_siblings[node]
+
+    def render_tree(self, index=None):
+        """The same text as Parser.render_tree, built over the arrays"""
+        first_children = self.first_children
+        next_siblings = self.next_siblings
+        strings = self.strings
+        value_ids = self.value_ids
+        kinds = self.kinds
+        node = self.root if index is None else index
+        if node == NO_NODE:
+            return ""
+
+        lines = []
+        ancestors = []
+        # Indent of the children of every ancestor
+        indents = []
+        pre = ""
+        while True:
+            kind = kinds[node]
+            if kind in FIXED_VALUES:
+                value = FIXED_VALUES[kind]
+            else:
+                value = strings[value_ids[node]]
+            lines.append(f"{pre}{value if value else NODE_KINDS[kind]}\n")
+
+            child = first_children[node]
+            if child != NO_NODE:
+                if not ancestors:
+                    indent = ""
+                elif next_siblings[node] == NO_NODE:
+                    indent = indents[-1] + "    "
+                else:
+                    indent = indents[-1] + "│   "
+                ancestors.append(node)
+                indents.append(indent)
+                node = child
+            else:
+                while ancestors and next_siblings[node] == NO_NODE:
+                    node = ancestors.pop()
+                    indents.pop()
+                if not ancestors:
+                    break
+                node = next_siblings[node]
+            if next_siblings[node] == NO_NODE:
+                pre = indents[-1] + "└── "
+            else:
+                pre = indents[-1] + "├── "
+        return "".join(lines)
+
+    def view(self, index):
+        return NodeView(self, index)
+
+    def root_view(self):
+        return NodeView(self, self.root)
+
+    def nbytes(self):
+        """Bytes used by the columns, not counting the string table"""
+        columns = (
+            self.kinds,
+            self.value_ids,
+            self.first_children,
+            self.next_siblings,
+            self.start_linenos,
+            self.start_lexposes,
+            self.end_linenos,
+            self.end_lexposes,
+        )
+        return sum(column.itemsize * len(column) for column in columns)
+
+    # The string ids are rebuilt from the table, so pickles stay small and
+    # an arena can be sent to worker processes.
+
+    def __getstate__(self):
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if not name.startswith("_")
+        }
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._string_ids = {string: id for id, string in enumerate(self.strings)}
+        self._tokens = None
+
+
+class NodeView:
+    """
+    A node of an arena seen as a Node: it has a name, a value and children,
+    so RenderTree, DotExporter and the syntactic panel can walk it.
+    """
+
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena: AstArena, index: int):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def name(self):
+        return self.arena.name(self.index)
+
+    @property
+    def value(self):
+        return self.arena.value(self.index)
+
+    @property
+    def span(self):
+        return self.arena.span(self.index)
+
+    @property
+    def children(self):
+        arena = self.arena
+        return tuple(NodeView(arena, child) for child in arena.children(self.index))
+
+    def __str__(self):
+        value = self.value
+        if value:
+            return f"{value}"
+        else:
+            return f"{self.name}"
@@ -0,0 +1,219 @@
+"""
+Binary file format for an AstArena, read back through mmap:
+
+    with open("program.ast", "wb") as f:
+        write_ast(arena, f)
+    tree = load_ast("program.ast")
+    print(tree.render_tree())
+    tree.close()
+
+The file is a header and then, each starting at a multiple of 8 bytes,
+the columns of the arena in little endian (kinds, value ids, first
+children, next siblings and the start and end lines and columns), the
+offsets of the strings of the string table, the literal types, ints and
+floats of the strings and the UTF-8 text of them.
+Loading maps the file and casts the columns in place, so nothing is
+decoded until a node is read, and a tool that reads part of the tree only
+touches the pages of that part.
+
+FORMAT_VERSION changes whenever the layout or ast_arena.NODE_KINDS do.
+"""
+
+from array import array
+from pathlib import Path
+import mmap
+import struct
+import sys
+
+from ast_arena import AstArena
+
+MAGIC = b"ASTB"
+FORMAT_VERSION = 3
+# Magic, version, node count, string count, root
+HEADER = struct.Struct("<4sHxxIIi")
+ALIGNMENT = 8
+
+# The columns after the kinds, all of 4 byte items
+INT_COLUMNS = (
+    ("value_ids", "I"),
+    ("first_children", "i"),
+    ("next_siblings", "i"),
+    ("start_linenos", "I"),
+    ("start_lexposes", "I"),
+    ("end_linenos", "I"),
+    ("end_lexposes", "I"),
+)
+
+# The columns parallel to the string table, after its offsets
+LITERAL_COLUMNS = (
+    ("literal_types", "B"),
+    ("literal_ints", "q"),
+    ("literal_reals", "d"),
+)
+
+NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class FormatError(ValueError):
+    """The file is not an AST file this version can read"""
+
+
+def padding(offset):
+    return -offset % ALIGNMENT
+
+
+def write_ast(arena: AstArena, stream):
+    """
+    Writes an arena to a binary stream, in one pass.
+
+    Returns:
+        int: The bytes written
+    """
+    strings = arena.strings
+    texts = [b""] + [strings[i].encode("utf-8") for i in range(1, len(strings))]
+    offsets = array("I", [0])
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+
+    columns = [(arena.kinds, "B")]
+    columns += [(getattr(arena, name), code) for name, code in INT_COLUMNS]
+    columns.append((offsets, "I"))
+    columns += [(getattr(arena, name), code) for name, code in LITERAL_COLUMNS]
+    written = stream.write(
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(arena), len(texts), arena.root)
+    )
+    for column, code in columns:
+        written += stream.write(b"\0" * padding(written))
+        if not NATIVE_LITTLE_ENDIAN:
+            column = array(code, column)
+            column.byteswap()
+        written += stream.write(column)
+    written += stream.write(b"\0" * padding(written))
+    for text in texts:
+        written += stream.write(text)
+    return written
+
+
+class MappedStrings:
+    """String table of a mapped file, decoding every string when read"""
+
+    __slots__ = ("offsets", "text")
+
+    def __init__(self, offsets, text):
+        self.offsets = offsets
+        self.text = text
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        # String 0 stands for no value, like in AstArena
+        if index == 0:
+            return None
+        offsets = self.offsets
+        return str(self.text[offsets[index] : offsets[index + 1]], "utf-8")
+
+
+class MappedArena(AstArena):
+    """
+    A read-only AstArena whose columns are views of a mapped file. It
+    renders, walks and gives NodeViews like the arena it was written from.
+    Close it, or use it in a with block, to unmap the file.
+    """
+
+    __slots__ = ("_map",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is None:
+            return
+        columns = [getattr(self, name) for name, _ in INT_COLUMNS]
+        columns += [getattr(self, name) for name, _ in LITERAL_COLUMNS]
+        columns += [self.kinds, self.strings.offsets, self.strings.text]
+        release(columns)
+        self._map.close()
+        self._map = None
+
+
+def load_ast(path: Path):
+    """
+    Maps an AST file. The columns are read from the file as the nodes are,
+    except on big endian machines, where they are copied and swapped.
+
+    Returns:
+        MappedArena: The tree
+    """
+    with open(path, "rb") as f:
+        size = Path(path).stat().st_size
+        if size < HEADER.size:
+            raise FormatError(f"{path} is not an AST file")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    columns = {}
+    try:
+        magic, version, nodes, strings, root = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise FormatError(f"{path} is not an AST file")
+        if version != FORMAT_VERSION:
+            raise FormatError(
+                f"{path} has AST format {version}, this version reads {FORMAT_VERSION}"
+            )
+
+        view = memoryview(data)
+        try:
+            offset = HEADER.size
+            sections = [("kinds", "B", nodes)]
+            sections += [(name, code, nodes) for name, code in INT_COLUMNS]
+            sections.append(("offsets", "I", strings + 1))
+            sections += [(name, code, strings) for name, code in LITERAL_COLUMNS]
+            for name, code, count in sections:
+                offset += padding(offset)
+                end = offset + count * struct.calcsize(code)
+                if end > size:
+                    raise FormatError(f"{path} is truncated")
+                columns[name] = column(view[offset:end], code)
+                offset = end
+            offset += padding(offset)
+            end = offset + columns["offsets"][-1]
+            if end > size:
+                raise FormatError(f"{path} is truncated")
+            text = view[offset:end]
+        finally:
+            # The columns keep the mapping exported on their own
+            view.release()
+    except BaseException:
+        release(columns.values())
+        data.close()
+        raise
+
+    arena = MappedArena.__new__(MappedArena)
+    for name, values in columns.items():
+        if name != "offsets":
+            setattr(arena, name, values)
+    arena.strings = MappedStrings(columns["offsets"], text)
+    arena.root = root
+    arena._string_ids = None
+    arena._tokens = None
+    arena._map = data
+    return arena
+
+
+def column(view, code):
+    if code == "B":
+        return view
+    if NATIVE_LITTLE_ENDIAN:
+        return view.cast(code)
+    values = array(code, view.tobytes())
+    values.byteswap()
+    return values
+
+
+def release(columns):
+    """Releases the views of the mapped file among columns"""
+    for values in columns:
+        if isinstance(values, memoryview):
+            values.release()
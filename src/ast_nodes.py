@@ -0,0 +1,273 @@
+"""
+Nodes of the abstract syntax tree built by parser_s.
+
+Every node keeps its parts in typed fields (If.condition, Assignment.target,
+...) and has no __dict__. The name, value and children properties present
+the node the way the anytree nodes it replaces did, without copying it, so
+RenderTree, DotExporter and the syntactic panel walk it unchanged.
+"""
+
+
+class Node:
+    """Base of every node, printed as its value or else its name"""
+
+    __slots__ = ()
+    name = "Node"
+    value = None
+    children = ()
+
+    def __str__(self):
+        if self.value:
+            return f"{self.value}"
+        else:
+            return f"{self.name}"
+
+
+class Program(Node):
+    __slots__ = ("declarations", "statements")
+    name = "Program"
+    value = "main"
+
+    def __init__(self, declarations, statements):
+        self.declarations = declarations
+        self.statements = statements
+
+    @property
+    def children(self):
+        return (*self.declarations, *self.statements)
+
+
+class VariableDeclaration(Node):
+    __slots__ = ("type", "identifiers")
+    name = "VariableDeclaration"
+
+    def __init__(self, type, identifiers):
+        self.type = type
+        self.identifiers = identifiers
+
+    @property
+    def value(self):
+        return self.type
+
+    @property
+    def children(self):
+        return tuple(self.identifiers)
+
+
+class Identifier(Node):
+    __slots__ = ("value",)
+    name = "Identifier"
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Number(Node):
+    __slots__ = ("value",)
+    name = "Number"
+
+    def __init__(self, value):
+        self.value = value
+
+
+class EmptyStatement(Node):
+    __slots__ = ()
+    name = "EmptyStatement"
+
+
+class Assignment(Node):
+    __slots__ = ("target", "expression")
+    name = "Assignment"
+    value = "="
+
+    def __init__(self, target, expression):
+        self.target = target
+        self.expression = expression
+
+    @property
+    def children(self):
+        return (self.target, self.expression)
+
+
+class Increment(Node):
+    __slots__ = ("target",)
+    name = "Increment"
+    value = "++"
+
+    def __init__(self, target):
+        self.target = target
+
+    @property
+    def children(self):
+        return (self.target,)
+
+
+class Decrement(Increment):
+    __slots__ = ()
+    name = "Decrement"
+    value = "--"
+
+
+class TrueBranch(Node):
+    __slots__ = ("statements",)
+    name = "TrueBranch"
+    value = "true_branch"
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    @property
+    def children(self):
+        return tuple(self.statements)
+
+
+class FalseBranch(TrueBranch):
+    __slots__ = ()
+    name = "FalseBranch"
+    value = "false_branch"
+
+
+class If(Node):
+    __slots__ = ("condition", "true_branch", "false_branch")
+    name = "If"
+    value = "if"
+
+    def __init__(self, condition, true_branch, false_branch=None):
+        self.condition = condition
+        self.true_branch = true_branch
+        self.false_branch = false_branch
+
+    @property
+    def children(self):
+        if self.false_branch is None:
+            return (self.condition, self.true_branch)
+        return (self.condition, self.true_branch, self.false_branch)
+
+
+class While(Node):
+    __slots__ = ("condition", "body")
+    name = "While"
+    value = "while"
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+    @property
+    def children(self):
+        return (self.condition, *self.body)
+
+
+class DoWhile(Node):
+    __slots__ = ("body", "condition")
+    name = "DoWhile"
+    value = "do_while"
+
+    def __init__(self, body, condition):
+        self.body = body
+        self.condition = condition
+
+    @property
+    def children(self):
+        return (*self.body, self.condition)
+
+
+class Input(Node):
+    """cin sentence. Its target is not a child, as in the first trees"""
+
+    __slots__ = ("target",)
+    name = "Input"
+    value = "cin"
+
+    def __init__(self, target):
+        self.target = target
+
+
+class Output(Node):
+    __slots__ = ("expression",)
+    name = "Output"
+    value = "cout"
+
+    def __init__(self, expression):
+        self.expression = expression
+
+    @property
+    def children(self):
+        return (self.expression,)
+
+
+class BinaryOperation(Node):
+    """Operation named after the type of its operator token, like PLUS"""
+
+    __slots__ = ("name", "value", "left", "right")
+
+    def __init__(self, name, value, left, right):
+        self.name = name
+        self.value = value
+        self.left = left
+        self.right = right
+
+    @property
+    def children(self):
+        return (self.left, self.right)
+
+
+class TreeBuilder:
+    """
+    Builds the nodes for the Parser. Every method gets the indexes of the
+    first and last tokens of the node, which these nodes do not keep.
+    """
+
+    def begin(self, tokens):
+        pass
+
+    def finish(self, program):
+        return program
+
+    def program(self, first, last, declarations, statements):
+        return Program(declarations, statements)
+
+    def variable_declaration(self, first, last, type, identifiers):
+        return VariableDeclaration(type, identifiers)
+
+    def identifier(self, first, last, name):
+        return Identifier(name)
+
+    def number(self, first, last, value):
+        return Number(value)
+
+    def empty_statement(self, first, last):
+        return EmptyStatement()
+
+    def assignment(self, first, last, target, expression):
+        return Assignment(target, expression)
+
+    def increment(self, first, last, target):
+        return Increment(target)
+
+    def decrement(self, first, last, target):
+        return Decrement(target)
+
+    def if_statement(self, first, last, condition, true_branch, false_branch=None):
+        return If(condition, true_branch, false_branch)
+
+    def true_branch(self, first, last, statements):
+        return TrueBranch(statements)
+
+    def false_branch(self, first, last, statements):
+        return FalseBranch(statements)
+
+    def while_loop(self, first, last, condition, body):
+        return While(condition, body)
+
+    def do_while_loop(self, first, last, body, condition):
+        return DoWhile(body, condition)
+
+    def input(self, first, last, target):
+        return Input(target)
+
+    def output(self, first, last, expression):
+        return Output(expression)
+
+    def binary_operation(self, first, last, name, value, left, right):
+        return BinaryOperation(name, value, left, right)
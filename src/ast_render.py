@@ -0,0 +1,159 @@
+"""
+Renderers that write an AST to a stream as they walk it, as text like
+anytree's RenderTree, as a Graphviz DOT graph or as JSON:
+
+    with open("ast.dot", "w", encoding="utf-8") as f:
+        render_dot(ast, f, max_nodes=10000)
+
+The tree is walked with an explicit stack, so any depth can be rendered,
+and nothing but the stack is held in memory. max_depth cuts the children
+of the nodes at that depth and max_nodes stops after that many nodes;
+what was left out is marked in the output.
+
+Every renderer takes a Node, a NodeView of an AstArena or anything else
+with children and printed like a Node, and returns the nodes written.
+"""
+
+import json
+
+# Marks the children left out of the text and the DOT output
+ELIDED = "..."
+
+
+def render_text(root, stream, max_depth=None, max_nodes=None):
+    """Writes the tree as lines with box drawing prefixes, like RenderTree"""
+    write = stream.write
+    write(f"{root}\n")
+    count = 1
+    # Children of the open nodes, the next one to write and their indent
+    stack = []
+    if root.children:
+        if max_depth is not None and max_depth < 1:
+            write(f"└── {ELIDED}\n")
+        else:
+            stack.append([root.children, 0, ""])
+    while stack:
+        top = stack[-1]
+        children, index, indent = top
+        if index == len(children):
+            stack.pop()
+            continue
+        if max_nodes is not None and count >= max_nodes:
+            write(f"{indent}└── {ELIDED} stopped after {count} nodes\n")
+            break
+        top[1] = index + 1
+        child = children[index]
+        if index == len(children) - 1:
+            write(f"{indent}└── {child}\n")
+            child_indent = indent + "    "
+        else:
+            write(f"{indent}├── {child}\n")
+            child_indent = indent + "│   "
+        count += 1
+        grandchildren = child.children
+        if grandchildren:
+            if max_depth is not None and len(stack) >= max_depth:
+                write(f"{child_indent}└── {ELIDED}\n")
+            else:
+                stack.append([grandchildren, 0, child_indent])
+    return count
+
+
+def render_dot(root, stream, max_depth=None, max_nodes=None):
+    """
+    Writes the tree as a DOT digraph. Every node gets its own id, so nodes
+    with the same text are not merged like DotExporter merges them.
+    """
+    write = stream.write
+    write("digraph tree {\n")
+    write(f"    n0 [label={dot_label(root)}];\n")
+    count = 1
+    elided = 0
+    # Children of the open nodes, the next one to write and their parent id
+    stack = []
+    if root.children:
+        if max_depth is not None and max_depth < 1:
+            elided = write_elided(write, "n0", elided)
+        else:
+            stack.append([root.children, 0, "n0"])
+    while stack:
+        top = stack[-1]
+        children, index, parent = top
+        if index == len(children):
+            stack.pop()
+            continue
+        if max_nodes is not None and count >= max_nodes:
+            write(f"    // stopped after {count} nodes\n")
+            break
+        top[1] = index + 1
+        child = children[index]
+        node = f"n{count}"
+        write(f"    {node} [label={dot_label(child)}];\n")
+        write(f"    {parent} -> {node};\n")
+        count += 1
+        grandchildren = child.children
+        if grandchildren:
+            if max_depth is not None and len(stack) >= max_depth:
+                elided = write_elided(write, node, elided)
+            else:
+                stack.append([grandchildren, 0, node])
+    write("}\n")
+    return count
+
+
+def dot_label(node):
+    return json.dumps(f"{node}", ensure_ascii=False)
+
+
+def write_elided(write, parent, elided):
+    """Writes a node that stands for the children left out of parent"""
+    node = f"elided{elided}"
+    write(f'    {node} [label="{ELIDED}", shape=plaintext];\n')
+    write(f"    {parent} -> {node};\n")
+    return elided + 1
+
+
+def render_json(root, stream, max_depth=None, max_nodes=None):
+    """
+    Writes the tree as one JSON object per node, with its name, value and
+    children. A node whose children were left out has "truncated": true.
+    """
+    write = stream.write
+    count = 0
+    # Children of the open nodes and the next one to write
+    stack = []
+    node = root
+    while True:
+        if node is not None:
+            count += 1
+            write(
+                f'{{"name": {json.dumps(node.name)}, "value": {json.dumps(node.value)}'
+            )
+            children = node.children
+            if not children:
+                write("}")
+            elif max_depth is not None and len(stack) >= max_depth:
+                write(', "truncated": true}')
+            else:
+                write(', "children": [')
+                stack.append([children, 0])
+        if not stack:
+            break
+        top = stack[-1]
+        children, index = top
+        if index == len(children):
+            stack.pop()
+            write("]}")
+            node = None
+            continue
+        if max_nodes is not None and count >= max_nodes:
+            # Every open node is missing children
+            for _ in stack:
+                write('], "truncated": true}')
+            break
+        if index:
+            write(", ")
+        top[1] = index + 1
+        node = children[index]
+    write("\n")
+    return count
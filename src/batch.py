@@ -0,0 +1,70 @@
+"""
+Helpers to run a compiler phase over many files on a process pool.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import glob
+import os
+
+
+def expand_paths(patterns):
+    """
+    Expands files, directories and glob patterns into a sorted list of files.
+
+    Args:
+        patterns (list[str]): Files, directories (searched recursively) or
+            glob patterns (** is recursive)
+
+    Returns:
+        list[Path]: The files, without duplicates
+    """
+    files = {}
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(p for p in path.rglob("*") if p.is_file())
+        elif glob.has_magic(pattern):
+            matches = sorted(
+                Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file()
+            )
+        else:
+            matches = [path]
+        for match in matches:
+            files.setdefault(match, None)
+    return list(files)
+
+
+def default_jobs():
+    """Number of CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def imap_ordered(function, items, jobs=None):
+    """
+    Yields function(item) for every item, in the order of the items.
+
+    The calls run on a pool of jobs processes (all the CPUs by default).
+    At most a few calls per process are in flight, so the results never
+    pile up in memory when the consumer is slower than the pool. With one
+    job everything runs in this process.
+    """
+    jobs = jobs or default_jobs()
+    if jobs == 1:
+        for item in items:
+            yield function(item)
+        return
+
+    max_in_flight = jobs * 2
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        in_flight = deque()
+        for item in items:
+            in_flight.append(pool.submit(function, item))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
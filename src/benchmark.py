@@ -0,0 +1,735 @@
+"""
+Benchmarks for the compiler. Run it with a source file:
+
+    python benchmark.py <file>
+
+The lexer engines are measured on the file and, when it has no lexical
+errors, so are the parser, against the anytree nodes of tree_example, AST
+serialization, semantic analysis, code generation, constant folding and
+the overhead of parser profiling. Or run it on generated sources of
+several sizes, saving the results to compare them across commits:
+
+    python benchmark.py --sizes 1KB,1MB,64MB --output results.json
+
+or stress the parser with flat and deeply nested programs:
+
+    python benchmark.py --stress 100000
+
+or compare the peak memory of parsing a file whole and streaming it:
+
+    python benchmark.py --streaming <file>
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import json
+import multiprocessing
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from lexer import (
+    Token,
+    TokenBuffer,
+    get_lexical_analysis,
+    iter_tokens,
+    regex_scanner,
+    split_lines,
+)
+from source_generator import parse_size, write_source
+from ast_arena import AstArena
+from ast_binary import load_ast, write_ast
+from parser_profile import RuleProfiler
+from semantic import SemanticAnalyzer
+from intermediate_code import CodeGenerator
+from optimizer import ConstantFolder
+import parser_s
+import tree_example
+
+ENGINES = ("legacy", "regex", "mmap", "numpy")
+
+
+class DictToken:
+    """Token with a __dict__, the layout Token had before __slots__"""
+
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+
+def measure_allocation(build):
+    """Returns what build() returns and the bytes it left allocated"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def token_memory(file: Path):
+    """
+    Measures the bytes per token of the different token storages.
+
+    Args:
+        file (Path): The source file to lex
+
+    Returns:
+        dict: The bytes per token of each storage
+    """
+    tokens = list(iter_tokens(file))
+    # Copies of the values, so every storage pays for its own strings
+    rows = [
+        (token.type, "".join(token.value), token.lineno, token.lexpos)
+        for token in tokens
+    ]
+    count = len(rows) or 1
+
+    _, dict_bytes = measure_allocation(lambda: [DictToken(*row) for row in rows])
+    _, slot_bytes = measure_allocation(lambda: [Token(*row) for row in rows])
+    _, buffer_bytes = measure_allocation(
+        lambda: TokenBuffer(Token(*row) for row in rows)
+    )
+    return {
+        "tokens": len(rows),
+        "dict_token": dict_bytes / count,
+        "slotted_token": slot_bytes / count,
+        "token_buffer": buffer_bytes / count,
+    }
+
+
+def warm_up(engine: str):
+    """Lexes an empty file, so lazy imports are not measured"""
+    with tempfile.TemporaryDirectory() as directory:
+        empty = Path(directory) / "empty.txt"
+        empty.touch()
+        get_lexical_analysis(empty, engine)
+
+
+def engine_throughput(file: Path, engines=ENGINES):
+    """
+    Measures how fast each lexer engine lexes a file.
+
+    Args:
+        file (Path): The source file to lex
+        engines (tuple[str]): The engines to compare
+
+    Returns:
+        dict: Seconds, tokens per second and MB per second of each engine
+    """
+    size = file.stat().st_size
+    results = {}
+    for engine in engines:
+        try:
+            warm_up(engine)
+            start = time.perf_counter()
+            tokens, errors = get_lexical_analysis(file, engine)
+            seconds = time.perf_counter() - start
+        except ImportError as error:
+            results[engine] = {"skipped": str(error)}
+            continue
+        results[engine] = {
+            "seconds": seconds,
+            "tokens_per_second": (len(tokens) + len(errors)) / seconds,
+            "mb_per_second": size / seconds / 1e6,
+        }
+    return results
+
+
+def count_nodes(ast):
+    if isinstance(ast, AstArena):
+        return len(ast)
+    count = 0
+    stack = [ast]
+    while stack:
+        count += 1
+        stack.extend(stack.pop().children)
+    return count
+
+
+def parser_throughput(file: Path):
+    """
+    Measures how fast the parser builds the tree of a file and the memory
+    the tree takes, with the slotted nodes of parser_s, with an AstArena
+    and with the anytree nodes of tree_example.
+
+    Args:
+        file (Path): A source file without lexical nor syntax errors
+
+    Returns:
+        dict: Nodes, seconds and bytes allocated of each node type
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+    results = {}
+    for nodes, parse in (
+        ("anytree", lambda: tree_example.Parser(tokens).parse()),
+        ("slotted", lambda: parser_s.Parser(tokens).parse()),
+        ("arena", lambda: parser_s.Parser(tokens, AstArena()).parse()),
+    ):
+        start = time.perf_counter()
+        ast = parse()
+        seconds = time.perf_counter() - start
+        count = count_nodes(ast)
+        del ast
+        _, allocated = measure_allocation(parse)
+        results[nodes] = {
+            "nodes": count,
+            "seconds": seconds,
+            "bytes_per_node": allocated / count,
+        }
+    return results
+
+
+def profiling_overhead(file: Path, repeat=5):
+    """
+    Measures the parser before any parser was profiled, after one was and
+    with the profiler on, the best of repeat runs each, to show a parser
+    that is not profiled pays nothing for the profiling of another.
+
+    Returns:
+        dict: Seconds of each run
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+
+    def best(make_parser):
+        seconds = []
+        for _ in range(repeat):
+            parser = make_parser()
+            start = time.perf_counter()
+            parser.parse()
+            seconds.append(time.perf_counter() - start)
+        return min(seconds)
+
+    def profiled():
+        parser = parser_s.Parser(tokens)
+        RuleProfiler(parser)
+        return parser
+
+    results = {"before": best(lambda: parser_s.Parser(tokens))}
+    results["profiled"] = best(profiled)
+    results["after"] = best(lambda: parser_s.Parser(tokens))
+    return results
+
+
+def semantic_throughput(file: Path):
+    """
+    Measures the semantic analysis of the tree of a file.
+
+    Returns:
+        dict: Nodes, seconds, nanoseconds per node and errors found
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+    ast = parser_s.Parser(tokens, AstArena(), recover=True).parse()
+    analyzer = SemanticAnalyzer(ast)
+    start = time.perf_counter()
+    analyzer.analyze()
+    seconds = time.perf_counter() - start
+    return {
+        "nodes": len(ast),
+        "seconds": seconds,
+        "ns_per_node": seconds / max(len(ast), 1) * 1e9,
+        "errors": len(analyzer.errors),
+    }
+
+
+def code_generation(file: Path):
+    """
+    Measures the three-address code generation of the tree of a file and
+    the memory the instructions take.
+
+    Returns:
+        dict: Instructions, seconds and bytes allocated per instruction
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+    ast = parser_s.Parser(tokens, AstArena(), recover=True).parse()
+    start = time.perf_counter()
+    code = CodeGenerator(ast).generate()
+    seconds = time.perf_counter() - start
+    del code
+    code, allocated = measure_allocation(lambda: CodeGenerator(ast).generate())
+    return {
+        "instructions": len(code),
+        "seconds": seconds,
+        "bytes_per_instruction": allocated / max(len(code), 1),
+    }
+
+
+def constant_folding(file: Path):
+    """
+    Measures the constant folding of the tree of a file without errors,
+    and the work it saves the stages after it: the nodes to analyze and
+    the instructions to generate and run.
+
+    Returns:
+        dict: Seconds folding, and the nodes, instructions and seconds of
+        the semantic analysis and code generation before and after it
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+    ast = parser_s.Parser(tokens, AstArena()).parse()
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    if analyzer.errors:
+        raise ValueError(f"{file} has semantic errors")
+    folder = ConstantFolder(ast, types)
+    start = time.perf_counter()
+    folded = folder.fold()
+    results = {"seconds": time.perf_counter() - start, "removed": folder.removed}
+    for name, tree in (("before", ast), ("after", folded)):
+        start = time.perf_counter()
+        SemanticAnalyzer(tree).analyze()
+        semantic_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        code = CodeGenerator(tree).generate()
+        results[name] = {
+            "nodes": len(tree),
+            "instructions": len(code),
+            "semantic_seconds": semantic_seconds,
+            "code_seconds": time.perf_counter() - start,
+        }
+    return results
+
+
+def ast_serialization(file: Path):
+    """
+    Measures saving and loading the tree of a file with pickle, of the
+    slotted nodes and of an AstArena, and with the binary format of
+    ast_binary. Loading is measured alone, and followed by reading the
+    children of the root, and by walking the whole tree.
+
+    Args:
+        file (Path): A source file without lexical errors
+
+    Returns:
+        dict: Bytes and seconds of each way
+    """
+    tokens, errors = get_lexical_analysis(file)
+    if errors:
+        raise ValueError(f"{file} has lexical errors")
+    nodes = parser_s.Parser(tokens).parse()
+    arena = parser_s.Parser(tokens, AstArena()).parse()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "tree"
+
+        def save_pickle(tree):
+            with open(path, "wb") as f:
+                pickle.dump(tree, f, pickle.HIGHEST_PROTOCOL)
+
+        def load_pickle():
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        def save_binary(tree):
+            with open(path, "wb") as f:
+                write_ast(tree, f)
+
+        for name, tree, save, load in (
+            ("pickle_nodes", nodes, save_pickle, load_pickle),
+            ("pickle_arena", arena, save_pickle, load_pickle),
+            ("binary", arena, save_binary, lambda: load_ast(path)),
+        ):
+            start = time.perf_counter()
+            save(tree)
+            results[name] = {
+                "bytes": path.stat().st_size,
+                "save_seconds": time.perf_counter() - start,
+            }
+            for measure, read in (
+                ("load_seconds", lambda tree: None),
+                ("load_root_seconds", read_root),
+                ("load_walk_seconds", count_nodes_read),
+            ):
+                start = time.perf_counter()
+                loaded = load()
+                read(loaded)
+                results[name][measure] = time.perf_counter() - start
+                if hasattr(loaded, "close"):
+                    loaded.close()
+                del loaded
+    return results
+
+
+def read_root(tree):
+    """Reads the text of the root and of its children"""
+    root = tree.root_view() if isinstance(tree, AstArena) else tree
+    return [str(child) for child in root.children]
+
+
+def count_nodes_read(tree):
+    """Walks a whole tree reading the text of every node"""
+    count = 0
+    if isinstance(tree, AstArena):
+        for index, _ in tree.preorder():
+            tree.value(index)
+            count += 1
+        return count
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        str(node)
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def stress_sources(size: int):
+    """
+    Programs that stress the parser: a flat expression of size operands,
+    an operand inside size parentheses and size nested if blocks.
+    """
+    terms = ["x"]
+    for i in range(1, size):
+        # The lexer folds a minus into the number after it
+        terms.append(("+", "-", "*", "/")[i % 4] + (" x" if i % 2 else " 2"))
+    return {
+        "flat": f"main {{ int x;\nx = {' '.join(terms)};\n}}\n",
+        "parenthesized": f"main {{ int x;\nx = {'(' * size}x{')' * size};\n}}\n",
+        "nested_blocks": (
+            "main { int x;\n"
+            + "if (x < 1) {\n" * size
+            + "x++;\n"
+            + "}\n" * size
+            + "}\n"
+        ),
+    }
+
+
+def parser_stress(size: int):
+    """
+    Parses the stress_sources with the recursive parser of tree_example and
+    the iterative parser of parser_s.
+
+    Returns:
+        dict: Seconds of each parser on each source, or the error it raised
+    """
+    results = {}
+    for name, source in stress_sources(size).items():
+        tokens, _ = regex_scanner(split_lines(source))
+        results[name] = {}
+        for parser, parser_class in (
+            ("recursive", tree_example.Parser),
+            ("iterative", parser_s.Parser),
+        ):
+            start = time.perf_counter()
+            try:
+                parser_class(tokens).parse()
+            except RecursionError as error:
+                results[name][parser] = {"error": f"RecursionError: {error}"}
+                continue
+            results[name][parser] = {"seconds": time.perf_counter() - start}
+    return results
+
+
+def parse_whole(file: Path):
+    """Lexes a file into a list and parses it, in a fresh process"""
+    start = time.perf_counter()
+    tokens, _ = get_lexical_analysis(file)
+    ast = parser_s.Parser(tokens, recover=True).parse()
+    statements = len(ast.declarations) + len(ast.statements)
+    return {
+        "statements": statements,
+        "seconds": time.perf_counter() - start,
+        "peak_rss": peak_rss(),
+    }
+
+
+def parse_streaming(file: Path):
+    """Parses a file one sentence at a time as it is lexed, in a fresh process"""
+    start = time.perf_counter()
+    parser = parser_s.StreamingParser(iter_tokens(file), recover=True)
+    statements = sum(1 for _ in parser.statements())
+    return {
+        "statements": statements,
+        "seconds": time.perf_counter() - start,
+        "peak_rss": peak_rss(),
+    }
+
+
+def streaming_memory(file: Path):
+    """
+    Parses a file whole and streaming, each in its own process.
+
+    Returns:
+        dict: Statements, seconds and peak RSS of each way
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, parse in (("whole", parse_whole), ("streaming", parse_streaming)):
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results[name] = pool.submit(parse, file).result()
+    return results
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def measure_engine(file: Path, engine: str, trace=True):
+    """
+    Lexes a file with an engine and measures it. Meant to run in a fresh
+    process, so the peak RSS belongs to this lexing run only.
+
+    Returns:
+        dict: The measures of the run
+    """
+    warm_up(engine)
+    start = time.perf_counter()
+    tokens, errors = get_lexical_analysis(file, engine)
+    seconds = time.perf_counter() - start
+    count = len(tokens) + len(errors)
+    result = {
+        "tokens": count,
+        "seconds": seconds,
+        "tokens_per_second": count / seconds,
+        "mb_per_second": file.stat().st_size / seconds / 1e6,
+        "peak_rss": peak_rss(),
+    }
+    del tokens, errors
+
+    if trace:
+        tracemalloc.start()
+        try:
+            tokens, errors = get_lexical_analysis(file, engine)
+            peak = tracemalloc.get_traced_memory()[1]
+            blocks = sum(
+                stat.count
+                for stat in tracemalloc.take_snapshot().statistics("filename")
+            )
+        finally:
+            tracemalloc.stop()
+        result["traced_peak_bytes_per_token"] = peak / max(count, 1)
+        result["allocations_per_token"] = blocks / max(count, 1)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, engines=ENGINES, seed=0, invalid_rate=0.001, trace=True):
+    """
+    Benchmarks the engines on generated sources of the given sizes.
+
+    Args:
+        sizes (list[str]): Source sizes, e.g. ["1KB", "1MB", "1GB"]
+        engines (tuple[str]): The engines to run
+        seed (int): Seed of the source generator
+        invalid_rate (float): Fraction of sentences with an invalid character
+        trace (bool): Whether to also measure allocations with tracemalloc
+
+    Returns:
+        dict: The report, ready to be saved as JSON
+    """
+    results = []
+    # Every run gets a new process: peak RSS can only grow within one
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            file = Path(directory) / f"source_{size}.txt"
+            with open(file, "w", encoding="utf-8") as f:
+                write_source(f, parse_size(size), seed, invalid_rate)
+            for engine in engines:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    try:
+                        result = pool.submit(
+                            measure_engine, file, engine, trace
+                        ).result()
+                    except ImportError as error:
+                        result = {"skipped": str(error)}
+                results.append(
+                    {
+                        "size": size,
+                        "bytes": file.stat().st_size,
+                        "engine": engine,
+                        **result,
+                    }
+                )
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Benchmarks the lexer, parser, AST serialization, semantic "
+        "analysis, code generation, constant folding and parser profiling"
+    )
+    arg_parser.add_argument("file", nargs="?", type=Path, help="Source to lex")
+    arg_parser.add_argument(
+        "--sizes", default="1KB,1MB,16MB", help="Generated source sizes"
+    )
+    arg_parser.add_argument("--engines", default=",".join(ENGINES))
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--no-trace", action="store_true", help="Skip the tracemalloc run"
+    )
+    arg_parser.add_argument("--output", type=Path, help="JSON file for the results")
+    arg_parser.add_argument(
+        "--stress",
+        type=int,
+        metavar="SIZE",
+        help="Only parse flat and nested programs of this size",
+    )
+    arg_parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Only compare the memory of parsing the file whole and streaming",
+    )
+    args = arg_parser.parse_args()
+    engines = tuple(args.engines.split(","))
+
+    if args.streaming:
+        if args.file is None:
+            arg_parser.error("--streaming needs a file")
+        for name, result in streaming_memory(args.file).items():
+            line = f"{name}: {result['statements']} statements in {result['seconds']:.2f} s"
+            if result["peak_rss"] is not None:
+                line += f", peak RSS {result['peak_rss'] / 2**20:.1f} MB"
+            print(line)
+    elif args.stress is not None:
+        for name, results in parser_stress(args.stress).items():
+            for parser, result in results.items():
+                if "error" in result:
+                    print(f"{name} {parser}: {result['error']}")
+                else:
+                    print(f"{name} {parser}: {result['seconds']:.3f} s")
+    elif args.file is not None:
+        if not args.file.exists():
+            print("File does not exist")
+        else:
+            results = token_memory(args.file)
+            print(f"tokens: {results['tokens']}")
+            for storage in ("dict_token", "slotted_token", "token_buffer"):
+                print(f"{storage}: {results[storage]:.1f} bytes/token")
+
+            for engine, result in engine_throughput(args.file, engines).items():
+                if "skipped" in result:
+                    print(f"{engine}: skipped ({result['skipped']})")
+                else:
+                    print(
+                        f"{engine}: {result['tokens_per_second']:.0f} tokens/s, "
+                        f"{result['mb_per_second']:.2f} MB/s"
+                    )
+
+            # The parser and the stages after it need a file the lexer
+            # accepts, the lexer is measured on any file.
+            _, lexical_errors = get_lexical_analysis(args.file)
+            if lexical_errors:
+                print(
+                    f"parser, semantic analysis and code generation: skipped "
+                    f"({args.file} has lexical errors)"
+                )
+            else:
+                for nodes, result in parser_throughput(args.file).items():
+                    print(
+                        f"{nodes} nodes: {result['nodes']} nodes in "
+                        f"{result['seconds']:.3f} s, {result['bytes_per_node']:.1f} bytes/node"
+                    )
+
+                for way, result in ast_serialization(args.file).items():
+                    print(
+                        f"{way}: {result['bytes'] / 2**20:.1f} MB, "
+                        f"saved in {result['save_seconds']:.3f} s, "
+                        f"loaded in {result['load_seconds']:.3f} s, "
+                        f"{result['load_root_seconds']:.3f} s reading the root, "
+                        f"{result['load_walk_seconds']:.3f} s walking the tree"
+                    )
+
+                result = semantic_throughput(args.file)
+                print(
+                    f"semantic analysis: {result['nodes']} nodes in "
+                    f"{result['seconds']:.3f} s, {result['ns_per_node']:.0f} ns/node, "
+                    f"{result['errors']} errors"
+                )
+
+                result = code_generation(args.file)
+                print(
+                    f"code generation: {result['instructions']} instructions in "
+                    f"{result['seconds']:.3f} s, "
+                    f"{result['bytes_per_instruction']:.1f} bytes/instruction"
+                )
+
+                try:
+                    results = constant_folding(args.file)
+                except ValueError as error:
+                    print(f"constant folding: skipped ({error})")
+                else:
+                    print(
+                        f"constant folding: {results['removed']} nodes removed in "
+                        f"{results['seconds']:.3f} s"
+                    )
+                    for name in ("before", "after"):
+                        result = results[name]
+                        print(
+                            f"{name} folding: {result['nodes']} nodes, "
+                            f"{result['instructions']} instructions, semantic "
+                            f"analysis in {result['semantic_seconds']:.3f} s, "
+                            f"code generation in {result['code_seconds']:.3f} s"
+                        )
+
+                results = profiling_overhead(args.file)
+                print(
+                    f"parser: {results['before']:.3f} s, "
+                    f"{results['profiled']:.3f} s profiled, "
+                    f"{results['after']:.3f} s after profiling another parser"
+                )
+    else:
+        report = run_suite(
+            args.sizes.split(","), engines, args.seed, trace=not args.no_trace
+        )
+        for result in report["results"]:
+            if "skipped" in result:
+                print(f"{result['size']} {result['engine']}: skipped")
+                continue
+            line = (
+                f"{result['size']} {result['engine']}: "
+                f"{result['tokens_per_second']:.0f} tokens/s, "
+                f"{result['mb_per_second']:.2f} MB/s"
+            )
+            if result["peak_rss"] is not None:
+                line += f", peak RSS {result['peak_rss'] / 2**20:.1f} MB"
+            if "allocations_per_token" in result:
+                line += f", {result['allocations_per_token']:.2f} allocations/token"
+            print(line)
+        if args.output is not None:
+            args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,28 @@
+"""
+Pausing the garbage collector around work that allocates many objects
+that never form reference cycles, like tokens and tree nodes, so the
+collector passes their allocation triggers are not paid for.
+"""
+
+from contextlib import contextmanager
+import gc
+
+
+@contextmanager
+def gc_paused():
+    """
+    Disables the cyclic garbage collector while the block runs. It is
+    enabled again afterwards only if it was enabled before, so nested
+    pauses and callers that turned it off themselves keep their state.
+
+    The collector is shared by the whole process, so only pause it around
+    work that finishes on the calling thread, never around a wait.
+    """
+    if not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
@@ -0,0 +1,278 @@
+"""
+On-disk cache of compile results, so an unchanged file is not lexed and
+parsed again:
+
+    cache = CompileCache()
+    tokens, errors, ast, syntax_errors = compile_file(path, cache=cache)
+
+Entries are keyed by a hash of the source bytes, the compiler version and
+the compile options. Every entry is its own file, written to a temporary
+name and renamed into place, so several processes can share a cache
+without locks: a reader sees a whole entry or none. Reading an entry
+updates its modification time, and once the cache grows past its size
+cap the least recently used entries are removed.
+"""
+
+from pathlib import Path
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import time
+
+from lexer import TokenBuffer, regex_scanner
+from ast_arena import AstArena
+from parser_s import Parser
+
+# Modules whose code decides what a compile gives, the version is their hash
+COMPILER_MODULES = ("lexer.py", "parser_s.py", "ast_nodes.py", "ast_arena.py")
+
+DEFAULT_MAX_SIZE = 512 * 2**20
+# Eviction leaves the cache at this fraction of its cap, so the next few
+# writes do not evict again
+EVICTION_TARGET = 0.8
+# Temporary files older than this were left by a writer that died
+STALE_TEMPORARY_SECONDS = 3600
+TEMPORARY_SUFFIX = ".tmp"
+
+
+def compiler_version():
+    """Hash of the compiler modules, so editing them invalidates the cache"""
+    digest = hashlib.sha256()
+    directory = Path(__file__).parent
+    for name in COMPILER_MODULES:
+        digest.update((directory / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+COMPILER_VERSION = compiler_version()
+
+
+def default_cache_directory():
+    """$COMPILER_CACHE_DIR, or compiler in the user cache directory"""
+    if "COMPILER_CACHE_DIR" in os.environ:
+        return Path(os.environ["COMPILER_CACHE_DIR"])
+    if "XDG_CACHE_HOME" in os.environ:
+        return Path(os.environ["XDG_CACHE_HOME"]) / "compiler"
+    return Path.home() / ".cache" / "compiler"
+
+
+def is_private(directory: Path):
+    """Whether directory belongs to the current user and only they can write to it"""
+    try:
+        stat = directory.stat()
+    except OSError:
+        return False
+    if not hasattr(os, "getuid"):
+        # Windows has no owner nor mode bits to check here
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class CompileCache:
+    """
+    Content-addressed cache of pickled values in a directory.
+
+    Entries are read back with pickle, so anyone who can write to the
+    directory can run code in every process that reads the cache. The
+    directory is created readable by its owner only, and entries are read
+    and written only while it belongs to the current user and nobody else
+    can write to it, otherwise every lookup misses. Do not point it at a
+    directory shared with other users.
+
+    Args:
+        directory (Path): Where the entries are kept, created when needed
+        max_size (int): Bytes the entries may take before the least
+            recently used ones are removed
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory or default_cache_directory())
+        self.max_size = max_size
+        # Bytes of the entries as last counted plus the ones written since.
+        # Other processes write too, so it is counted again every so often.
+        self._size = None
+        self._written = 0
+
+    def key(self, source: bytes, *options):
+        """The key of a compile of source with the given options"""
+        digest = hashlib.sha256(COMPILER_VERSION.encode())
+        digest.update(repr(options).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        """Returns the value stored with key, None if there is none"""
+        if not is_private(self.directory):
+            return None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            value = pickle.loads(data)
+        except Exception:
+            # Written by an older Python or damaged on disk
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Stores value with key, then evicts if the cache is too big"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size * EVICTION_TARGET:
+            return
+        path = self.path(key)
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if not is_private(self.directory):
+                return
+            path.parent.mkdir(mode=0o700, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(
+                dir=path.parent, suffix=TEMPORARY_SUFFIX
+            )
+            try:
+                with os.fdopen(descriptor, "wb") as f:
+                    f.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                self._remove(Path(temporary))
+                raise
+        except OSError:
+            # A cache that cannot be written only makes compiles slower
+            return
+
+        if self._size is None:
+            self._size = self.size()
+        self._size += len(data)
+        self._written += len(data)
+        if self._size > self.max_size or self._written > self.max_size // 8:
+            self.evict()
+
+    def entries(self):
+        """Yields (last use, bytes, path) of every entry"""
+        now = time.time()
+        for bucket in self._buckets():
+            for entry in self._scan(bucket):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(TEMPORARY_SUFFIX):
+                    if now - stat.st_mtime > STALE_TEMPORARY_SECONDS:
+                        self._remove(Path(entry.path))
+                    continue
+                yield stat.st_mtime, stat.st_size, Path(entry.path)
+
+    def size(self):
+        """Bytes taken by the entries"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Removes the least recently used entries while over the cap"""
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        if size > self.max_size:
+            target = self.max_size * EVICTION_TARGET
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                self._remove(path)
+                size -= entry_size
+        self._size = size
+        self._written = 0
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+        self._size = 0
+        self._written = 0
+
+    def _buckets(self):
+        return [Path(entry.path) for entry in self._scan(self.directory)]
+
+    @staticmethod
+    def _scan(directory):
+        try:
+            with os.scandir(directory) as entries:
+                return list(entries)
+        except OSError:
+            return []
+
+    @staticmethod
+    def _remove(path):
+        # Another process may have removed it first
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def lex_source(source: bytes, coalesce_errors=False, max_errors=None):
+    """
+    Lexes the bytes of a source file, reading them the way a file opened
+    as text is read.
+
+    Returns:
+        tuple: The token list and the lexical errors
+    """
+    with io.TextIOWrapper(io.BytesIO(source), encoding="utf-8") as lines:
+        return regex_scanner(lines, coalesce_errors, max_errors)
+
+
+def parse_tokens(tokens):
+    """
+    Parses tokens into an AstArena, recovering from syntax errors.
+
+    Returns:
+        tuple: The tree and the syntax errors
+    """
+    parser = Parser(tokens, AstArena(), recover=True)
+    ast = parser.parse()
+    return ast, parser.errors
+
+
+def compile_source(source: bytes, coalesce_errors=False, max_errors=None):
+    """
+    Lexes and parses the bytes of a source file.
+
+    Returns:
+        tuple: The tokens as a TokenBuffer, the lexical errors, the tree as
+        an AstArena (None if there are lexical errors) and the syntax errors
+    """
+    tokens, errors = lex_source(source, coalesce_errors, max_errors)
+    if errors:
+        return TokenBuffer(tokens), errors, None, []
+    ast, syntax_errors = parse_tokens(tokens)
+    return TokenBuffer(tokens), errors, ast, syntax_errors
+
+
+def compile_key(cache, source: bytes, coalesce_errors=False, max_errors=None):
+    """The key of the compile of source in cache"""
+    return cache.key(source, "compile", coalesce_errors, max_errors)
+
+
+def compile_file(file: Path, coalesce_errors=False, max_errors=None, cache=None):
+    """
+    Compiles a file like compile_source, with the result of an earlier
+    compile of the same bytes if cache has it.
+    """
+    source = Path(file).read_bytes()
+    if cache is None:
+        return compile_source(source, coalesce_errors, max_errors)
+    key = compile_key(cache, source, coalesce_errors, max_errors)
+    result = cache.get(key)
+    if result is None:
+        result = compile_source(source, coalesce_errors, max_errors)
+        cache.put(key, result)
+    return result
@@ -0,0 +1,283 @@
+"""
+Compiler driver: lexes, parses and checks many files on a process pool and
+writes their diagnostics as JSON lines:
+
+    python compiler.py programs/ "tests/**/*.txt" -j 8 > diagnostics.jsonl
+
+Every lexical, syntax and semantic error is a line with the file, the type of the
+error, its text and its line and column, in the order of the files. A
+summary of the time spent in every phase goes to stderr. The exit status
+is 0 when every file compiled cleanly, 1 when some file has errors and 2
+when some file could not be read or nothing matched the sources.
+
+Results are kept in the compile cache, shared with the editor and with
+parser_s.py, so the files that did not change are not compiled again.
+
+The later stages of a file can be printed instead of its diagnostics: its
+symbol table, its tree with the type of every expression, its three
+address code or its tree after constant folding:
+
+    python compiler.py program.txt --dump symbols
+"""
+
+from pathlib import Path
+import json
+import sys
+import time
+
+from lexer import TokenBuffer
+from compile_cache import compile_file, compile_key, lex_source, parse_tokens
+from semantic import SemanticAnalyzer
+from symbol_table import table_lines
+from intermediate_code import CodeGenerator
+from optimizer import ConstantFolder
+
+PHASES = ("read", "cache", "lex", "parse", "semantic")
+DUMPS = ("symbols", "types", "code", "folded")
+
+EXIT_OK = 0
+EXIT_ERRORS = 1
+EXIT_FILE_ERROR = 2
+
+
+def compile_to_json(path: Path, coalesce_errors=False, max_errors=None, cache=None):
+    """
+    Compiles a file and returns its diagnostics as JSON lines tagged with
+    the file, and a summary of the compile: the tokens, the errors, whether
+    it came from the cache and the seconds spent in every phase.
+    """
+    name = str(path)
+    seconds = dict.fromkeys(PHASES, 0.0)
+    summary = {
+        "file": name,
+        "tokens": 0,
+        "lexical_errors": 0,
+        "syntax_errors": 0,
+        "semantic_errors": 0,
+        "file_error": False,
+        "cached": False,
+        "seconds": seconds,
+    }
+    clock = time.perf_counter
+    try:
+        start = clock()
+        source = Path(path).read_bytes()
+        seconds["read"] = clock() - start
+
+        result = None
+        if cache is not None:
+            start = clock()
+            key = compile_key(cache, source, coalesce_errors, max_errors)
+            result = cache.get(key)
+            seconds["cache"] = clock() - start
+            summary["cached"] = result is not None
+        if result is None:
+            start = clock()
+            tokens, errors = lex_source(source, coalesce_errors, max_errors)
+            seconds["lex"] = clock() - start
+            ast = None
+            syntax_errors = []
+            if not errors:
+                start = clock()
+                ast, syntax_errors = parse_tokens(tokens)
+                seconds["parse"] = clock() - start
+            result = (TokenBuffer(tokens), errors, ast, syntax_errors)
+            if cache is not None:
+                start = clock()
+                cache.put(key, result)
+                seconds["cache"] += clock() - start
+    except (OSError, UnicodeDecodeError) as error:
+        summary["file_error"] = True
+        line = json.dumps({"file": name, "type": "FileError", "value": str(error)})
+        return line + "\n", summary
+
+    tokens, errors, ast, syntax_errors = result
+    semantic_errors = []
+    if ast is not None:
+        start = clock()
+        analyzer = SemanticAnalyzer(ast)
+        analyzer.analyze()
+        semantic_errors = analyzer.errors
+        seconds["semantic"] = clock() - start
+    summary["tokens"] = len(tokens)
+    summary["lexical_errors"] = len(errors)
+    summary["syntax_errors"] = len(syntax_errors)
+    summary["semantic_errors"] = len(semantic_errors)
+    lines = "".join(
+        json.dumps({"file": name, **error.as_dict()}) + "\n"
+        for error in (*errors, *syntax_errors, *semantic_errors)
+    )
+    return lines, summary
+
+
+def dump_file(
+    path: Path, dump: str, coalesce_errors=False, max_errors=None, cache=None
+):
+    """
+    Compiles a file and returns one of its later stages as text, see DUMPS.
+    The symbols and the types are shown for a program with syntax errors
+    too, the code and the folded tree only for one without errors.
+    """
+    try:
+        _, errors, ast, syntax_errors = compile_file(
+            path, coalesce_errors, max_errors, cache
+        )
+    except (OSError, UnicodeDecodeError) as error:
+        return f"{error}\n"
+    if ast is None:
+        return f"{len(errors)} lexical errors\n"
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    if dump == "symbols":
+        lines = table_lines(analyzer.symbols)
+    elif dump == "types":
+        lines = [analyzer.render_tree().rstrip("\n")]
+        lines += [
+            f"Line {error.lineno}, column {error.lexpos}: {error}"
+            for error in analyzer.errors
+        ]
+    elif syntax_errors or analyzer.errors:
+        return (
+            f"{len(syntax_errors)} syntax and "
+            f"{len(analyzer.errors)} semantic errors\n"
+        )
+    elif dump == "code":
+        lines = CodeGenerator(ast).generate().lines()
+    else:
+        folder = ConstantFolder(ast, types)
+        lines = [
+            folder.fold().render_tree().rstrip("\n"),
+            f"{folder.removed} nodes removed: {folder.folded} operations "
+            f"folded, {folder.simplified} simplified, "
+            f"{folder.branches} constant conditions",
+        ]
+    return "".join(f"{line}\n" for line in lines)
+
+
+class CompileSummary:
+    """Totals of the summaries compile_to_json returns"""
+
+    def __init__(self):
+        self.files = 0
+        self.tokens = 0
+        self.cached = 0
+        self.file_errors = 0
+        self.files_with_errors = 0
+        self.lexical_errors = 0
+        self.syntax_errors = 0
+        self.semantic_errors = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, summary):
+        self.files += 1
+        self.tokens += summary["tokens"]
+        self.cached += summary["cached"]
+        self.file_errors += summary["file_error"]
+        self.lexical_errors += summary["lexical_errors"]
+        self.syntax_errors += summary["syntax_errors"]
+        self.semantic_errors += summary["semantic_errors"]
+        if (
+            summary["lexical_errors"]
+            or summary["syntax_errors"]
+            or summary["semantic_errors"]
+        ):
+            self.files_with_errors += 1
+        for phase, seconds in summary["seconds"].items():
+            self.seconds[phase] += seconds
+
+    def exit_status(self):
+        if self.file_errors or not self.files:
+            return EXIT_FILE_ERROR
+        if self.files_with_errors:
+            return EXIT_ERRORS
+        return EXIT_OK
+
+    def report(self, wall_seconds):
+        """The summary as lines of text"""
+        lines = [
+            f"{self.files} files, {self.tokens} tokens in {wall_seconds:.3f} s "
+            f"({self.files / wall_seconds if wall_seconds else 0:.1f} files/s), "
+            f"{self.cached} from the cache",
+            f"{self.lexical_errors} lexical, {self.syntax_errors} syntax and "
+            f"{self.semantic_errors} semantic errors in {self.files_with_errors} files, "
+            f"{self.file_errors} files could not be read",
+        ]
+        # The phases run in the workers at once, so they add up to more
+        # than the wall time when there are several
+        total = sum(self.seconds.values())
+        for phase, seconds in self.seconds.items():
+            share = seconds / total * 100 if total else 0
+            lines.append(f"{phase:<9}{seconds:>10.3f} s {share:>5.1f}%")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    from functools import partial
+    from batch import expand_paths, imap_ordered
+    from compile_cache import CompileCache
+
+    arg_parser = argparse.ArgumentParser(
+        description="Compiles source files and writes their errors as JSON lines"
+    )
+    arg_parser.add_argument("sources", nargs="+", help="Files, directories or globs")
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, help="Worker processes (all the CPUs by default)"
+    )
+    arg_parser.add_argument(
+        "--coalesce-errors",
+        action="store_true",
+        help="Report a run of invalid characters as one error",
+    )
+    arg_parser.add_argument(
+        "--max-errors", type=int, help="Stop lexing a file after this many errors"
+    )
+    arg_parser.add_argument(
+        "--cache-dir", type=Path, help="Directory of the compile cache"
+    )
+    arg_parser.add_argument(
+        "--no-cache", action="store_true", help="Compile every file again"
+    )
+    arg_parser.add_argument(
+        "--quiet", action="store_true", help="Do not print the timing summary"
+    )
+    arg_parser.add_argument(
+        "--dump",
+        choices=DUMPS,
+        help="Print this stage of every file instead of its errors",
+    )
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    files = expand_paths(args.sources)
+    if not files:
+        print("No files match the sources", file=sys.stderr)
+    cache = None if args.no_cache else CompileCache(args.cache_dir)
+    if args.dump is not None:
+        dump_one = partial(
+            dump_file,
+            dump=args.dump,
+            coalesce_errors=args.coalesce_errors,
+            max_errors=args.max_errors,
+            cache=cache,
+        )
+        for path, text in zip(files, imap_ordered(dump_one, files, args.jobs)):
+            if len(files) > 1:
+                sys.stdout.write(f"{path}:\n")
+            sys.stdout.write(text)
+        sys.exit(EXIT_OK if files else EXIT_FILE_ERROR)
+    compile_one = partial(
+        compile_to_json,
+        coalesce_errors=args.coalesce_errors,
+        max_errors=args.max_errors,
+        cache=cache,
+    )
+    summary = CompileSummary()
+    # Every file is compiled in a worker, the output keeps the file order
+    for lines, file_summary in imap_ordered(compile_one, files, args.jobs):
+        sys.stdout.write(lines)
+        summary.add(file_summary)
+    sys.stdout.flush()
+    if not args.quiet:
+        print(summary.report(time.perf_counter() - start), file=sys.stderr)
+    sys.exit(summary.exit_status())
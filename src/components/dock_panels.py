@@ -2,18 +2,28 @@
 File that contains the dock panels of the application
 """
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
 from PyQt5.QtWidgets import (
     QMainWindow,
     QTextBrowser,
     QDockWidget,
+    QListView,
     QTreeWidget,
     QTreeWidgetItem,
 )
 
+from intermediate_code import InstructionList
+from semantic import SemanticAnalyzer
+from symbol_table import SymbolTable, table_lines
+
 
 lexer = []  # List to store the widgets of the lexer dock panel
 syntactic = []  # List to store the widgets of the syntactic dock panel
+semantic = []  # List to store the widgets of the semantic dock panel
+hash_table = []  # List to store the widget of the hash table dock panel
+intermediate_code = []  # List to store the model of the intermediate code panel
+
+MAX_SHOWN_LINES = 10000  # Lines of tokens or errors shown in a panel
 
 
 def set_up_dock_panels(window: QMainWindow):
@@ -51,6 +61,7 @@ def set_up_dock_panels(window: QMainWindow):
     semantic_panel.setStyleSheet(open("./src/css/style.css", encoding="utf-8").read())
     semantic_widget = QTextBrowser()
     semantic_widget.setStyleSheet(open("./src/css/style.css", encoding="utf-8").read())
+    semantic.append(semantic_widget)
     semantic_panel.setWidget(semantic_widget)
     window.addDockWidget(Qt.BottomDockWidgetArea, semantic_panel)
 
@@ -61,6 +72,7 @@ def set_up_dock_panels(window: QMainWindow):
     hash_table_widget.setStyleSheet(
         open("./src/css/style.css", encoding="utf-8").read()
     )
+    hash_table.append(hash_table_widget)
     hash_table_panel.setWidget(hash_table_widget)
     window.addDockWidget(Qt.BottomDockWidgetArea, hash_table_panel)
 
@@ -69,10 +81,15 @@ def set_up_dock_panels(window: QMainWindow):
     intermediate_code_panel.setStyleSheet(
         open("./src/css/style.css", encoding="utf-8").read()
     )
-    intermediate_code_widget = QTextBrowser()
+    # The instructions are only turned into text as they are scrolled to
+    intermediate_code_model = InstructionListModel()
+    intermediate_code_widget = QListView()
+    intermediate_code_widget.setUniformItemSizes(True)
+    intermediate_code_widget.setModel(intermediate_code_model)
     intermediate_code_widget.setStyleSheet(
         open("./src/css/style.css", encoding="utf-8").read()
     )
+    intermediate_code.append(intermediate_code_model)
     intermediate_code_panel.setWidget(intermediate_code_widget)
     window.addDockWidget(Qt.BottomDockWidgetArea, intermediate_code_panel)
 
@@ -102,6 +119,7 @@ def set_up_dock_panels(window: QMainWindow):
     sintactic_err_widget.setStyleSheet(
         open("./src/css/style.css", encoding="utf-8").read()
     )
+    syntactic.append(sintactic_err_widget)
     sintactic_err_panel.setWidget(sintactic_err_widget)
     window.addDockWidget(Qt.BottomDockWidgetArea, sintactic_err_panel)
 
@@ -114,6 +132,7 @@ def set_up_dock_panels(window: QMainWindow):
     semantic_err_widget.setStyleSheet(
         open("./src/css/style.css", encoding="utf-8").read()
     )
+    semantic.append(semantic_err_widget)
     semantic_err_panel.setWidget(semantic_err_widget)
     window.addDockWidget(Qt.BottomDockWidgetArea, semantic_err_panel)
 
@@ -130,30 +149,118 @@ def set_up_dock_panels(window: QMainWindow):
     window.setDockOptions(QMainWindow.AllowTabbedDocks | QMainWindow.AllowNestedDocks)
 
 
+class InstructionListModel(QAbstractListModel):
+    """List model of an InstructionList, making the text of a row when shown"""
+
+    def __init__(self):
+        super().__init__()
+        self.code = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.code is None:
+            return 0
+        return len(self.code)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.code[index.row()]
+        return None
+
+    def set_code(self, code):
+        self.beginResetModel()
+        self.code = code
+        self.endResetModel()
+
+
 def set_lexical_analysis_result(results: list[str]):
-    """Set the results of the lexical analysis in the dock panel"""
-    tokens = ""
-    errors = ""
-    for element in results[0]:
-        tokens += f"{element}\n"
-    for element in results[1]:
-        errors += f"{element}\n"
-    lexer[0].setText(tokens)
-    lexer[1].setText(errors)
-
-
-def set_syntactic_analysis_result(ast):
-    """Set the results of the sintactic analysis in the dock panel"""
+    """
+    Set the results of the lexical analysis in the dock panel. Only the
+    first MAX_SHOWN_LINES tokens and errors are shown, so a huge or binary
+    file does not freeze the window.
+    """
+    lexer[0].setText(shown_lines(results[0]))
+    lexer[1].setText(shown_lines(results[1]))
+
+
+def shown_lines(elements: list):
+    """Text with one line per element, up to MAX_SHOWN_LINES"""
+    lines = [f"{element}" for element in elements[:MAX_SHOWN_LINES]]
+    if len(elements) > MAX_SHOWN_LINES:
+        lines.append(f"... {len(elements) - MAX_SHOWN_LINES} more")
+    return "".join(line + "\n" for line in lines)
+
+
+def set_syntactic_analysis_result(ast=None, errors=()):
+    """
+    Set the results of the sintactic analysis in the dock panels: the tree,
+    partial if there are errors, and the errors with their positions. Both
+    panels are emptied when the file was not parsed (ast None).
+    """
     syntactic[0].clear()
-    root_item = QTreeWidgetItem(syntactic[0], [ast.value])
-    for child in ast.children:
-        add_tree_item(root_item, child)
+    if ast is not None:
+        root_item = QTreeWidgetItem(syntactic[0], [str(ast)])
+        for child in ast.children:
+            add_tree_item(root_item, child)
         syntactic[0].expandAll()
+    syntactic[1].setText(
+        shown_lines(
+            [
+                f"Line {error.lineno}, column {error.lexpos}: {error}"
+                for error in errors
+            ]
+        )
+    )
 
 
 def add_tree_item(parent, node):
-    """Add a tree item to the tree widget"""
-    item = QTreeWidgetItem(parent, [node.value])
-    for child in node.children:
-        add_tree_item(item, child)
+    """Add a tree item to the tree widget, with a stack as trees can be deep"""
+    item = QTreeWidgetItem(parent, [str(node)])
+    stack = [(item, node)]
+    while stack:
+        parent_item, parent_node = stack.pop()
+        for child in parent_node.children:
+            stack.append((QTreeWidgetItem(parent_item, [str(child)]), child))
     return item
+
+
+def set_semantic_analysis_result(analyzer: SemanticAnalyzer = None):
+    """
+    Set the results of the semantic analysis in the dock panels: the tree
+    with the type of every expression, up to MAX_SHOWN_LINES nodes, and the
+    semantic errors with their positions. Both panels are emptied when the
+    file was not analyzed (analyzer None).
+    """
+    if analyzer is None:
+        semantic[0].clear()
+        semantic[1].clear()
+        return
+    semantic[0].setText(analyzer.render_tree(max_nodes=MAX_SHOWN_LINES))
+    semantic[1].setText(
+        shown_lines(
+            [
+                f"Line {error.lineno}, column {error.lexpos}: {error}"
+                for error in analyzer.errors
+            ]
+        )
+    )
+
+
+def set_hash_table_result(symbols: SymbolTable = None):
+    """
+    Set the symbol table in the hash table dock panel: the occupancy and
+    probe statistics of the table, then its used buckets in slot order.
+    The panel is emptied when the file was not analyzed (symbols None).
+    """
+    if symbols is None:
+        hash_table[0].clear()
+        return
+    hash_table[0].setText(shown_lines(table_lines(symbols)))
+
+
+def set_intermediate_code_result(code: InstructionList = None):
+    """
+    Set the three-address code in the intermediate code dock panel, or
+    empty it when the program has errors (code None). The panel shows any
+    number of instructions, as only the rows in view are read.
+    """
+    intermediate_code[0].set_code(code)
@@ -7,17 +7,24 @@ from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.Qsci import QsciScintilla, QsciLexerCustom
 
+from lexer import LexerSession
+
 
 class Editor(QsciScintilla):
     """This class is the editor widget that will be used to write the code"""
 
     cursorPositionChangedSignal = pyqtSignal(int, int)
+    lexicalErrorsChangedSignal = pyqtSignal(int)
 
     def __init__(self, parent=None):
         super(Editor, self).__init__(parent)
 
         self.cursorPositionChanged.connect(self.handle_cursor_position_changed)
 
+        # Tokens of the text, re-lexed on every edit from the edited lines
+        self.lexer_session = LexerSession()
+        self.SCN_MODIFIED.connect(self.handle_modified)
+
         # Encoding
         self.setUtf8(True)
 
@@ -63,6 +70,19 @@ class Editor(QsciScintilla):
         """This method is called every time the cursor position changes"""
         self.cursorPositionChangedSignal.emit(line, index)
 
+    def handle_modified(
+        self, position, modification_type, text, length, lines_added, *args
+    ):
+        """This method is called every time text is inserted or deleted"""
+        if not modification_type & (self.SC_MOD_INSERTTEXT | self.SC_MOD_DELETETEXT):
+            return
+        # The edited line now stands for lines_added more or fewer lines
+        line, _ = self.lineIndexFromPosition(position)
+        last_line = line + max(lines_added, 0)
+        text = "".join(self.text(number) for number in range(line, last_line + 1))
+        self.lexer_session.edit(line + 1, line + 1 + max(-lines_added, 0), text)
+        self.lexicalErrorsChangedSignal.emit(self.lexer_session.error_count)
+
     def handle_text_changed(self):
         """This method is called every time the content of the editor changes"""
         line, index = self.getCursorPosition()
@@ -0,0 +1,307 @@
+"""
+Three-address code of a program:
+
+    code = CodeGenerator(ast).generate()
+    for line in code.lines(0, 20):
+        print(line)
+
+Every instruction has an operation and up to three operands, like
+t1 = a + b, ifFalse t1 goto L2 or read x. InstructionList keeps them in
+four parallel arrays, so an instruction takes 13 bytes and no object of
+its own. An operand is an int: a positive one is a name or literal in a
+string table shared by the whole list, a negative one is a temporary and
+labels are numbered apart. Temporaries are reused once read, so an
+expression needs as many as its deepest nesting, not one per operator.
+The text of an instruction is only made when it is read.
+"""
+
+from array import array
+
+from ast_arena import (
+    ASSIGNMENT,
+    DECREMENT,
+    DO_WHILE,
+    EMPTY_STATEMENT,
+    IDENTIFIER,
+    IF,
+    INCREMENT,
+    INPUT,
+    NODE_KIND_CODES,
+    NODE_KINDS,
+    NO_NODE,
+    NUMBER,
+    OUTPUT,
+    VARIABLE_DECLARATION,
+    WHILE,
+    AstArena,
+)
+
+# Operators of the binary operation nodes and how they are written
+OPERATORS = (
+    ("PLUS", "+"),
+    ("MINUS", "-"),
+    ("TIMES", "*"),
+    ("DIVIDE", "/"),
+    ("MOD", "%"),
+    ("POW", "^"),
+    ("LT", "<"),
+    ("LE", "<="),
+    ("GT", ">"),
+    ("GE", ">="),
+    ("EQ", "=="),
+    ("NE", "!="),
+    ("AND", "and"),
+    ("OR", "or"),
+)
+
+COPY, LABEL, GOTO, IF_FALSE, IF_TRUE, READ, WRITE = range(7)
+# Operations from FIRST_OPERATOR on are the binary operators, in order
+FIRST_OPERATOR = 7
+OPERATOR_SYMBOLS = tuple(symbol for _, symbol in OPERATORS)
+# Operation of the binary operation node of every kind code
+OPERATOR_CODES = {
+    NODE_KIND_CODES[kind]: FIRST_OPERATOR + code
+    for code, (kind, _) in enumerate(OPERATORS)
+}
+
+ADD = OPERATOR_CODES[NODE_KIND_CODES["PLUS"]]
+SUBTRACT = OPERATOR_CODES[NODE_KIND_CODES["MINUS"]]
+
+NO_OPERAND = 0
+
+
+class InstructionList:
+    """
+    Array-backed list of three-address instructions. Reading an item gives
+    the text of the instruction.
+    """
+
+    __slots__ = ("operations", "results", "lefts", "rights", "strings", "_string_ids")
+
+    def __init__(self):
+        self.operations = array("B")
+        # The target of the instruction, or the label of a jump or label
+        self.results = array("i")
+        self.lefts = array("i")
+        self.rights = array("i")
+        # Index 0 stands for no operand
+        self.strings = [None]
+        self._string_ids = {}
+
+    def intern(self, text):
+        """The operand of a name or literal"""
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def append(self, operation, result=NO_OPERAND, left=NO_OPERAND, right=NO_OPERAND):
+        self.operations.append(operation)
+        self.results.append(result)
+        self.lefts.append(left)
+        self.rights.append(right)
+
+    def __len__(self):
+        return len(self.operations)
+
+    def operand(self, value):
+        if value < 0:
+            return f"t{-value}"
+        return self.strings[value]
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self.operations):
+            raise IndexError("instruction index out of range")
+        operation = self.operations[index]
+        result = self.results[index]
+        operand = self.operand
+        if operation >= FIRST_OPERATOR:
+            symbol = OPERATOR_SYMBOLS[operation - FIRST_OPERATOR]
+            return (
+                f"    {operand(result)} = {operand(self.lefts[index])} "
+                f"{symbol} {operand(self.rights[index])}"
+            )
+        if operation == COPY:
+            return f"    {operand(result)} = {operand(self.lefts[index])}"
+        if operation == LABEL:
+            return f"L{result}:"
+        if operation == GOTO:
+            return f"    goto L{result}"
+        if operation == IF_FALSE:
+            return f"    ifFalse {operand(self.lefts[index])} goto L{result}"
+        if operation == IF_TRUE:
+            return f"    if {operand(self.lefts[index])} goto L{result}"
+        if operation == READ:
+            return f"    read {operand(result)}"
+        return f"    write {operand(self.lefts[index])}"
+
+    def lines(self, start=0, stop=None):
+        """Yields the text of the instructions from start to stop"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self[index]
+
+    def nbytes(self):
+        """Bytes taken by the instruction arrays"""
+        return sum(
+            column.itemsize * len(column)
+            for column in (self.operations, self.results, self.lefts, self.rights)
+        )
+
+
+class CodeGenerator:
+    """
+    Lowers the tree of a program without syntax nor semantic errors to
+    three-address code. Blocks are walked with an explicit stack, so any
+    nesting depth can be lowered.
+    """
+
+    def __init__(self, ast: AstArena):
+        self.ast = ast
+        self.code = InstructionList()
+        self.labels = 0
+
+    def handlers(self):
+        """The handler of every sentence kind, indexed by the kind code"""
+        table = [None] * len(NODE_KINDS)
+        table[ASSIGNMENT] = self.assignment
+        table[INCREMENT] = self.increment
+        table[DECREMENT] = self.decrement
+        table[IF] = self.if_statement
+        table[WHILE] = self.while_loop
+        table[DO_WHILE] = self.do_while_loop
+        table[INPUT] = self.input
+        table[OUTPUT] = self.output
+        return table
+
+    def generate(self):
+        """
+        Returns:
+            InstructionList: The code of main
+        """
+        ast = self.ast
+        code = self.code
+        if ast.root == NO_NODE:
+            return code
+        handlers = self.handlers()
+        kinds = ast.kinds
+        # Sentences still to lower and instructions to add between them, as
+        # (operation, result, left, right, node of the condition to read)
+        pending = [
+            statement
+            for statement in reversed(list(ast.children(ast.root)))
+            if kinds[statement] != VARIABLE_DECLARATION
+        ]
+        while pending:
+            item = pending.pop()
+            if type(item) is tuple:
+                operation, result, left, right, condition = item
+                if condition is not None:
+                    left = self.expression(condition)
+                code.append(operation, result, left, right)
+                continue
+            kind = kinds[item]
+            if kind != EMPTY_STATEMENT:
+                handlers[kind](item, pending)
+        return code
+
+    def new_label(self):
+        self.labels += 1
+        return self.labels
+
+    def name(self, index):
+        return self.code.intern(self.ast.value(index))
+
+    def expression(self, index):
+        """Adds the code of an expression and returns the operand of its value"""
+        ast = self.ast
+        kinds = ast.kinds
+        if kinds[index] in (IDENTIFIER, NUMBER):
+            return self.name(index)
+        first_children = ast.first_children
+        next_siblings = ast.next_siblings
+        code = self.code
+        operands = []
+        # Temporaries among the operands, t1 to t{live}
+        live = 0
+        stack = [(index, False)]
+        while stack:
+            node, operands_ready = stack.pop()
+            kind = kinds[node]
+            if kind == IDENTIFIER or kind == NUMBER:
+                operands.append(self.name(node))
+            elif not operands_ready:
+                left = first_children[node]
+                stack.append((node, True))
+                stack.append((next_siblings[left], False))
+                stack.append((left, False))
+            else:
+                right = operands.pop()
+                left = operands.pop()
+                live -= (left < 0) + (right < 0)
+                live += 1
+                code.append(OPERATOR_CODES[kind], -live, left, right)
+                operands.append(-live)
+        return operands[0]
+
+    def children(self, index):
+        return list(self.ast.children(index))
+
+    def assignment(self, index, pending):
+        target, expression = self.children(index)
+        value = self.expression(expression)
+        if value < 0:
+            # The last instruction made the value, it can set the target
+            self.code.results[-1] = self.name(target)
+        else:
+            self.code.append(COPY, self.name(target), value)
+
+    def increment(self, index, pending):
+        self.step(index, ADD)
+
+    def decrement(self, index, pending):
+        self.step(index, SUBTRACT)
+
+    def step(self, index, operation):
+        target = self.name(self.ast.first_children[index])
+        self.code.append(operation, target, target, self.code.intern("1"))
+
+    def if_statement(self, index, pending):
+        condition, true_branch, *false_branch = self.children(index)
+        else_label = self.new_label()
+        self.code.append(IF_FALSE, else_label, self.expression(condition))
+        block = self.children(true_branch)
+        if false_branch:
+            end_label = self.new_label()
+            block.append((GOTO, end_label, NO_OPERAND, NO_OPERAND, None))
+            block.append((LABEL, else_label, NO_OPERAND, NO_OPERAND, None))
+            block += self.children(false_branch[0])
+            block.append((LABEL, end_label, NO_OPERAND, NO_OPERAND, None))
+        else:
+            block.append((LABEL, else_label, NO_OPERAND, NO_OPERAND, None))
+        pending.extend(reversed(block))
+
+    def while_loop(self, index, pending):
+        condition, *body = self.children(index)
+        start_label = self.new_label()
+        end_label = self.new_label()
+        self.code.append(LABEL, start_label)
+        self.code.append(IF_FALSE, end_label, self.expression(condition))
+        body.append((GOTO, start_label, NO_OPERAND, NO_OPERAND, None))
+        body.append((LABEL, end_label, NO_OPERAND, NO_OPERAND, None))
+        pending.extend(reversed(body))
+
+    def do_while_loop(self, index, pending):
+        *body, condition = self.children(index)
+        start_label = self.new_label()
+        self.code.append(LABEL, start_label)
+        body.append((IF_TRUE, start_label, NO_OPERAND, NO_OPERAND, condition))
+        pending.extend(reversed(body))
+
+    def input(self, index, pending):
+        self.code.append(READ, self.code.intern(self.ast.target(index)))
+
+    def output(self, index, pending):
+        value = self.expression(self.ast.first_children[index])
+        self.code.append(WRITE, NO_OPERAND, value)
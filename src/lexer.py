@@ -4,11 +4,21 @@
     with their errors and it's positions.
 """
 
+from array import array
 from pathlib import Path
+import io
+import json
+import mmap
+import os
 import re
+import sys
+
+from collector import gc_paused
 
 
 class Token:
+    __slots__ = ("type", "value", "lineno", "lexpos")
+
     def __init__(self, type, value, lineno, lexpos):
         self.type = type
         self.value = value
@@ -18,224 +28,1109 @@ class Token:
     def __repr__(self):
         return f"Token({self.type}, {self.value}, {self.lineno}, {self.lexpos})"
 
+    def __reduce__(self):
+        return (Token, (self.type, self.value, self.lineno, self.lexpos))
+
+    def as_dict(self):
+        return {
+            "type": self.type,
+            "value": self.value,
+            "lineno": self.lineno,
+            "lexpos": self.lexpos,
+        }
+
+
+class ByteToken(Token):
+    """
+    Token found by the mmap engine. It keeps the absolute byte offset and
+    length of its text in the source, and its value is only decoded from
+    the memory mapped source when it is read.
+    """
+
+    __slots__ = ("source", "offset", "length")
+
+    def __init__(self, type, source, offset, length, lineno, lexpos):
+        self.type = type
+        self.source = source
+        self.offset = offset
+        self.length = length
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    @property
+    def value(self):
+        text = str(self.source[self.offset : self.offset + self.length], "utf-8")
+        # A folded negative number spans only its digits, the minus sign
+        # may be separated from them in the source.
+        if self.type in NEGATIVE_NUMBER_TYPES:
+            return "-" + text
+        return text
+
+
+RESERVED_WORDS = {
+    "if": "IF",
+    "else": "ELSE",
+    "do": "DO",
+    "while": "WHILE",
+    "switch": "SWITCH",
+    "case": "CASE",
+    "double": "DOUBLE",
+    "main": "MAIN",
+    "cin": "CIN",
+    "cout": "COUT",
+    "int": "INT",
+    "float": "FLOAT",
+    "and": "AND",
+    "or": "OR",
+}
+
+OPERATORS = {
+    "(": "LPAREN",
+    ")": "RPAREN",
+    ",": "COMMA",
+    "{": "LBRACE",
+    "}": "RBRACE",
+    ";": "SEMICOLON",
+    "=": "ASSIGN",
+    "==": "EQ",
+    "+": "PLUS",
+    "++": "INCREMENT_OPERATOR",
+    "-": "MINUS",
+    "--": "DECREMENT_OPERATOR",
+    "*": "TIMES",
+    "/": "DIVIDE",
+    "%": "MOD",
+    "^": "POW",
+    "<": "LT",
+    "<=": "LE",
+    ">": "GT",
+    ">=": "GE",
+    "!": "NOT",
+    "!=": "NE",
+}
+
+NUMBER_TYPES = (
+    "INTEGER_NUMBER",
+    "REAL_NUMBER",
+    "NEGATIVE_INTEGER_NUMBER",
+    "NEGATIVE_REAL_NUMBER",
+)
+NEGATIVE_NUMBER_TYPES = ("NEGATIVE_INTEGER_NUMBER", "NEGATIVE_REAL_NUMBER")
+
+TOKEN_TYPES = (
+    ("Error", "IDENTIFIER")
+    + tuple(dict.fromkeys(RESERVED_WORDS.values()))
+    + tuple(dict.fromkeys(OPERATORS.values()))
+    + NUMBER_TYPES
+)
+TOKEN_TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+
+class TokenBuffer:
+    """
+    Compact, struct-of-arrays storage for a token stream.
+
+    Token types are kept as one byte codes, positions in unsigned int
+    arrays and values as indexes into a string table shared by every
+    token, so a repeated identifier or operator is stored only once.
+    Indexing the buffer builds the Token on demand, which keeps it usable
+    wherever a list of tokens is expected (e.g. by the Parser).
+    """
+
+    __slots__ = ("kinds", "linenos", "lexposes", "value_ids", "strings", "_string_ids")
+
+    def __init__(self, tokens=()):
+        self.kinds = array("B")
+        self.linenos = array("L")
+        self.lexposes = array("L")
+        self.value_ids = array("L")
+        self.strings = []
+        self._string_ids = {}
+        self.extend(tokens)
+
+    def append(self, token: Token):
+        value_id = self._string_ids.get(token.value)
+        if value_id is None:
+            value_id = self._string_ids[token.value] = len(self.strings)
+            self.strings.append(token.value)
+        self.kinds.append(TOKEN_TYPE_CODES[token.type])
+        self.linenos.append(token.lineno)
+        self.lexposes.append(token.lexpos)
+        self.value_ids.append(value_id)
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token)
+
+    def nbytes(self):
+        """Bytes used by the columns and the string table"""
+        columns = (self.kinds, self.linenos, self.lexposes, self.value_ids)
+        return sum(column.itemsize * len(column) for column in columns) + sum(
+            sys.getsizeof(string) for string in self.strings
+        )
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Token(
+            TOKEN_TYPES[self.kinds[index]],
+            self.strings[self.value_ids[index]],
+            self.linenos[index],
+            self.lexposes[index],
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+# One alternation for the whole language. findall returns the whitespace
+# before every token and its text, so no match object is built and the
+# column of a token is the length of what came before it. The order of the
+# alternatives mirrors the order of the checks in legacy_scanner, so both
+# engines agree on every input: identifiers are letters and underscores
+# only and a real number needs at least one digit after the dot.
+TOKEN_PATTERN = re.compile(
+    r"""
+    ([ \t\n]*)
+    (
+        /[*/]
+        | [a-zA-Z_]+
+        | \d+(?:\.\d+)?
+        | ==|\+\+|--|<=|>=|!=|[(),{};=+\-*/%^<>!]
+        | [^ \t\n]
+    )
+    """,
+    re.VERBOSE,
+)
+
+# Characters that cannot start any token. Whitespace, letters, digits and
+# operators always do, and a dot only belongs to a real number, which is
+# matched from its first digit.
+INVALID_CHARACTER = r"[^ \t\na-zA-Z_\d(),{};=+\-*/%^<>!]"
+
+# TOKEN_PATTERN with a run of invalid characters as a single error
+COALESCING_TOKEN_PATTERN = re.compile(
+    TOKEN_PATTERN.pattern.replace("| [^ \\t\\n]", f"| {INVALID_CHARACTER}+"),
+    re.VERBOSE,
+)
+
+# Type of the tokens whose text alone tells it
+FIXED_TOKEN_TYPES = {**RESERVED_WORDS, **OPERATORS}
+WORD_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+
+# Real numbers are matched so their dots are not counted as errors
+ERROR_COUNT_PATTERNS = {
+    False: re.compile(rf"\d+\.\d+|({INVALID_CHARACTER})"),
+    True: re.compile(rf"\d+\.\d+|({INVALID_CHARACTER}+)"),
+}
+
+# Longest run of invalid characters quoted in an error
+MAX_ERROR_TEXT = 20
+
+# Same alternation for the mmap engine, over UTF-8 bytes. A newline may be
+# preceded by a carriage return and an invalid character is a whole UTF-8
+# sequence, so errors read the same as in the text engines.
+BYTES_TOKEN_PATTERN = re.compile(
+    rb"""
+    (?P<SKIP>(?:[ \t]|\r?\n)+)
+    | (?P<BLOCK_COMMENT>/\*)
+    | (?P<LINE_COMMENT>//)
+    | (?P<WORD>[a-zA-Z_]+)
+    | (?P<REAL>[0-9]+\.[0-9]+)
+    | (?P<INTEGER>[0-9]+)
+    | (?P<OPERATOR>==|\+\+|--|<=|>=|!=|[(),{};=+\-*/%^<>!])
+    | (?P<ERROR>[\xc2-\xf4][\x80-\xbf]{1,3}|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+BYTES_RESERVED_WORDS = {word.encode(): type for word, type in RESERVED_WORDS.items()}
+BYTES_OPERATORS = {operator.encode(): type for operator, type in OPERATORS.items()}
+NON_ASCII_PATTERN = re.compile(rb"[\x80-\xff]")
+
+# Smallest part of a file worth lexing in its own process
+SHARD_MIN_BYTES = 1 << 20
+
+
+def get_lexical_analysis(
+    file: Path,
+    engine: str = "regex",
+    jobs: int = 1,
+    coalesce_errors: bool = False,
+    max_errors: int = None,
+):
+    """
+    Extracts the tokens and lexical errors of a file.
+
+    Args:
+        file (Path): The file to analyze
+        engine (str): "regex" (single pass), "legacy" (char by char) or
+            "mmap" (single pass over the memory mapped bytes of the file)
+            or "numpy" (vectorized, needs NumPy)
+        jobs (int): Worker processes that lex shards of the file in
+            parallel, with the regex engine
+        coalesce_errors (bool): Report a run of invalid characters as one
+            error, with the regex engine
+        max_errors (int): Stop lexing after this many errors, adding an
+            error that says so, with the regex engine
+
+    Returns:
+        tuple[list[Token], list[Token]]: The tokens and the errors
+    """
+    if engine not in ("mmap", "numpy") and engine not in SCANNERS:
+        raise ValueError(f"Unknown lexer engine {engine}")
+    if (coalesce_errors or max_errors is not None) and (engine != "regex" or jobs > 1):
+        raise ValueError("Error limits need the regex engine with one job")
+    if engine == "regex" and jobs > 1:
+        return sharded_scanner(file, jobs)
+    with gc_paused():
+        if engine == "mmap":
+            return mmap_scanner(file)
+        if engine == "numpy":
+            from numpy_lexer import numpy_scanner
+
+            return numpy_scanner(file)
+        with open(file, "r", encoding="utf-8") as f:
+            if engine == "regex":
+                return regex_scanner(f, coalesce_errors, max_errors)
+            return SCANNERS[engine](f)
+
+
+def open_source(source):
+    """Opens a path or "-" (stdin) for reading, a stream is returned as is"""
+    if source == "-":
+        return sys.stdin
+    if isinstance(source, (str, Path)):
+        return open(source, "r", encoding="utf-8")
+    return source
+
+
+def iter_tokens(source, coalesce_errors=False, max_errors=None):
+    """
+    Yields the tokens and lexical errors of a source as they are found.
+
+    Only one line of the source is held in memory at a time, so the
+    memory used does not depend on the size of the source.
+
+    Args:
+        source: A path, an open text stream or "-" to read from stdin
+        coalesce_errors (bool): Report a run of invalid characters as one
+            error
+        max_errors (int): Stop after this many errors, yielding an error
+            that says so
+
+    Yields:
+        Token: Tokens and errors (type "Error") in source order
+    """
+    f = open_source(source)
+    try:
+        yield from scan_tokens(f, coalesce_errors, max_errors)
+    finally:
+        if f is not source and f is not sys.stdin:
+            f.close()
+
+
+def scan_tokens(lines, coalesce_errors=False, max_errors=None):
+    tokens = scan_lines(lines, LineScanner(coalesce_errors=coalesce_errors))
+    if max_errors is None:
+        return tokens
+    return limit_errors(tokens, max_errors)
+
+
+def scan_lines(lines, scanner):
+    for lineno, line in enumerate(lines, start=1):
+        yield from scanner.scan_line(line, lineno)
+    yield from scanner.finish()
+
+
+def limit_errors(tokens, max_errors):
+    """Yields the tokens until max_errors errors are found, then says so"""
+    errors = 0
+    for token in tokens:
+        yield token
+        if token.type == "Error":
+            errors += 1
+            if errors >= max_errors:
+                yield too_many_errors(token, max_errors)
+                return
+
+
+def too_many_errors(last_error, max_errors):
+    """Error that ends the lexing once the error budget is spent"""
+    return Token(
+        "Error",
+        f"Too many errors, lexing stopped after {max_errors}",
+        last_error.lineno,
+        last_error.lexpos,
+    )
+
+
+def count_lexical_errors(source, coalesce_errors=False):
+    """
+    Counts the lexical errors of a source without building any token.
+
+    Args:
+        source: A path, an open text stream or "-" to read from stdin
+        coalesce_errors (bool): Count a run of invalid characters as one
+            error
+
+    Returns:
+        int: As many errors as the regex engine reports
+    """
+    find_errors = ERROR_COUNT_PATTERNS[coalesce_errors].findall
+    count = 0
+    is_block_comment = False
+    f = open_source(source)
+    try:
+        for line in f:
+            start = 0
+            if is_block_comment:
+                start = line.find("*/") + 2
+                if start == 1:
+                    continue
+                is_block_comment = False
+
+            # Nothing in the code before a comment can contain "//" or "/*"
+            end = len(line)
+            line_comment = line.find("//", start)
+            if line_comment >= 0:
+                end = line_comment
+            block_comment = line.find("/*", start, end)
+            if block_comment >= 0:
+                end = block_comment
+                is_block_comment = True
+            found = find_errors(line, start, end)
+            # Real numbers match with an empty group
+            count += len(found) - found.count("")
+    finally:
+        if f is not source and f is not sys.stdin:
+            f.close()
+    return count + is_block_comment
+
+
+class LineScanner:
+    """
+    State of the regex engine between lines, so a source can be lexed one
+    line at a time and resumed from any line whose entry state is known.
+    """
+
+    __slots__ = (
+        "is_block_comment",
+        "is_block_starting",
+        "minus",
+        "previous_type",
+        "held_errors",
+        "pattern",
+    )
+
+    def __init__(self, state=None, coalesce_errors=False):
+        self.restore(state or (False, None, None, None, ()))
+        self.pattern = COALESCING_TOKEN_PATTERN if coalesce_errors else TOKEN_PATTERN
+
+    def state(self):
+        """Hashable snapshot of the scanner, see restore"""
+        return (
+            self.is_block_comment,
+            self.is_block_starting if self.is_block_comment else None,
+            self.minus and (self.minus.lineno, self.minus.lexpos),
+            self.previous_type,
+            tuple(
+                (error.value, error.lineno, error.lexpos) for error in self.held_errors
+            ),
+        )
+
+    def restore(self, state):
+        (
+            self.is_block_comment,
+            self.is_block_starting,
+            minus,
+            self.previous_type,
+            held_errors,
+        ) = state
+        self.minus = minus and Token("MINUS", "-", *minus)
+        self.held_errors = [Token("Error", *error) for error in held_errors]
+
+    def scan_line(self, line, lineno):
+        """Returns the tokens and errors that scanning the line releases"""
+        found = []
+        add = found.append
+        start = 0
+        if self.is_block_comment:
+            end = line.find("*/")
+            if end < 0:
+                return found
+            self.is_block_comment = False
+            start = end + 2
+
+        fixed_type = FIXED_TOKEN_TYPES.get
+        # A "-" is held back until the next token shows whether it is folded
+        # into a number, along with the errors found meanwhile so the output
+        # stays in source order. previous_type is the type of the token
+        # released before it.
+        minus = self.minus
+        previous_type = self.previous_type
+        held_errors = self.held_errors
+
+        # Whitespace at the end is left out, it is not followed by a token
+        end = start
+        last = len(line.rstrip(" \t\n"))
+        for space, value in self.pattern.findall(line, start, last):
+            lexpos = end + len(space) + 1
+            end = lexpos + len(value) - 1
+            type = fixed_type(value)
+            if type is None:
+                first = value[0]
+                if first in WORD_START:
+                    type = "IDENTIFIER"
+                elif first.isdecimal():
+                    type = "REAL_NUMBER" if "." in value else "INTEGER_NUMBER"
+                    # A minus sign right before a number is folded into it
+                    # unless it reads as a subtraction between two numbers.
+                    if minus is not None and (
+                        previous_type is None
+                        or previous_type == "LPAREN"
+                        or previous_type not in NUMBER_TYPES
+                    ):
+                        minus = None
+                        value = "-" + value
+                        type = "NEGATIVE_" + type
+                elif value == "/*":
+                    # Like legacy_scanner, the rest of the opening line is ignored
+                    self.is_block_starting = (lineno, lexpos)
+                    self.is_block_comment = True
+                    break
+                elif value == "//":
+                    break
+                else:
+                    if len(value) == 1:
+                        message = f"Invalid character => {value}"
+                    else:
+                        if len(value) > MAX_ERROR_TEXT:
+                            value = value[:MAX_ERROR_TEXT] + "..."
+                        message = f"Invalid characters => {value} (columns {lexpos}-{end})"
+                    error = Token("Error", message, lineno, lexpos)
+                    if minus is not None:
+                        held_errors.append(error)
+                    else:
+                        add(error)
+                    continue
+            elif type == "MINUS":
+                if minus is not None:
+                    add(minus)
+                    previous_type = "MINUS"
+                    if held_errors:
+                        found += held_errors
+                        held_errors.clear()
+                minus = Token(type, value, lineno, lexpos)
+                continue
+
+            if minus is not None:
+                add(minus)
+                minus = None
+            if held_errors:
+                found += held_errors
+                held_errors.clear()
+            add(Token(type, value, lineno, lexpos))
+            previous_type = type
+
+        self.minus = minus
+        self.previous_type = previous_type
+        return found
+
+    def finish(self):
+        """Returns what is still held back once the source has ended"""
+        found = []
+        if self.minus is not None:
+            found.append(self.minus)
+        found += self.held_errors
+        if self.is_block_comment:
+            found.append(
+                Token(
+                    "Error",
+                    "Block comment not closed",
+                    self.is_block_starting[0],
+                    self.is_block_starting[1],
+                )
+            )
+        return found
+
+
+def split_lines(text: str):
+    """
+    Splits text into lines the same way reading a file does, with "\r\n"
+    and "\r" read as "\n".
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def count_errors(line_tokens):
+    """Number of errors in lists of tokens and errors"""
+    return sum(token.type == "Error" for tokens in line_tokens for token in tokens)
+
 
-def get_lexical_analysis(file: Path):
-    with open(file, "r", encoding="utf-8") as f:
+class LexerSession:
+    """
+    Keeps the tokens of a text up to date while it is edited.
+
+    The entry state of the scanner and the tokens released by every line
+    are cached. An edit re-lexes the edited lines and then only the lines
+    whose entry state changed, and splices the result into the cache.
+    """
+
+    def __init__(self, text: str = ""):
+        self.lines = []
+        self.states = []  # Scanner state when each line starts
+        self.line_tokens = []  # Tokens and errors released by each line
+        self.tail = []  # Tokens and errors released at the end of the text
+        self.error_count = 0
+        self.edit(1, 0, text)
+
+    def edit(self, first_line: int, last_line: int, text: str):
+        """
+        Replaces a range of lines with new text and re-lexes what changed.
+
+        Args:
+            first_line (int): First replaced line, starting at 1
+            last_line (int): Last replaced line, first_line - 1 to insert.
+                Lines past the end of the text are ignored.
+            text (str): The new text of the lines, with its line breaks
+
+        Returns:
+            int: The number of lines that were lexed
+        """
+        start = first_line - 1
+        end = min(last_line, len(self.lines))
+        new_lines = split_lines(text)
+        # Text without a final line break runs into the following line
+        if new_lines and not new_lines[-1].endswith("\n") and end < len(self.lines):
+            new_lines[-1] += self.lines[end]
+            end += 1
+        if start == len(self.lines) and start > 0 and not self.lines[-1].endswith("\n"):
+            start -= 1
+            new_lines[0:1] = split_lines(self.lines[start] + "".join(new_lines[0:1]))
+        delta = len(new_lines) - (end - start)
+
+        scanner = LineScanner()
+        if start < len(self.lines):
+            scanner.restore(self.states[start])
+        elif start > 0:
+            scanner.restore(self.states[start - 1])
+            scanner.scan_line(self.lines[start - 1], start)
+
+        states = []
+        line_tokens = []
+        lineno = start
+        for line in new_lines:
+            lineno += 1
+            states.append(scanner.state())
+            line_tokens.append(scanner.scan_line(line, lineno))
+
+        # Lines after the edit are re-lexed until the scanner reaches one
+        # of them in the state it had before the edit.
+        reused = end
+        while reused < len(self.lines):
+            state = scanner.state()
+            if state == self._shift_state(self.states[reused], end, delta):
+                break
+            lineno += 1
+            states.append(state)
+            line_tokens.append(scanner.scan_line(self.lines[reused], lineno))
+            reused += 1
+
+        self.error_count -= count_errors(self.line_tokens[start:reused])
+        self.error_count += count_errors(line_tokens)
+        if delta:
+            for index in range(reused, len(self.lines)):
+                self.states[index] = self._shift_state(self.states[index], end, delta)
+                self._shift_tokens(self.line_tokens[index], end, delta)
+        if reused == len(self.lines):
+            self.error_count -= count_errors([self.tail])
+            self.tail = scanner.finish()
+            self.error_count += count_errors([self.tail])
+        elif delta:
+            self._shift_tokens(self.tail, end, delta)
+
+        self.lines[start:end] = new_lines
+        self.states[start:reused] = states
+        self.line_tokens[start:reused] = line_tokens
+        return len(states)
+
+    @staticmethod
+    def _shift_state(state, last_line, delta):
+        if not delta:
+            return state
+        is_block_comment, is_block_starting, minus, previous_type, held_errors = state
+        if is_block_starting and is_block_starting[0] > last_line:
+            is_block_starting = (is_block_starting[0] + delta, is_block_starting[1])
+        if minus and minus[0] > last_line:
+            minus = (minus[0] + delta, minus[1])
+        held_errors = tuple(
+            (value, lineno + delta if lineno > last_line else lineno, lexpos)
+            for value, lineno, lexpos in held_errors
+        )
+        return (is_block_comment, is_block_starting, minus, previous_type, held_errors)
+
+    @staticmethod
+    def _shift_tokens(tokens, last_line, delta):
+        for token in tokens:
+            if token.lineno > last_line:
+                token.lineno += delta
+
+    def get_lexical_analysis(self):
+        """Returns the tokens and errors, like get_lexical_analysis does"""
         tokens = []
         errors = []
-        is_block_comment = False
-        is_block_starting = []
-        identifier_pattern = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
-        reserved_words_pattern = re.compile(
-            r"\b(if|else|do|while|switch|case|double|main|cin|cout|int|float)\b"
+        for line_tokens in self.line_tokens + [self.tail]:
+            for token in line_tokens:
+                if token.type == "Error":
+                    errors.append(token)
+                else:
+                    tokens.append(token)
+        return tokens, errors
+
+
+def regex_scanner(lines, coalesce_errors=False, max_errors=None):
+    tokens = []
+    errors = []
+    add_token = tokens.append
+    add_error = errors.append
+    for token in scan_tokens(lines, coalesce_errors, max_errors):
+        if token.type == "Error":
+            add_error(token)
+        else:
+            add_token(token)
+    return tokens, errors
+
+
+def scan_bytes(source):
+    """
+    Yields the tokens and errors of a UTF-8 source given as bytes, a mmap or
+    a memoryview, without decoding it. Unlike the text engines, only ASCII
+    digits make up numbers and a lone carriage return is not a line break.
+    """
+    source = memoryview(source)
+    size = len(source)
+    scan = BYTES_TOKEN_PATTERN.finditer
+    is_block_comment = False
+    is_block_starting = []
+    # Same minus sign folding as scan_tokens
+    minus = None
+    previous = None
+    held_errors = []
+
+    lineno = 0
+    line_start = 0
+    while line_start < size:
+        lineno += 1
+        line_end = source.obj.find(b"\n", line_start)
+        line_end = size if line_end < 0 else line_end + 1
+        start = line_start
+        if is_block_comment:
+            end = source.obj.find(b"*/", line_start, line_end)
+            if end < 0:
+                line_start = line_end
+                continue
+            is_block_comment = False
+            start = end + 2
+        # Columns count characters, so they only differ from byte
+        # distances on lines with multibyte characters.
+        is_ascii = NON_ASCII_PATTERN.search(source.obj, line_start, line_end) is None
+
+        for match in scan(source.obj, start, line_end):
+            kind = match.lastgroup
+            if kind == "SKIP":
+                continue
+
+            offset = match.start()
+            length = match.end() - offset
+            if is_ascii:
+                lexpos = offset - line_start + 1
+            else:
+                lexpos = len(str(source[line_start:offset], "utf-8", "replace")) + 1
+            if kind == "WORD":
+                token_type = BYTES_RESERVED_WORDS.get(match.group(), "IDENTIFIER")
+            elif kind == "OPERATOR":
+                token_type = BYTES_OPERATORS[match.group()]
+                if token_type == "MINUS":
+                    if minus is not None:
+                        yield minus
+                        previous = minus
+                        if held_errors:
+                            yield from held_errors
+                            held_errors.clear()
+                    minus = ByteToken(
+                        token_type, source, offset, length, lineno, lexpos
+                    )
+                    continue
+            elif kind == "INTEGER" or kind == "REAL":
+                token_type = "INTEGER_NUMBER" if kind == "INTEGER" else "REAL_NUMBER"
+                if minus is not None and (
+                    previous is None
+                    or previous.type == "LPAREN"
+                    or previous.type not in NUMBER_TYPES
+                ):
+                    minus = None
+                    token_type = "NEGATIVE_" + token_type
+            elif kind == "ERROR":
+                char = str(match.group(), "utf-8", "replace")
+                error = Token("Error", f"Invalid character => {char}", lineno, lexpos)
+                if minus is not None:
+                    held_errors.append(error)
+                else:
+                    yield error
+                continue
+            elif kind == "BLOCK_COMMENT":
+                is_block_starting = [lineno, lexpos]
+                is_block_comment = True
+                break
+            else:
+                break
+
+            token = ByteToken(token_type, source, offset, length, lineno, lexpos)
+            if minus is not None:
+                yield minus
+                minus = None
+            if held_errors:
+                yield from held_errors
+                held_errors.clear()
+            yield token
+            previous = token
+        line_start = line_end
+
+    if minus is not None:
+        yield minus
+    yield from held_errors
+
+    if is_block_comment:
+        yield Token(
+            "Error",
+            "Block comment not closed",
+            is_block_starting[0],
+            is_block_starting[1],
         )
-        number_pattern = re.compile(r"\b\d+\b")
-        symbol_pattern = re.compile(r"\(|\)|,|{|}|;")
-        assignment_pattern = re.compile(r"=")
-        logical_op_pattern = re.compile(r"\b(?:and|or)\b")
-        aritmethic_op_pattern = re.compile(r"\+|-|\*|/|%|\^")
-        relational_op_pattern = re.compile(r"<|>|!")
-
-        for lineno, line in enumerate(f.readlines(), start=1):
-            skip_col = 0
-            for index_string, char in enumerate(line):
-                lexpos = index_string + 1
-                if skip_col == 0:
-                    if char == " ":
+
+
+def mmap_scanner(file: Path):
+    tokens = []
+    errors = []
+    with open(file, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return tokens, errors
+        # The map outlives the file: the tokens slice their values from it
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    for token in scan_bytes(source):
+        if token.type == "Error":
+            errors.append(token)
+        else:
+            tokens.append(token)
+    return tokens, errors
+
+
+def find_shards(file: Path, count: int):
+    """
+    Splits a file into up to count byte ranges that end at line breaks.
+
+    Returns:
+        list[tuple]: (file, start, end, first line number) of each shard
+    """
+    size = os.path.getsize(file)
+    shard_size = max(size // count + 1, SHARD_MIN_BYTES)
+    shards = []
+    lineno = 1
+    with open(file, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + shard_size, size))
+            end = f.tell() + len(f.readline())
+            shards.append((file, start, end, lineno))
+            f.seek(start)
+            # Line breaks are counted like text mode reads them
+            is_after_cr = False
+            while f.tell() < end:
+                chunk = f.read(min(SHARD_MIN_BYTES, end - f.tell()))
+                lineno += chunk.count(b"\n") + chunk.count(b"\r") - chunk.count(b"\r\n")
+                if is_after_cr and chunk.startswith(b"\n"):
+                    lineno -= 1
+                is_after_cr = chunk.endswith(b"\r")
+            start = end
+    return shards
+
+
+def read_shard_lines(shard):
+    file, start, end, _ = shard
+    with open(file, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    return split_lines(text)
+
+
+def lex_shard(shard):
+    """Lexes a shard as if it started the file, see sharded_scanner"""
+    scanner = LineScanner()
+    states = []
+    line_tokens = []
+    for lineno, line in enumerate(read_shard_lines(shard), start=shard[3]):
+        states.append(scanner.state())
+        line_tokens.append(scanner.scan_line(line, lineno))
+    return states, line_tokens, scanner.state()
+
+
+def sharded_scanner(file: Path, jobs: int):
+    """
+    Lexes the shards of a file in parallel and merges them.
+
+    Every worker starts its shard with a fresh scanner. When the real
+    state at the start of a shard (an open block comment, a "-" that may
+    fold into a number, the previous token) differs, only the lines before
+    the worker's state matches the real one again are lexed once more.
+    """
+    from batch import imap_ordered
+
+    tokens = []
+    errors = []
+    scanner = LineScanner()
+    shards = find_shards(file, jobs)
+    for shard, (states, line_tokens, end_state) in zip(
+        shards, imap_ordered(lex_shard, shards, jobs)
+    ):
+        resumed = 0
+        if states and states[0] != scanner.state():
+            lines = read_shard_lines(shard)
+            while resumed < len(lines) and scanner.state() != states[resumed]:
+                line_tokens[resumed] = scanner.scan_line(
+                    lines[resumed], shard[3] + resumed
+                )
+                resumed += 1
+        if resumed < len(states):
+            scanner.restore(end_state)
+        for found in line_tokens:
+            for token in found:
+                if token.type == "Error":
+                    errors.append(token)
+                else:
+                    tokens.append(token)
+
+    for token in scanner.finish():
+        if token.type == "Error":
+            errors.append(token)
+        else:
+            tokens.append(token)
+    return tokens, errors
+
+
+def legacy_scanner(lines):
+    tokens = []
+    errors = []
+    is_block_comment = False
+    is_block_starting = []
+    identifier_pattern = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+    reserved_words_pattern = re.compile(
+        r"\b(if|else|do|while|switch|case|double|main|cin|cout|int|float)\b"
+    )
+    number_pattern = re.compile(r"\b\d+\b")
+    symbol_pattern = re.compile(r"\(|\)|,|{|}|;")
+    assignment_pattern = re.compile(r"=")
+    logical_op_pattern = re.compile(r"\b(?:and|or)\b")
+    aritmethic_op_pattern = re.compile(r"\+|-|\*|/|%|\^")
+    relational_op_pattern = re.compile(r"<|>|!")
+
+    for lineno, line in enumerate(lines, start=1):
+        skip_col = 0
+        for index_string, char in enumerate(line):
+            lexpos = index_string + 1
+            if skip_col == 0:
+                if char == " ":
+                    continue
+                if char == "\t":
+                    continue
+                if char == "\n":
+                    continue
+
+                if re.match(symbol_pattern, char) and not is_block_comment:
+                    identify_symbol(char, tokens, lineno, lexpos)
+                    continue
+
+                if re.match(assignment_pattern, char) and not is_block_comment:
+                    if (index_string + 1 < len(line)) and line[index_string + 1] == "=":
+                        tokens.append(Token("EQ", "==", lineno, lexpos))
+                        skip_col += 1
                         continue
-                    if char == "\t":
+                    tokens.append(Token("ASSIGN", char, lineno, lexpos))
+                    continue
+
+                if re.match(aritmethic_op_pattern, char) and not is_block_comment:
+                    if char == "+" and line[index_string + 1] == "+":
+                        tokens.append(Token("INCREMENT_OPERATOR", "++", lineno, lexpos))
+                        skip_col += 1
                         continue
-                    if char == "\n":
+                    if char == "-" and line[index_string + 1] == "-":
+                        tokens.append(Token("DECREMENT_OPERATOR", "--", lineno, lexpos))
+                        skip_col += 1
                         continue
+                    if (
+                        char == "/"
+                        and (index_string + 1 < len(line))
+                        and (line[index_string + 1] == "*")
+                    ):
+                        is_block_starting = [lineno, lexpos]
+                        is_block_comment = True
+                        break
+                    if (
+                        char == "/"
+                        and (index_string + 1 < len(line))
+                        and line[index_string + 1] == "/"
+                    ):
+                        break
+                    identify_aritmethic_operator(char, tokens, lineno, lexpos)
+                    continue
 
-                    if re.match(symbol_pattern, char) and not is_block_comment:
-                        identify_symbol(char, tokens, lineno, lexpos)
+                if re.match(relational_op_pattern, char) and not is_block_comment:
+                    if (index_string + 1 < len(line)) and line[index_string + 1] == "=":
+                        identify_relational_operator(char + "=", tokens, lineno, lexpos)
+                        skip_col += 1
                         continue
+                    identify_relational_operator(char, tokens, lineno, lexpos)
+                    continue
 
-                    if re.match(assignment_pattern, char) and not is_block_comment:
-                        if (index_string + 1 < len(line)) and line[
-                            index_string + 1
-                        ] == "=":
-                            tokens.append(Token("EQ", "==", lineno, lexpos))
-                            skip_col += 1
-                            continue
-                        tokens.append(Token("ASSIGN", char, lineno, lexpos))
-                        continue
+                if re.match(identifier_pattern, char) and not is_block_comment:
+                    identifier = char
+                    rest_of_string = line[index_string + 1 :]
+                    while True:
+                        for c in rest_of_string:
+                            if re.match(identifier_pattern, c):
+                                identifier += c
+                                skip_col += 1
+                            else:
+                                break
+                        break
 
-                    if re.match(aritmethic_op_pattern, char) and not is_block_comment:
-                        if char == "+" and line[index_string + 1] == "+":
-                            tokens.append(
-                                Token("INCREMENT_OPERATOR", "++", lineno, lexpos)
-                            )
-                            skip_col += 1
-                            continue
-                        if char == "-" and line[index_string + 1] == "-":
-                            tokens.append(
-                                Token("DECREMENT_OPERATOR", "--", lineno, lexpos)
-                            )
-                            skip_col += 1
-                            continue
-                        if (
-                            char == "/"
-                            and (index_string + 1 < len(line))
-                            and (line[index_string + 1] == "*")
-                        ):
-                            is_block_starting = [lineno, lexpos]
-                            is_block_comment = True
-                            break
-                        if (
-                            char == "/"
-                            and (index_string + 1 < len(line))
-                            and line[index_string + 1] == "/"
-                        ):
-                            break
-                        identify_aritmethic_operator(char, tokens, lineno, lexpos)
+                    if re.match(logical_op_pattern, identifier):
+                        identify_logical_operator(identifier, tokens, lineno, lexpos)
                         continue
 
-                    if re.match(relational_op_pattern, char) and not is_block_comment:
-                        if (index_string + 1 < len(line)) and line[
-                            index_string + 1
-                        ] == "=":
-                            identify_relational_operator(
-                                char + "=", tokens, lineno, lexpos
-                            )
-                            skip_col += 1
-                            continue
-                        identify_relational_operator(char, tokens, lineno, lexpos)
+                    if re.match(reserved_words_pattern, identifier):
+                        identify_reserved_words(identifier, tokens, lineno, lexpos)
                         continue
 
-                    if re.match(identifier_pattern, char) and not is_block_comment:
-                        identifier = char
-                        rest_of_string = line[index_string + 1 :]
-                        while True:
-                            for c in rest_of_string:
-                                if re.match(identifier_pattern, c):
-                                    identifier += c
-                                    skip_col += 1
-                                else:
-                                    break
-                            break
-
-                        if re.match(logical_op_pattern, identifier):
-                            identify_logical_operator(
-                                identifier, tokens, lineno, lexpos
-                            )
-                            continue
-
-                        if re.match(reserved_words_pattern, identifier):
-                            identify_reserved_words(identifier, tokens, lineno, lexpos)
-                            continue
-
-                        tokens.append(Token("IDENTIFIER", identifier, lineno, lexpos))
-                        continue
+                    tokens.append(Token("IDENTIFIER", identifier, lineno, lexpos))
+                    continue
 
-                    if re.match(number_pattern, char) and not is_block_comment:
-                        number = char
-                        rest_of_string = line[index_string + 1 :]
-                        is_float_recognized = False
-                        while True:
-                            for i_c, c in enumerate(rest_of_string):
-                                if re.match(number_pattern, c):
-                                    number += c
-                                    skip_col += 1
-                                elif (
-                                    c == "."
-                                    and re.match(
-                                        number_pattern, rest_of_string[i_c + 1]
-                                    )
-                                    and not is_float_recognized
-                                ):
-                                    is_float_recognized = True
-                                    number += c
-                                    skip_col += 1
-                                else:
-                                    break
-                            break
-                        if is_float_recognized:
-                            if tokens and tokens[-1].value == "-":
-                                if (
-                                    len(tokens) >= 2
-                                    and tokens[-2].value == "("
-                                    or tokens[-2].type
-                                    not in (
-                                        "INTEGER_NUMBER",
-                                        "REAL_NUMBER",
-                                        "NEGATIVE_INTEGER_NUMBER",
+                if re.match(number_pattern, char) and not is_block_comment:
+                    number = char
+                    rest_of_string = line[index_string + 1 :]
+                    is_float_recognized = False
+                    while True:
+                        for i_c, c in enumerate(rest_of_string):
+                            if re.match(number_pattern, c):
+                                number += c
+                                skip_col += 1
+                            elif (
+                                c == "."
+                                and re.match(number_pattern, rest_of_string[i_c + 1])
+                                and not is_float_recognized
+                            ):
+                                is_float_recognized = True
+                                number += c
+                                skip_col += 1
+                            else:
+                                break
+                        break
+                    if is_float_recognized:
+                        if tokens and tokens[-1].value == "-":
+                            if (
+                                len(tokens) >= 2
+                                and tokens[-2].value == "("
+                                or tokens[-2].type
+                                not in (
+                                    "INTEGER_NUMBER",
+                                    "REAL_NUMBER",
+                                    "NEGATIVE_INTEGER_NUMBER",
+                                    "NEGATIVE_REAL_NUMBER",
+                                )
+                            ):
+                                tokens.pop()
+                                number = "-" + number
+                                tokens.append(
+                                    Token(
                                         "NEGATIVE_REAL_NUMBER",
+                                        number,
+                                        lineno,
+                                        lexpos,
                                     )
-                                ):
-                                    tokens.pop()
-                                    number = "-" + number
-                                    tokens.append(
-                                        Token(
-                                            "NEGATIVE_REAL_NUMBER",
-                                            number,
-                                            lineno,
-                                            lexpos,
-                                        )
-                                    )
-                                    continue
-                            tokens.append(Token("REAL_NUMBER", number, lineno, lexpos))
-                            continue
+                                )
+                                continue
+                        tokens.append(Token("REAL_NUMBER", number, lineno, lexpos))
+                        continue
+                    if tokens and tokens[-1].value == "-":
                         if tokens and tokens[-1].value == "-":
-                            if tokens and tokens[-1].value == "-":
-                                if (
-                                    len(tokens) >= 2
-                                    and tokens[-2].value == "("
-                                    or tokens[-2].type
-                                    not in (
-                                        "INTEGER_NUMBER",
-                                        "REAL_NUMBER",
+                            if (
+                                len(tokens) >= 2
+                                and tokens[-2].value == "("
+                                or tokens[-2].type
+                                not in (
+                                    "INTEGER_NUMBER",
+                                    "REAL_NUMBER",
+                                    "NEGATIVE_INTEGER_NUMBER",
+                                    "NEGATIVE_REAL_NUMBER",
+                                )
+                            ):
+                                tokens.pop()
+                                number = "-" + number
+                                tokens.append(
+                                    Token(
                                         "NEGATIVE_INTEGER_NUMBER",
-                                        "NEGATIVE_REAL_NUMBER",
+                                        number,
+                                        lineno,
+                                        lexpos,
                                     )
-                                ):
-                                    tokens.pop()
-                                    number = "-" + number
-                                    tokens.append(
-                                        Token(
-                                            "NEGATIVE_INTEGER_NUMBER",
-                                            number,
-                                            lineno,
-                                            lexpos,
-                                        )
-                                    )
-                                    continue
-                        tokens.append(Token("INTEGER_NUMBER", number, lineno, lexpos))
-                        continue
+                                )
+                                continue
+                    tokens.append(Token("INTEGER_NUMBER", number, lineno, lexpos))
+                    continue
 
-                    if not is_block_comment:
-                        errors.append(
-                            Token(
-                                "Error",
-                                f"Invalid character => {char}",
-                                lineno,
-                                lexpos,
-                            )
+                if not is_block_comment:
+                    errors.append(
+                        Token(
+                            "Error",
+                            f"Invalid character => {char}",
+                            lineno,
+                            lexpos,
                         )
+                    )
 
-                    if is_block_comment:
-                        if (
-                            char == "*"
-                            and (index_string + 1 < len(line))
-                            and line[index_string + 1] == "/"
-                        ):
-                            is_block_comment = False
-                            skip_col += 1
-                else:
-                    skip_col -= 1
+                if is_block_comment:
+                    if (
+                        char == "*"
+                        and (index_string + 1 < len(line))
+                        and line[index_string + 1] == "/"
+                    ):
+                        is_block_comment = False
+                        skip_col += 1
+            else:
+                skip_col -= 1
 
-        if is_block_comment:
-            errors.append(
-                Token(
-                    "Error",
-                    "Block comment not closed",
-                    is_block_starting[0],
-                    is_block_starting[1],
-                )
+    if is_block_comment:
+        errors.append(
+            Token(
+                "Error",
+                "Block comment not closed",
+                is_block_starting[0],
+                is_block_starting[1],
             )
+        )
+
+    return tokens, errors
 
-        return tokens, errors
+
+SCANNERS = {"regex": regex_scanner, "legacy": legacy_scanner}
 
 
 def identify_symbol(char: str, tokens: list, lineno: int, lexpos: int):
@@ -317,23 +1212,135 @@ def identify_reserved_words(char: str, tokens: list, lineno: int, lexpos: int):
         tokens.append(Token("FLOAT", char, lineno, lexpos))
 
 
+def cached(cache, path: Path, analyze, *options):
+    """
+    Returns analyze(source) for the text of a file, or what it returned
+    for the same bytes before if the CompileCache has it. The file is read
+    once, so the result matches the bytes it is cached for.
+    """
+    source = Path(path).read_bytes()
+    key = cache.key(source, analyze.__name__, *options)
+    result = cache.get(key)
+    if result is None:
+        with io.TextIOWrapper(io.BytesIO(source), encoding="utf-8") as f:
+            result = analyze(f, *options)
+        cache.put(key, result)
+    return result
+
+
+def json_lines(source, coalesce_errors=False, max_errors=None):
+    """The tokens and errors of a source as JSON lines"""
+    return "".join(
+        json.dumps(token.as_dict()) + "\n"
+        for token in iter_tokens(source, coalesce_errors, max_errors)
+    )
+
+
+def count_file_errors_to_json(path: Path, coalesce_errors=False, cache=None):
+    """Counts the lexical errors of a file and returns them as a JSON line"""
+    name = str(path)
+    try:
+        if cache is None:
+            count = count_lexical_errors(path, coalesce_errors)
+        else:
+            count = cached(cache, path, count_lexical_errors, coalesce_errors)
+        line = json.dumps({"file": name, "errors": count})
+    except (OSError, UnicodeDecodeError) as error:
+        line = json.dumps({"file": name, "type": "FileError", "value": str(error)})
+    return line + "\n"
+
+
+def lex_file_to_json(path: Path, coalesce_errors=False, max_errors=None, cache=None):
+    """Lexes a file and returns its tokens as JSON lines tagged with the file"""
+    name = str(path)
+    try:
+        if cache is None:
+            lines = json_lines(path, coalesce_errors, max_errors)
+        else:
+            lines = cached(cache, path, json_lines, coalesce_errors, max_errors)
+    except (OSError, UnicodeDecodeError) as error:
+        line = json.dumps({"file": name, "type": "FileError", "value": str(error)})
+        return line + "\n"
+    # JSON escapes line breaks in strings, so every object starts a line
+    return ("\n" + lines).replace("\n{", "\n{" + f'"file": {json.dumps(name)}, ')[1:]
+
+
 if __name__ == "__main__":
-    import sys
+    import argparse
+    from functools import partial
+    from batch import expand_paths, imap_ordered
 
-    args = sys.argv
-    if len(args) < 2:
-        print("No arguments provided")
-    elif len(args) > 2:
-        print("Bad arguments")
+    arg_parser = argparse.ArgumentParser(
+        description="Lexes source files and writes their tokens as JSON lines"
+    )
+    arg_parser.add_argument(
+        "sources", nargs="+", help="Files, directories or globs, or - for stdin"
+    )
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, help="Worker processes (all the CPUs by default)"
+    )
+    arg_parser.add_argument(
+        "--coalesce-errors",
+        action="store_true",
+        help="Report a run of invalid characters as one error",
+    )
+    arg_parser.add_argument(
+        "--max-errors", type=int, help="Stop lexing a file after this many errors"
+    )
+    arg_parser.add_argument(
+        "--count-errors",
+        action="store_true",
+        help="Only write the number of errors of every file",
+    )
+    arg_parser.add_argument(
+        "--cache-dir", type=Path, help="Directory of the compile cache"
+    )
+    arg_parser.add_argument(
+        "--no-cache", action="store_true", help="Lex every file again"
+    )
+    args = arg_parser.parse_args()
+    if args.no_cache:
+        cache = None
     else:
-        file_path = Path(args[1])
-        if not file_path.exists():
-            print("File does not exist")
-        else:
-            tkns, errs = get_lexical_analysis(file_path)
+        from compile_cache import CompileCache
 
-            for token in tkns:
-                print(f"{token}")
+        cache = CompileCache(args.cache_dir)
 
-            for error in errs:
-                print(f"{error}")
+    try:
+        if args.count_errors:
+            files = ["-"] if args.sources == ["-"] else expand_paths(args.sources)
+            count = partial(
+                count_file_errors_to_json,
+                coalesce_errors=args.coalesce_errors,
+                cache=None if args.sources == ["-"] else cache,
+            )
+            for output in imap_ordered(count, files, args.jobs):
+                sys.stdout.write(output)
+        elif args.sources == ["-"] or (
+            len(args.sources) == 1 and Path(args.sources[0]).is_file()
+        ):
+            # One JSON object per line, written as soon as each token is found
+            for token in iter_tokens(
+                args.sources[0], args.coalesce_errors, args.max_errors
+            ):
+                sys.stdout.write(json.dumps(token.as_dict()) + "\n")
+        else:
+            files = expand_paths(args.sources)
+            if not files:
+                print("File does not exist")
+            # Every file is lexed in a worker, the output keeps the file order
+            lex = partial(
+                lex_file_to_json,
+                coalesce_errors=args.coalesce_errors,
+                max_errors=args.max_errors,
+                cache=cache,
+            )
+            for output in imap_ordered(lex, files, args.jobs):
+                sys.stdout.write(output)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away, like head: the rest of the output is
+        # dropped and the exit status is the one of a SIGPIPE
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(141)
@@ -3,8 +3,10 @@
 import sys
 import os
 from pathlib import Path
-from parser_s import Parser
-from lexer import get_lexical_analysis
+from compile_cache import CompileCache, compile_file
+from semantic import SemanticAnalyzer
+from intermediate_code import CodeGenerator
+from optimizer import ConstantFolder
 
 from PyQt5.QtWidgets import (
     QMainWindow,
@@ -30,9 +32,14 @@ from components.dock_panels import (
     set_up_dock_panels,
     set_lexical_analysis_result,
     set_syntactic_analysis_result,
+    set_semantic_analysis_result,
+    set_hash_table_result,
+    set_intermediate_code_result,
 )
 from components.side_bar import set_up_sidebar
 
+MAX_LEXICAL_ERRORS = 1000  # Lexing stops after this many errors
+
 
 class MainWindow(QMainWindow):
     """Main window of the application."""
@@ -48,8 +55,10 @@ class MainWindow(QMainWindow):
         self.cursor_info_label = QLabel(
             "Line: , Column: "
         )  # Create a label to show the cursor position
+        self.lexical_errors_label = QLabel()  # Lexical errors of the open file
 
         self.current_file = None  # Variable to store the current file
+        self.compile_cache = CompileCache()  # Results of unchanged files
 
         self.init_ui()  # Call the method to initialize the UI
 
@@ -75,6 +84,7 @@ class MainWindow(QMainWindow):
         """Get the editor widget."""
         editor = Editor()
         editor.cursorPositionChangedSignal.connect(self.get_current_line_column)
+        editor.lexicalErrorsChangedSignal.connect(self.set_lexical_errors_count)
         return editor
 
     def set_new_tab(self, path: Path, is_new_file=False):
@@ -184,13 +194,46 @@ class MainWindow(QMainWindow):
     def compile(self):
         """Compile the current file."""
         if self.current_file is not None:
-            lexycal_results = get_lexical_analysis(self.current_file)
-            set_lexical_analysis_result(lexycal_results)
-            if lexycal_results[1] == []:
-                parser = Parser(lexycal_results[0])
-                set_syntactic_analysis_result(parser.parse())
-                self.statusBar().showMessage("Compilation successful", 2000)
+            tokens, errors, ast, syntax_errors = compile_file(
+                self.current_file,
+                coalesce_errors=True,
+                max_errors=MAX_LEXICAL_ERRORS,
+                cache=self.compile_cache,
+            )
+            set_lexical_analysis_result((tokens, errors))
+            if errors == []:
+                set_syntactic_analysis_result(ast.root_view(), syntax_errors)
+                analyzer = SemanticAnalyzer(ast)
+                types = analyzer.analyze()
+                set_semantic_analysis_result(analyzer)
+                set_hash_table_result(analyzer.symbols)
+                if syntax_errors or analyzer.errors:
+                    set_intermediate_code_result(None)
+                else:
+                    # The code is generated from the folded tree
+                    folder = ConstantFolder(ast, types)
+                    optimized = folder.fold()
+                    set_intermediate_code_result(CodeGenerator(optimized).generate())
+                if syntax_errors:
+                    self.statusBar().showMessage(
+                        f"Compilation failed, {len(syntax_errors)} syntax errors", 2000
+                    )
+                elif analyzer.errors:
+                    self.statusBar().showMessage(
+                        f"Compilation failed, {len(analyzer.errors)} semantic errors",
+                        2000,
+                    )
+                else:
+                    self.statusBar().showMessage(
+                        f"Compilation successful, {folder.removed} nodes folded away",
+                        2000,
+                    )
             else:
+                # The later panels would still show the previous compile
+                set_syntactic_analysis_result(None)
+                set_semantic_analysis_result(None)
+                set_hash_table_result(None)
+                set_intermediate_code_result(None)
                 self.statusBar().showMessage("Compilation failed", 2000)
 
     def close_tab(self, index):
@@ -209,6 +252,18 @@ class MainWindow(QMainWindow):
         """Get the current line and column of the cursor."""
         self.cursor_info_label.setText(f"Line: {1+line}, Column: {1+index}")
 
+    def set_lexical_errors_count(self, count):
+        """Show the lexical errors of the text being edited."""
+        self.lexical_errors_label.setText(f"Lexical errors: {count}")
+
+    def tab_changed(self, index):
+        """Show the lexical errors of the editor of the new tab."""
+        editor = self.tab_view.widget(index)
+        if editor is None:
+            self.lexical_errors_label.clear()
+        else:
+            self.set_lexical_errors_count(editor.lexer_session.error_count)
+
     def set_up_body(self):
         """Set up the body of the window."""
         # Body
@@ -292,12 +347,14 @@ class MainWindow(QMainWindow):
         self.tab_view.setMovable(True)
         self.tab_view.setDocumentMode(True)
         self.tab_view.tabCloseRequested.connect(self.close_tab)
+        self.tab_view.currentChanged.connect(self.tab_changed)
 
         # Add tree view and tab view to split view
         self.hsplit.addWidget(self.tree_frame)
         self.hsplit.addWidget(self.tab_view)
 
-        # Add cursor info label to status bar (permanent widget)
+        # Add cursor info and lexical errors labels to status bar (permanent widgets)
+        self.statusBar().addPermanentWidget(self.lexical_errors_label)
         self.statusBar().addPermanentWidget(self.cursor_info_label)
 
         body.addWidget(self.hsplit)
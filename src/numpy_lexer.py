@@ -0,0 +1,204 @@
+"""
+Lexer backend that classifies the bytes of a source with NumPy.
+
+Every byte is classified in one vectorized pass and the boundaries of
+words and numbers are found with array shifts, so Python only runs once
+per token to build it. It yields the same tokens and errors as the mmap
+engine of lexer.py, and like it only ASCII digits make up numbers and a
+lone carriage return is not a line break. Columns on lines with invalid
+UTF-8 may differ, as stray continuation bytes are not counted.
+"""
+
+from pathlib import Path
+import re
+
+import numpy as np
+
+from lexer import NUMBER_TYPES, OPERATORS, RESERVED_WORDS, Token
+
+SPACE, ALPHA, DIGIT, OPERATOR, OTHER, CONTINUATION = range(6)
+
+BYTE_CLASSES = np.full(256, OTHER, dtype=np.uint8)
+BYTE_CLASSES[[ord(" "), ord("\t"), ord("\n")]] = SPACE
+BYTE_CLASSES[ord("a") : ord("z") + 1] = ALPHA
+BYTE_CLASSES[ord("A") : ord("Z") + 1] = ALPHA
+BYTE_CLASSES[ord("_")] = ALPHA
+BYTE_CLASSES[ord("0") : ord("9") + 1] = DIGIT
+BYTE_CLASSES[[ord(char) for char in OPERATORS if len(char) == 1]] = OPERATOR
+BYTE_CLASSES[0x80:0xC0] = CONTINUATION
+
+WORD, NUMBER, SINGLE = range(3)
+
+# Splits a run of digits and dots such as 1.2.3 the way the regex engine does
+NUMBER_RUN_PATTERN = re.compile(r"(?P<NUMBER>[0-9]+(?:\.[0-9]+)?)|(?P<ERROR>\.)")
+
+
+def shifted(mask, offset):
+    """mask[i + offset] at every i, False past the ends"""
+    result = np.zeros_like(mask)
+    if offset > 0:
+        result[:-offset] = mask[offset:]
+    else:
+        result[-offset:] = mask[:offset]
+    return result
+
+
+def find_comments(data, newlines):
+    """
+    Returns a mask of the bytes outside comments and the offset of a block
+    comment that is never closed. Only the comment markers are visited.
+    """
+    code = np.ones(len(data), dtype=bool)
+    slash = data == ord("/")
+    next_is_slash = shifted(slash, 1)
+    openers = np.flatnonzero(slash & (next_is_slash | shifted(data == ord("*"), 1)))
+    closers = np.flatnonzero((data == ord("*")) & next_is_slash)
+
+    position = 0
+    while True:
+        index = np.searchsorted(openers, position)
+        if index == len(openers):
+            return code, None
+        opener = int(openers[index])
+        line_end = np.searchsorted(newlines, opener)
+        line_end = int(newlines[line_end]) if line_end < len(newlines) else len(data)
+        if data[opener + 1] == ord("/"):
+            code[opener:line_end] = False
+            position = line_end
+            continue
+        # Like the other engines, the rest of the opening line is ignored
+        index = np.searchsorted(closers, line_end + 1)
+        if index == len(closers):
+            code[opener:] = False
+            return code, opener
+        closer = int(closers[index])
+        code[opener : closer + 2] = False
+        position = closer + 2
+
+
+def character_positions(offsets, newlines, continuations):
+    """Line numbers and character columns of byte offsets"""
+    line_indexes = np.searchsorted(newlines, offsets)
+    line_starts = np.concatenate(([0], newlines + 1))[line_indexes]
+    columns = offsets - line_starts + 1
+    if continuations is not None:
+        columns -= continuations[offsets] - continuations[line_starts]
+    return line_indexes + 1, columns
+
+
+def numpy_scanner(file: Path):
+    tokens = []
+    errors = []
+    raw = Path(file).read_bytes()
+    if not raw:
+        return tokens, errors
+    data = np.frombuffer(raw, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord("\n"))
+    code, unclosed = find_comments(data, newlines)
+
+    classes = BYTE_CLASSES[data]
+    # A carriage return is only whitespace as part of a line break
+    classes[(data == ord("\r")) & shifted(data == ord("\n"), 1)] = SPACE
+    classes[~code] = SPACE
+
+    alpha = classes == ALPHA
+    digit = classes == DIGIT
+    numeric = digit | ((data == ord(".")) & shifted(digit, -1) & shifted(digit, 1))
+    word_starts = alpha & ~shifted(alpha, -1)
+    number_starts = numeric & ~shifted(numeric, -1)
+    single = (classes != SPACE) & ~alpha & ~numeric
+
+    starts = np.flatnonzero(word_starts | number_starts | single)
+    kinds = np.full(len(starts), SINGLE, dtype=np.uint8)
+    kinds[word_starts[starts]] = WORD
+    kinds[number_starts[starts]] = NUMBER
+    ends = starts + 1
+    ends[kinds == WORD] = np.flatnonzero(alpha & ~shifted(alpha, 1)) + 1
+    ends[kinds == NUMBER] = np.flatnonzero(numeric & ~shifted(numeric, 1)) + 1
+
+    if raw.isascii():
+        continuations = None
+    else:
+        # Continuation bytes of multibyte characters are not columns
+        continuations = np.concatenate(
+            ([0], np.cumsum((data & 0xC0) == 0x80, dtype=np.int64))
+        )
+    linenos, lexposes = character_positions(starts, newlines, continuations)
+
+    text = raw.decode("latin-1")
+    skip_until = 0
+    for start, end, kind, lineno, lexpos in zip(
+        starts.tolist(),
+        ends.tolist(),
+        kinds.tolist(),
+        linenos.tolist(),
+        lexposes.tolist(),
+    ):
+        if start < skip_until:
+            continue
+        if kind == WORD:
+            value = text[start:end]
+            tokens.append(
+                Token(RESERVED_WORDS.get(value, "IDENTIFIER"), value, lineno, lexpos)
+            )
+            continue
+
+        if kind == NUMBER:
+            value = text[start:end]
+            if value.count(".") < 2:
+                add_number(tokens, value, lineno, lexpos)
+                continue
+            for match in NUMBER_RUN_PATTERN.finditer(value):
+                column = lexpos + match.start()
+                if match.lastgroup == "ERROR":
+                    errors.append(
+                        Token("Error", "Invalid character => .", lineno, column)
+                    )
+                else:
+                    add_number(tokens, match.group(), lineno, column)
+            continue
+
+        pair = text[start : start + 2]
+        if pair in OPERATORS and len(pair) == 2 and code[start + 1]:
+            tokens.append(Token(OPERATORS[pair], pair, lineno, lexpos))
+            skip_until = start + 2
+            continue
+        value = text[start]
+        if value in OPERATORS:
+            tokens.append(Token(OPERATORS[value], value, lineno, lexpos))
+            continue
+
+        # An invalid character is a whole UTF-8 sequence when it is one
+        skip_until = start + 1
+        if 0xC2 <= raw[start] <= 0xF4:
+            while (
+                skip_until < min(start + 4, len(raw)) and 0x80 <= raw[skip_until] < 0xC0
+            ):
+                skip_until += 1
+        char = str(raw[start:skip_until], "utf-8", "replace")
+        errors.append(Token("Error", f"Invalid character => {char}", lineno, lexpos))
+
+    if unclosed is not None:
+        lineno, lexpos = character_positions(
+            np.array([unclosed]), newlines, continuations
+        )
+        errors.append(
+            Token("Error", "Block comment not closed", int(lineno[0]), int(lexpos[0]))
+        )
+    return tokens, errors
+
+
+def add_number(tokens, value, lineno, lexpos):
+    number_type = "REAL_NUMBER" if "." in value else "INTEGER_NUMBER"
+    # A minus sign right before a number is folded into it unless it reads
+    # as a subtraction between two numbers.
+    if tokens and tokens[-1].value == "-":
+        if (
+            len(tokens) < 2
+            or tokens[-2].value == "("
+            or tokens[-2].type not in NUMBER_TYPES
+        ):
+            tokens.pop()
+            value = "-" + value
+            number_type = "NEGATIVE_" + number_type
+    tokens.append(Token(number_type, value, lineno, lexpos))
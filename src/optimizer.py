@@ -0,0 +1,322 @@
+"""
+Constant folding and algebraic simplification of the tree of a program
+without errors:
+
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    folder = ConstantFolder(ast, types)
+    optimized = folder.fold()
+    print(f"{folder.removed} nodes removed")
+
+Operations on constants are computed, so (5 - 3) * (8 / 2) becomes 8, and
+relational and logical ones become 1 or 0. Identities that keep the type
+of the expression are applied: x + 0, x - 0, x * 1, x / 1 and x ^ 1 are
+x, x ^ 0 is 1 and, when x is an int, x * 0 is 0. An if with a constant
+condition is replaced by the branch it takes, a while that never runs is
+dropped and a do-while that runs once leaves its body.
+
+Literals are taken as the ints and floats the arena keeps for them, and
+every constant of the new tree is added to its arena with its value, so
+no later stage reads the text of a Number again. Arithmetic follows the
+types of the language: / and % of ints truncate toward zero. An
+operation whose result would not be exact at run time, like a division
+by zero or an int out of 64 bits, is left to run.
+"""
+
+from decimal import Decimal
+import math
+
+from ast_arena import (
+    AND,
+    DIVIDE,
+    DO_WHILE,
+    EQ,
+    GE,
+    GT,
+    IF,
+    INPUT,
+    INT_LITERAL,
+    LE,
+    LT,
+    MAX_INT,
+    MIN_INT,
+    MINUS,
+    MOD,
+    NE,
+    NO_NODE,
+    NUMBER,
+    OR,
+    PLUS,
+    POW,
+    REAL_LITERAL,
+    TIMES,
+    WHILE,
+    AstArena,
+)
+from semantic import INT
+
+OPERATORS = frozenset((PLUS, MINUS, TIMES, DIVIDE, MOD, POW))
+COMPARISONS = {
+    LT: lambda left, right: left < right,
+    LE: lambda left, right: left <= right,
+    GT: lambda left, right: left > right,
+    GE: lambda left, right: left >= right,
+    EQ: lambda left, right: left == right,
+    NE: lambda left, right: left != right,
+    AND: lambda left, right: bool(left) and bool(right),
+    OR: lambda left, right: bool(left) or bool(right),
+}
+
+
+def literal_text(value):
+    """A literal for value that reads back as the same value and type"""
+    if type(value) is int:
+        return f"{value}"
+    # Positional, as the lexer reads no exponents, with the digits of repr
+    text = format(Decimal(repr(value)), "f")
+    if "." not in text:
+        text += ".0"
+    return text
+
+
+def evaluate(kind, left, right):
+    """The value of an operation on two constants, None if not foldable"""
+    if kind in COMPARISONS:
+        return int(COMPARISONS[kind](left, right))
+    if type(left) is int and type(right) is int:
+        return evaluate_ints(kind, left, right)
+    # An int operand takes part as a float, as Python mixes them
+    try:
+        if kind == PLUS:
+            value = left + right
+        elif kind == MINUS:
+            value = left - right
+        elif kind == TIMES:
+            value = left * right
+        elif kind == DIVIDE:
+            value = left / right
+        elif kind == MOD:
+            value = math.fmod(left, right)
+        else:
+            value = math.pow(left, right)
+    except (ZeroDivisionError, OverflowError, ValueError):
+        return None
+    if math.isinf(value) or math.isnan(value):
+        return None
+    return value
+
+
+def evaluate_ints(kind, left, right):
+    if kind == PLUS:
+        value = left + right
+    elif kind == MINUS:
+        value = left - right
+    elif kind == TIMES:
+        value = left * right
+    elif kind in (DIVIDE, MOD):
+        if right == 0:
+            return None
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        value = quotient if kind == DIVIDE else left - right * quotient
+    else:
+        if right < 0:
+            return None
+        # Skip the power of a big exponent before computing it
+        if abs(left) > 1 and right * (abs(left).bit_length() - 1) > 64:
+            return None
+        value = left**right
+    if not MIN_INT <= value <= MAX_INT:
+        return None
+    return value
+
+
+class ConstantFolder:
+    """
+    Builds the folded tree of an arena as a new arena, in two passes: one
+    loop over the nodes finds the value of every constant expression and
+    the identities, children before parents, and a walk of the tree copies
+    what is left.
+
+    Args:
+        ast (AstArena): A tree without syntax nor semantic errors
+        types (array): Type codes of its nodes, from SemanticAnalyzer
+    """
+
+    def __init__(self, ast: AstArena, types):
+        self.ast = ast
+        self.types = types
+        # Value of every constant expression, by node of the old tree
+        self.constants = {}
+        # Node an identity reduces a node to, by node of the old tree
+        self.replacements = {}
+        self.folded = 0
+        self.simplified = 0
+        self.branches = 0
+        self.removed = 0
+
+    def fold(self):
+        """
+        Returns:
+            AstArena: The folded tree, the arena given if it has no root
+        """
+        ast = self.ast
+        if ast.root == NO_NODE:
+            return ast
+        self.find_constants()
+        folded = self.copy()
+        self.removed = len(ast) - len(folded)
+        return folded
+
+    def find_constants(self):
+        ast = self.ast
+        kinds = ast.kinds
+        first_children = ast.first_children
+        next_siblings = ast.next_siblings
+        constants = self.constants
+        replacements = self.replacements
+        literal = ast.literal
+        for index, kind in enumerate(kinds):
+            if kind == NUMBER:
+                # An int too wide for 64 bits is left to run
+                value = literal(index)
+                if value is not None:
+                    constants[index] = value
+            elif kind in OPERATORS or kind in COMPARISONS:
+                left = first_children[index]
+                right = next_siblings[left]
+                left = replacements.get(left, left)
+                right = replacements.get(right, right)
+                left_value = constants.get(left)
+                right_value = constants.get(right)
+                if left_value is not None and right_value is not None:
+                    value = evaluate(kind, left_value, right_value)
+                    if value is not None:
+                        constants[index] = value
+                        self.folded += 1
+                elif kind in OPERATORS:
+                    self.simplify(index, kind, left, right, left_value, right_value)
+
+    def simplify(self, index, kind, left, right, left_value, right_value):
+        """Applies an identity to an operation with one constant operand"""
+        if left_value is None and right_value is None:
+            return
+        types = self.types
+        if left_value is None:
+            variable, constant, variable_first = left, right_value, True
+        else:
+            variable, constant, variable_first = right, left_value, False
+        result_type = types[index]
+        replacement = None
+        if types[variable] == result_type:
+            if constant == 0 and (kind == PLUS or (kind == MINUS and variable_first)):
+                replacement = variable
+            elif constant == 1 and (
+                kind == TIMES or (kind in (DIVIDE, POW) and variable_first)
+            ):
+                replacement = variable
+        if replacement is not None:
+            self.replacements[index] = replacement
+            self.simplified += 1
+        elif constant == 0 and kind == TIMES and result_type == INT:
+            self.constants[index] = 0
+            self.simplified += 1
+        elif constant == 0 and kind == POW and variable_first:
+            self.constants[index] = 1 if result_type == INT else 1.0
+            self.simplified += 1
+
+    def copy(self):
+        """Copies the tree left after folding to a new arena"""
+        ast = self.ast
+        kinds = ast.kinds
+        strings = ast.strings
+        value_ids = ast.value_ids
+        first_children = ast.first_children
+        constants = self.constants
+        replacements = self.replacements
+        folded = AstArena()
+        # Nodes being copied, the children still to copy, last first, and
+        # the copies made of the ones before. A None node only gathers the
+        # copies of the sentences that replace an if or a loop.
+        stack = [(ast.root, self.children(ast.root), [])]
+        while True:
+            node, pending, copies = stack[-1]
+            if pending:
+                child = pending.pop()
+                child = replacements.get(child, child)
+                kind = kinds[child]
+                if child in constants:
+                    value = constants[child]
+                    if kind == NUMBER:
+                        text = strings[value_ids[child]]
+                    else:
+                        text = literal_text(value)
+                    literal_type = INT_LITERAL if type(value) is int else REAL_LITERAL
+                    folded.intern(text, (literal_type, value))
+                    copies.append(
+                        folded.add_spanned(NUMBER, text, None, *ast.span(child))
+                    )
+                elif kind in (IF, WHILE, DO_WHILE):
+                    stack.append(self.open_block(child))
+                elif first_children[child] == NO_NODE and kind != INPUT:
+                    # A leaf is copied at once, without a stack entry
+                    copies.append(
+                        folded.add_spanned(
+                            kind, strings[value_ids[child]], None, *ast.span(child)
+                        )
+                    )
+                else:
+                    stack.append((child, self.children(child), []))
+                continue
+            stack.pop()
+            if node is None:
+                stack[-1][2].extend(copies)
+                continue
+            kind = kinds[node]
+            if kind == INPUT:
+                # The target of a cin stays right before it, out of the tree
+                target = ast.input_target(node)
+                folded.add_spanned(
+                    kinds[target],
+                    strings[value_ids[target]],
+                    None,
+                    *ast.span(target),
+                )
+            copy = folded.add_spanned(
+                kind, strings[value_ids[node]], copies, *ast.span(node)
+            )
+            if not stack:
+                folded.root = copy
+                return folded
+            stack[-1][2].append(copy)
+
+    def children(self, node):
+        """Children of a node, last first"""
+        children = list(self.ast.children(node))
+        children.reverse()
+        return children
+
+    def open_block(self, node):
+        """
+        The stack entry of an if or loop, or of the sentences that replace
+        it when its condition is a constant.
+        """
+        children = self.children(node)
+        kind = self.ast.kinds[node]
+        # The children are last first
+        condition = children[0] if kind == DO_WHILE else children[-1]
+        condition = self.replacements.get(condition, condition)
+        value = self.constants.get(condition)
+        if value is None or (value and kind != IF):
+            return (node, children, [])
+        self.branches += 1
+        if kind == WHILE:
+            return (None, [], [])
+        if kind == DO_WHILE:
+            return (None, children[1:], [])
+        if value:
+            return (None, self.children(children[-2]), [])
+        if len(children) > 2:
+            return (None, self.children(children[0]), [])
+        return (None, [], [])
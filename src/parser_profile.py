@@ -0,0 +1,189 @@
+"""
+Per rule profiling of a Parser:
+
+    parser = Parser(tokens)
+    profiler = RuleProfiler(parser)
+    parser.parse()
+    print(profiler.summary())
+
+The profiler wraps the rule methods of that one parser object, so every
+other Parser runs the methods of the class as they are and pays nothing.
+For every rule it counts the calls, the time spent in it with and
+without the rules it calls and the tokens it consumed. It also counts the
+calls to eat and the backtracking: every move back to an earlier token,
+which a StreamingParser does to parse again a sentence that ran past its
+window. Expressions read their tokens without eat, so those are only in
+the tokens of the expression rule.
+
+The times can be written as JSON or as collapsed stacks, the input of
+flamegraph.pl and speedscope.
+"""
+
+import json
+import time
+
+# Methods of Parser and StreamingParser profiled as rules, when they exist
+RULES = (
+    "program",
+    "declaration_list",
+    "declaration",
+    "declaration_statement",
+    "variable_declaration",
+    "identifier",
+    "identifier_node",
+    "sentences",
+    "close_block",
+    "assignment_or_increment_decrement",
+    "assignment",
+    "sent_expression",
+    "cin_sentence",
+    "cout_sentence",
+    "expression",
+    "synchronize",
+    "attempt",
+)
+
+
+class RuleStats:
+    __slots__ = ("calls", "inclusive_ns", "exclusive_ns", "tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive_ns = 0
+        self.exclusive_ns = 0
+        self.tokens = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "inclusive_seconds": self.inclusive_ns / 1e9,
+            "exclusive_seconds": self.exclusive_ns / 1e9,
+            "tokens": self.tokens,
+        }
+
+
+class RuleProfiler:
+    """
+    Profiles the rules of a parser object from now on, until uninstall.
+
+    Time spent in the profiler itself is counted in the rule that called
+    the profiled one, so small rules called very often look slower than
+    they are.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.rules = {}
+        # Exclusive time of every chain of rules, joined with ";"
+        self.stacks = {}
+        self.eat_calls = 0
+        self.backtracks = 0
+        self.backtracked_tokens = 0
+        self._path = []
+        # Time spent in the rules called by each rule on the path
+        self._children_ns = []
+        self._installed = []
+        self.install()
+
+    def install(self):
+        parser = self.parser
+        for rule in RULES:
+            method = getattr(parser, rule, None)
+            if method is not None:
+                setattr(parser, rule, self.wrap(rule, method))
+                self._installed.append(rule)
+        eat = parser.eat
+        skip_to = parser.skip_to
+
+        def counted_eat(token_type):
+            self.eat_calls += 1
+            return eat(token_type)
+
+        def tracked_skip_to(index):
+            if index < parser.current_token_index:
+                self.backtracks += 1
+                self.backtracked_tokens += parser.current_token_index - index
+            return skip_to(index)
+
+        parser.eat = counted_eat
+        parser.skip_to = tracked_skip_to
+        self._installed += ["eat", "skip_to"]
+
+    def uninstall(self):
+        """Gives the parser back the methods of its class"""
+        for name in self._installed:
+            delattr(self.parser, name)
+        self._installed = []
+
+    def wrap(self, rule, method):
+        stats = self.rules.setdefault(rule, RuleStats())
+        parser = self.parser
+        path = self._path
+        children_ns = self._children_ns
+        stacks = self.stacks
+        clock = time.perf_counter_ns
+
+        def profiled(*args, **kwargs):
+            recursive = rule in path
+            first = parser.current_token_index
+            path.append(rule)
+            children_ns.append(0)
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                exclusive = elapsed - children_ns.pop()
+                stack = ";".join(path)
+                path.pop()
+                if children_ns:
+                    children_ns[-1] += elapsed
+                stacks[stack] = stacks.get(stack, 0) + exclusive
+                stats.calls += 1
+                stats.exclusive_ns += exclusive
+                # A recursive call is already inside the outer one
+                if not recursive:
+                    stats.inclusive_ns += elapsed
+                    stats.tokens += max(parser.current_token_index - first, 0)
+
+        return profiled
+
+    def as_dict(self):
+        return {
+            "rules": {rule: stats.as_dict() for rule, stats in self.rules.items()},
+            "eat_calls": self.eat_calls,
+            "backtracks": self.backtracks,
+            "backtracked_tokens": self.backtracked_tokens,
+        }
+
+    def write_json(self, stream):
+        json.dump(self.as_dict(), stream, indent=2)
+        stream.write("\n")
+
+    def write_collapsed(self, stream):
+        """Writes one line per chain of rules with its microseconds"""
+        for stack, exclusive_ns in self.stacks.items():
+            microseconds = exclusive_ns // 1000
+            if microseconds:
+                stream.write(f"{stack} {microseconds}\n")
+
+    def summary(self):
+        """Table of the rules that were called, the slowest first"""
+        lines = [
+            f"{'rule':<34}{'calls':>10}{'incl. s':>10}{'excl. s':>10}{'tokens':>10}"
+        ]
+        rules = sorted(
+            (item for item in self.rules.items() if item[1].calls),
+            key=lambda item: item[1].exclusive_ns,
+            reverse=True,
+        )
+        for rule, stats in rules:
+            lines.append(
+                f"{rule:<34}{stats.calls:>10}{stats.inclusive_ns / 1e9:>10.3f}"
+                f"{stats.exclusive_ns / 1e9:>10.3f}{stats.tokens:>10}"
+            )
+        lines.append(f"eat calls: {self.eat_calls}")
+        lines.append(
+            f"backtracks: {self.backtracks} ({self.backtracked_tokens} tokens)"
+        )
+        return "\n".join(lines)
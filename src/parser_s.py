@@ -1,51 +1,191 @@
-from lexer import Token
-from anytree import NodeMixin, RenderTree
-
-
-class Node(NodeMixin):
-    def __init__(self, name, value=None, children=None):
-        self.name = name
-        self.value = value
-        if children:
-            self.children = children
-
-    def __str__(self):
-        if self.value:
-            return f"{self.value}"
-        else:
-            return f"{self.name}"
+import io
+
+from itertools import compress, count
+from operator import is_not
+
+from lexer import NUMBER_TYPES, LexerSession, Token
+from collector import gc_paused
+from ast_render import render_text
+from ast_nodes import Node, TreeBuilder
+
+# Precedence of the binary operators, all left associative
+RELATIONAL = 1
+PRECEDENCES = {
+    "LT": RELATIONAL,
+    "LE": RELATIONAL,
+    "GT": RELATIONAL,
+    "GE": RELATIONAL,
+    "EQ": RELATIONAL,
+    "NE": RELATIONAL,
+    "AND": 2,
+    "OR": 2,
+    "PLUS": 3,
+    "MINUS": 3,
+    "TIMES": 4,
+    "DIVIDE": 4,
+    "MOD": 4,
+    "POW": 5,
+}
+
+# Blocks left open on the stack of Parser.sentences. The blocks of an if or
+# while whose condition has an error are parsed, to report their errors,
+# and then dropped.
+(
+    TRUE_BRANCH,
+    FALSE_BRANCH,
+    WHILE_BODY,
+    DO_WHILE_BODY,
+    DROPPED_TRUE_BRANCH,
+    DROPPED_BLOCK,
+) = range(6)
+
+# Errors reported by default when recovering, the rest are not looked for
+MAX_SYNTAX_ERRORS = 100
+
+# Tokens a StreamingParser reads ahead at a time
+STREAM_WINDOW = 4096
+
+
+class ParseError(Exception):
+    """A syntax error, at the line and column of the token it was found at"""
+
+    def __init__(self, message, token: Token):
+        super().__init__(message)
+        self.message = message
+        self.token_type = token.type
+        self.lineno = token.lineno
+        self.lexpos = token.lexpos
+
+    def __reduce__(self):
+        token = Token(self.token_type, "", self.lineno, self.lexpos)
+        return (ParseError, (self.message, token))
+
+    def as_dict(self):
+        return {
+            "type": "SyntaxError",
+            "value": self.message,
+            "lineno": self.lineno,
+            "lexpos": self.lexpos,
+        }
 
 
 class Parser:
-    def __init__(self, tokens: list[Token]):
+    """
+    Parser of a token list into an AST. The nodes are made by the builder,
+    a TreeBuilder by default, or an AstArena to store them in arrays.
+
+    The first syntax error raises a ParseError, unless recover is set:
+    then every error is added to errors, the parser skips to the next
+    semicolon or closing brace and goes on, up to max_errors errors, and
+    parse returns the tree of what could be parsed.
+
+    reusable maps the index of the first token of sentences parsed before
+    to the sentence and the index of its last token. A sentence found there
+    is taken instead of parsed, and the sentences parsed without errors are
+    added to it. See ParserSession.
+    """
+
+    def __init__(
+        self,
+        tokens: list[Token],
+        builder=None,
+        recover=False,
+        max_errors=MAX_SYNTAX_ERRORS,
+        reusable=None,
+    ):
         self.tokens = tokens
+        self.builder = TreeBuilder() if builder is None else builder
+        self.recover = recover
+        self.max_errors = max_errors
+        self.errors = []
+        self.reusable = reusable
+        self.last_error_index = -1
+        # Read once every token is eaten, at the end of the last one
+        if tokens:
+            last = tokens[-1]
+            self.end_token = Token(
+                "EOF", "", last.lineno, last.lexpos + len(last.value)
+            )
+        else:
+            self.end_token = Token("EOF", "", 1, 1)
         self.current_token_index = 0
-        self.current_token = self.tokens[self.current_token_index]
+        self.current_token = tokens[0] if tokens else self.end_token
 
     def eat(self, token_type):
         if self.current_token.type == token_type:
             self.current_token_index += 1
             if self.current_token_index < len(self.tokens):
                 self.current_token = self.tokens[self.current_token_index]
+            else:
+                self.current_token = self.end_token
         else:
-            raise Exception(
-                f"Unexpected token {self.current_token.type}, expected {token_type}"
+            raise ParseError(
+                f"Unexpected token {self.current_token.type}, expected {token_type}",
+                self.current_token,
+            )
+
+    def expect(self, token_type):
+        """Eats a token that may be missing when recovering, as if it were there"""
+        try:
+            self.eat(token_type)
+        except ParseError as error:
+            if not self.recover:
+                raise
+            self.report(error)
+
+    def report(self, error: ParseError):
+        """
+        Adds an error found while recovering. Once there are max_errors of
+        them, an error says so and the rest of the tokens are skipped.
+        """
+        if len(self.errors) >= self.max_errors:
+            return
+        self.errors.append(error)
+        self.last_error_index = self.current_token_index
+        if len(self.errors) == self.max_errors:
+            self.errors.append(
+                ParseError(
+                    f"Too many errors, parsing stopped after {self.max_errors}",
+                    self.current_token,
+                )
             )
+            self.current_token_index = len(self.tokens)
+            self.current_token = self.end_token
+
+    def synchronize(self, to_block=False):
+        """
+        Skips the tokens of a sentence with an error: up to and including
+        the next semicolon, or up to the next closing brace or the end. With
+        to_block, an opening brace also stops it, and is eaten.
+
+        Returns:
+            bool: Whether an opening brace was eaten
+        """
+        while True:
+            token_type = self.current_token.type
+            if token_type == "RBRACE" or token_type == "EOF":
+                return False
+            if token_type == "SEMICOLON":
+                self.eat("SEMICOLON")
+                return False
+            self.eat(token_type)
+            if to_block and token_type == "LBRACE":
+                return True
 
     def parse(self):
-        return self.program()
+        with gc_paused():
+            self.builder.begin(self.tokens)
+            return self.builder.finish(self.program())
 
     def program(self):
-        token = self.current_token
-        self.eat("MAIN")
-        self.eat("LBRACE")
+        first = self.current_token_index
+        self.expect("MAIN")
+        self.expect("LBRACE")
         declarations = self.declaration_list()
         statements = self.sentence_list()
-        self.eat("RBRACE")
-        return Node(
-            name="Program",
-            value=token.value,
-            children=declarations + statements,
+        self.expect("RBRACE")
+        return self.builder.program(
+            first, self.current_token_index - 1, declarations, statements
         )
 
     def declaration_list(self):
@@ -55,7 +195,13 @@ class Parser:
             "DOUBLE",
             "FLOAT",
         ]:
-            declarations.append(self.declaration_statement())
+            try:
+                declarations.append(self.declaration_statement())
+            except ParseError as error:
+                if not self.recover:
+                    raise
+                self.report(error)
+                self.synchronize()
         return declarations
 
     def declaration_statement(self):
@@ -69,288 +215,680 @@ class Parser:
             return self.sentence()
 
     def variable_declaration(self, type):
+        first = self.current_token_index
         self.eat(type.upper())
         ids = self.identifier()
         self.eat("SEMICOLON")
-        return Node(name="VariableDeclaration", value=type, children=ids)
+        return self.builder.variable_declaration(
+            first, self.current_token_index - 1, type, ids
+        )
 
     def identifier(self):
         ids = []
-        ids.append(self.current_token.value)
-        self.eat("IDENTIFIER")
+        ids.append(self.identifier_node())
         while self.current_token and self.current_token.type == "COMMA":
             self.eat("COMMA")
-            ids.append(self.current_token.value)
-            self.eat("IDENTIFIER")
-        return [Node(name="Identifier", value=id) for id in ids]
+            ids.append(self.identifier_node())
+        return ids
+
+    def identifier_node(self):
+        index = self.current_token_index
+        name = self.current_token.value
+        self.eat("IDENTIFIER")
+        return self.builder.identifier(index, index, name)
 
     def sentence_list(self):
-        statements = []
-        while self.current_token and self.current_token.type != "RBRACE":
-            statements.append(self.sentence())
-        return statements
+        return self.sentences(single=False)
 
     def sentence(self):
-        if self.current_token.type == "IF":
-            return self.if_statement()
-        elif self.current_token.type == "WHILE":
-            return self.while_loop_sentence()
-        elif self.current_token.type == "DO":
-            return self.do_while_loop_sentence()
-        elif self.current_token.type == "CIN":
-            return self.cin_sentence()
-        elif self.current_token.type == "COUT":
-            return self.cout_sentence()
-        elif self.current_token.type == "IDENTIFIER":
-            return self.assignment_or_increment_decrement()
+        return self.sentences(single=True)[0]
+
+    def sentences(self, single):
+        """
+        Parses sentences up to the closing brace of the current block, or
+        just one sentence if single. Blocks of if, while and do sentences
+        are kept on an explicit stack, so nesting depth is not limited by
+        recursion: every open block is a frame holding the sentences of the
+        block around it, the kind of the block and what was parsed before
+        the block opened.
+        """
+        builder = self.builder
+        reusable = self.reusable
+        statements = []
+        frames = []
+        while True:
+            token_type = self.current_token.type
+            reused = None
+            try:
+                if token_type == "EOF" and self.recover:
+                    # The blocks left open end here, with what they have
+                    if frames:
+                        self.report(
+                            ParseError(
+                                "Unexpected end of input, expected RBRACE",
+                                self.current_token,
+                            )
+                        )
+                    while frames:
+                        statements = self.close_block(frames.pop(), statements)
+                    return statements
+                if token_type != "RBRACE":
+                    first = self.current_token_index
+                    if reusable is not None:
+                        reused = reusable.get(first)
+                    if reused is not None:
+                        node, last = reused
+                        self.skip_to(last + 1)
+                    elif token_type == "IF":
+                        self.eat("IF")
+                        self.eat("LPAREN")
+                        condition = self.expression()
+                        self.eat("RPAREN")
+                        branch_first = self.current_token_index
+                        self.eat("LBRACE")
+                        frames.append(
+                            (TRUE_BRANCH, statements, first, condition, branch_first)
+                        )
+                        statements = []
+                        continue
+                    elif token_type == "WHILE":
+                        self.eat("WHILE")
+                        self.eat("LPAREN")
+                        condition = self.expression()
+                        self.eat("RPAREN")
+                        self.eat("LBRACE")
+                        frames.append((WHILE_BODY, statements, first, condition))
+                        statements = []
+                        continue
+                    elif token_type == "DO":
+                        self.eat("DO")
+                        self.eat("LBRACE")
+                        frames.append((DO_WHILE_BODY, statements, first))
+                        statements = []
+                        continue
+                    elif token_type == "CIN":
+                        node = self.cin_sentence()
+                    elif token_type == "COUT":
+                        node = self.cout_sentence()
+                    elif token_type == "IDENTIFIER":
+                        node = self.assignment_or_increment_decrement()
+                    else:
+                        raise ParseError(
+                            f"Unexpected token {token_type}", self.current_token
+                        )
+                elif not frames:
+                    # When recovering, a sentence with an error may be all
+                    # there was before the brace
+                    if single and not self.recover:
+                        raise ParseError(
+                            f"Unexpected token {token_type}", self.current_token
+                        )
+                    return statements
+                else:
+                    # The closing brace of the innermost open block
+                    frame = frames.pop()
+                    block = frame[0]
+                    parent = frame[1]
+                    self.eat("RBRACE")
+                    last = self.current_token_index - 1
+                    if block == TRUE_BRANCH or block == DROPPED_TRUE_BRANCH:
+                        if self.current_token.type == "ELSE":
+                            if block == TRUE_BRANCH:
+                                _, _, first, condition, branch_first = frame
+                                true_branch = builder.true_branch(
+                                    branch_first, last, statements
+                                )
+                                frame = (
+                                    FALSE_BRANCH,
+                                    parent,
+                                    first,
+                                    condition,
+                                    true_branch,
+                                )
+                            else:
+                                frame = (DROPPED_BLOCK, parent)
+                            # If the else block does not open, the whole if
+                            # is dropped
+                            statements = parent
+                            self.eat("ELSE")
+                            branch_first = self.current_token_index
+                            self.eat("LBRACE")
+                            frames.append((*frame, branch_first))
+                            statements = []
+                            continue
+                    if block == DO_WHILE_BODY:
+                        _, parent, first = frame
+                        body = statements
+                        statements = parent
+                        self.eat("WHILE")
+                        self.eat("LPAREN")
+                        condition = self.expression()
+                        self.eat("RPAREN")
+                        node = builder.do_while_loop(
+                            first, self.current_token_index - 1, body, condition
+                        )
+                    else:
+                        statements = self.close_block(frame, statements, last)
+                        if single and not frames and statements:
+                            return statements
+                        continue
+            except ParseError as error:
+                if not self.recover:
+                    raise
+                self.report(error)
+                in_condition = token_type == "IF" or token_type == "WHILE"
+                if self.synchronize(to_block=in_condition) and in_condition:
+                    if token_type == "IF":
+                        frames.append((DROPPED_TRUE_BRANCH, statements))
+                    else:
+                        frames.append((DROPPED_BLOCK, statements))
+                    statements = []
+                continue
+
+            statements.append(node)
+            if reusable is not None and reused is None:
+                self.keep(first, node)
+            if single and not frames:
+                return statements
+
+    def skip_to(self, index):
+        """Moves to the token at index, past a reused sentence"""
+        self.current_token_index = index
+        if index < len(self.tokens):
+            self.current_token = self.tokens[index]
         else:
-            raise Exception(f"Unexpected token {self.current_token.type}")
+            self.current_token = self.end_token
+
+    def keep(self, first, node):
+        """Adds a sentence that has just been parsed to reusable, if clean"""
+        if self.last_error_index < first:
+            self.reusable[first] = (node, self.current_token_index - 1)
+
+    def close_block(self, frame, statements, last=None):
+        """
+        Builds the sentence of a block that has just ended, or at the end of
+        the input (last None) a do block, which is dropped as it lacks its
+        condition. Returns the sentences of the block around it.
+        """
+        builder = self.builder
+        block = frame[0]
+        parent = frame[1]
+        if last is None:
+            last = self.current_token_index - 1
+        if block == TRUE_BRANCH:
+            _, _, first, condition, branch_first = frame
+            true_branch = builder.true_branch(branch_first, last, statements)
+            node = builder.if_statement(first, last, condition, true_branch)
+        elif block == FALSE_BRANCH:
+            _, _, first, condition, true_branch, branch_first = frame
+            false_branch = builder.false_branch(branch_first, last, statements)
+            node = builder.if_statement(
+                first, last, condition, true_branch, false_branch
+            )
+        elif block == WHILE_BODY:
+            _, _, first, condition = frame
+            node = builder.while_loop(first, last, condition, statements)
+        else:
+            return parent
+        parent.append(node)
+        if self.reusable is not None:
+            self.keep(first, node)
+        return parent
 
     def assignment_or_increment_decrement(self):
-        identifier_token = self.current_token.value
-        self.eat("IDENTIFIER")
+        first = self.current_token_index
+        target = self.identifier_node()
 
         if self.current_token.type == "ASSIGN":
-            assign_token = self.current_token
             self.eat("ASSIGN")
             expression = self.sent_expression()
             self.eat("SEMICOLON")
-            return Node(
-                "Assignment",
-                value=assign_token.value,
-                children=[Node("Identifier", value=identifier_token), expression],
+            return self.builder.assignment(
+                first, self.current_token_index - 1, target, expression
             )
         elif self.current_token.type == "INCREMENT_OPERATOR":
-            operator_token = self.current_token
             self.eat("INCREMENT_OPERATOR")
             self.eat("SEMICOLON")
-            return Node(
-                name="Increment",
-                value=operator_token.value,
-                children=[Node(name="Identifier", value=identifier_token)],
-            )
+            return self.builder.increment(first, self.current_token_index - 1, target)
         elif self.current_token.type == "DECREMENT_OPERATOR":
-            operator_token = self.current_token
             self.eat("DECREMENT_OPERATOR")
             self.eat("SEMICOLON")
-            return Node(
-                name="Decrement",
-                value=operator_token.value,
-                children=[Node("Identifier", value=identifier_token)],
-            )
+            return self.builder.decrement(first, self.current_token_index - 1, target)
         else:
-            raise Exception(f"Unexpected token {self.current_token.type}")
+            raise ParseError(
+                f"Unexpected token {self.current_token.type}", self.current_token
+            )
 
     def assignment(self):
-        identifier_token = self.current_token.value
-        self.eat("IDENTIFIER")
-        assign_token = self.current_token
+        first = self.current_token_index
+        target = self.identifier_node()
         self.eat("ASSIGN")
         expression = self.sent_expression()
         self.eat("SEMICOLON")
-        return Node(
-            name="Assignment",
-            value=assign_token.value,
-            children=[Node(name="Identifier", value=identifier_token), expression],
+        return self.builder.assignment(
+            first, self.current_token_index - 1, target, expression
         )
 
     def sent_expression(self):
         if self.current_token.type == "SEMICOLON":
+            index = self.current_token_index
             self.eat("SEMICOLON")
-            return Node("EmptyStatement")
+            return self.builder.empty_statement(index, index)
         else:
             return self.expression()
 
-    def if_statement(self):
-        self.eat("IF")
-        self.eat("LPAREN")
-        condition = self.expression()
-        self.eat("RPAREN")
-        self.eat("LBRACE")
-        true_branch = self.sentence_list()
-        self.eat("RBRACE")
-
-        if self.current_token and self.current_token.type == "ELSE":
-            self.eat("ELSE")
-            self.eat("LBRACE")
-            false_branch = self.sentence_list()
-            self.eat("RBRACE")
-            return Node(
-                name="If",
-                value="if",
-                children=[
-                    condition,
-                    Node(name="TrueBranch", value="true_branch", children=true_branch),
-                    Node(
-                        name="FalseBranch", value="false_branch", children=false_branch
-                    ),
-                ],
-            )
-        else:
-            return Node(
-                name="If",
-                value="if",
-                children=[
-                    condition,
-                    Node(name="TrueBranch", value="true_branch", children=true_branch),
-                ],
-            )
-
-    def while_loop_sentence(self):
-        self.eat("WHILE")
-        self.eat("LPAREN")
-        condition = self.expression()
-        self.eat("RPAREN")
-        self.eat("LBRACE")
-        statements = self.sentence_list()
-        self.eat("RBRACE")
-        return Node(name="While", value="while", children=[condition] + statements)
-
-    def do_while_loop_sentence(self):
-        self.eat("DO")
-        self.eat("LBRACE")
-        statements = self.sentence_list()
-        self.eat("RBRACE")
-        self.eat("WHILE")
-        self.eat("LPAREN")
-        condition = self.expression()
-        self.eat("RPAREN")
-        return Node(name="DoWhile", value="do_while", children=statements + [condition])
-
     def cin_sentence(self):
-        identifier = self.current_token.value
+        first = self.current_token_index
         self.eat("CIN")
-        self.eat("IDENTIFIER")
+        target = self.identifier_node()
         self.eat("SEMICOLON")
-        return Node(name="Input", value=identifier)
+        return self.builder.input(first, self.current_token_index - 1, target)
 
     def cout_sentence(self):
-        identifier = self.current_token.value
+        first = self.current_token_index
         self.eat("COUT")
         expression = self.expression()
         self.eat("SEMICOLON")
-        return Node(name="Output", value=identifier, children=[expression])
+        return self.builder.output(first, self.current_token_index - 1, expression)
 
     def expression(self):
-        node = self.logical_expression()
-        if self.current_token and self.current_token.type in [
-            "LT",
-            "LE",
-            "GT",
-            "GE",
-            "EQ",
-            "NE",
-        ]:
-            token = self.current_token
-            self.eat(token.type)
-            node = Node(
-                name=token.type,
-                value=token.value,
-                children=[node, self.logical_expression()],
-            )
-        return node
-
-    def logical_expression(self):
-        node = self.simple_expression()
-        while self.current_token and self.current_token.type in ["AND", "OR"]:
-            token = self.current_token
-            self.eat(token.type)
-            node = Node(
-                name=token.type,
-                value=token.value,
-                children=[node, self.simple_expression()],
-            )
-        return node
-
-    def simple_expression(self):
-        node = self.term()
-        while self.current_token and self.current_token.type in ["PLUS", "MINUS"]:
-            token = self.current_token
-            self.eat(token.type)
-            node = Node(
-                name=token.type, value=token.value, children=[node, self.term()]
-            )
-        return node
+        """
+        Parses an expression by precedence climbing over explicit stacks, so
+        nesting depth is not limited by recursion. See PRECEDENCES for the
+        levels, an expression has at most one relational operator outside
+        parentheses. The tokens are read here rather than with eat, as this
+        loop runs for every operand.
+        """
+        tokens = self.tokens
+        count = len(tokens)
+        index = self.current_token_index
+        token = self.current_token
+        number = self.builder.number
+        identifier = self.builder.identifier
+        binary_operation = self.builder.binary_operation
+
+        # Operands and the indexes of their first tokens
+        operands = []
+        firsts = []
+        # Operators and their precedences, an open parenthesis is None and 0
+        operators = []
+        levels = []
+        # Indexes of the open parentheses, and whether the ones around the
+        # innermost have their relational operator already
+        parentheses = []
+        enclosing_relational = []
+        relational = False
+        while True:
+            while token.type == "LPAREN":
+                operators.append(None)
+                levels.append(0)
+                parentheses.append(index)
+                enclosing_relational.append(relational)
+                relational = False
+                index += 1
+                token = tokens[index] if index < count else self.end_token
+
+            if token.type in NUMBER_TYPES:
+                operands.append(number(index, index, token.value))
+            elif token.type == "IDENTIFIER":
+                operands.append(identifier(index, index, token.value))
+            else:
+                self.current_token_index = index
+                self.current_token = token
+                raise ParseError(f"Unexpected token {token.type}", token)
+            firsts.append(index)
+            index += 1
+            token = tokens[index] if index < count else self.end_token
+
+            while True:
+                precedence = PRECEDENCES.get(token.type)
+                # Anything but an operator ends the innermost parenthesis, or
+                # the whole expression when there is none
+                ends = precedence is None or (precedence == RELATIONAL and relational)
+                bound = 1 if ends else precedence
+                while levels and levels[-1] >= bound:
+                    levels.pop()
+                    operator = operators.pop()
+                    right = operands.pop()
+                    firsts.pop()
+                    operands[-1] = binary_operation(
+                        firsts[-1],
+                        index - 1,
+                        operator.type,
+                        operator.value,
+                        operands[-1],
+                        right,
+                    )
+                if not ends:
+                    break
+
+                self.current_token_index = index
+                self.current_token = token
+                if not levels:
+                    return operands[-1]
+                levels.pop()
+                operators.pop()
+                relational = enclosing_relational.pop()
+                self.eat("RPAREN")
+                index = self.current_token_index
+                token = self.current_token
+                firsts[-1] = parentheses.pop()
+
+            if precedence == RELATIONAL:
+                relational = True
+            operators.append(token)
+            levels.append(precedence)
+            index += 1
+            token = tokens[index] if index < count else self.end_token
 
-    def term(self):
-        node = self.factor()
-        while self.current_token and self.current_token.type in [
-            "TIMES",
-            "DIVIDE",
-            "MOD",
-        ]:
-            token = self.current_token
-            self.eat(token.type)
-            node = Node(
-                name=token.type, value=token.value, children=[node, self.factor()]
+    def render_tree(self, ast):
+        stream = io.StringIO()
+        render_text(ast, stream)
+        return stream.getvalue()
+
+
+class StreamingParser(Parser):
+    """
+    Parser of a stream of tokens, like the one iter_tokens yields, that
+    yields the declarations and sentences of main one at a time as soon as
+    each is parsed, so they can be printed or written and then dropped:
+
+        for node in StreamingParser(iter_tokens(path)).statements():
+            ...
+
+    The tokens are read into a window about STREAM_WINDOW tokens ahead,
+    and the ones of the sentences already given out are dropped from it.
+    A sentence that runs past the end of the window is parsed again once
+    more tokens are read, so the memory used depends on the biggest
+    sentence and not on the size of the source. The nodes and the errors
+    are the ones Parser gives.
+    """
+
+    def __init__(
+        self, tokens, recover=False, max_errors=MAX_SYNTAX_ERRORS, window=STREAM_WINDOW
+    ):
+        super().__init__([], recover=recover, max_errors=max_errors)
+        self.source = iter(tokens)
+        self.window = window
+        self.exhausted = False
+        self.last_token = None
+        self.lexical_errors = []
+
+    def fill(self, count):
+        """Reads tokens from the stream until the window has count of them"""
+        tokens = self.tokens
+        if len(tokens) < count:
+            for token in self.source:
+                if token.type == "Error":
+                    self.lexical_errors.append(token)
+                    continue
+                tokens.append(token)
+                if len(tokens) >= count:
+                    break
+            else:
+                self.exhausted = True
+            if tokens:
+                self.last_token = tokens[-1]
+        if self.exhausted and self.last_token is not None:
+            last = self.last_token
+            self.end_token = Token(
+                "EOF", "", last.lineno, last.lexpos + len(last.value)
             )
-        return node
-
-    def factor(self):
-        node = self.component()
-        while self.current_token and self.current_token.type == "POW":
-            token = self.current_token
-            self.eat("POW")
-            node = Node(
-                name=token.type, value=token.value, children=[node, self.component()]
+        self.skip_to(self.current_token_index)
+
+    def release(self):
+        """Drops the tokens before the current one"""
+        del self.tokens[: self.current_token_index]
+        self.current_token_index = 0
+
+    def attempt(self, parse):
+        """
+        Returns parse(), run from the current token again with more tokens
+        read while it reaches the end of the window before the stream ends.
+        """
+        start = self.current_token_index
+        errors = len(self.errors)
+        if not self.exhausted:
+            self.fill(self.current_token_index + self.window)
+        while True:
+            try:
+                result = parse()
+                error = None
+            except ParseError as parse_error:
+                result = None
+                error = parse_error
+            if self.exhausted or not self.reached_end(errors):
+                if error is not None:
+                    raise error
+                return result
+            del self.errors[errors:]
+            self.fill(len(self.tokens) * 2)
+            self.skip_to(start)
+
+    def reached_end(self, errors):
+        """Whether the last parse looked at the end of the window"""
+        if self.current_token_index < len(self.tokens):
+            return False
+        if len(self.errors) > self.max_errors and len(self.errors) > errors:
+            # Stopping at the error limit skips to the end; what counts is
+            # where the error that reached the limit was
+            return self.errors[-1].token_type == "EOF"
+        return True
+
+    def declaration(self):
+        try:
+            return [self.declaration_statement()]
+        except ParseError as error:
+            if not self.recover:
+                raise
+            self.report(error)
+            self.synchronize()
+            return []
+
+    def statements(self):
+        """Yields the declarations and sentences of main as they are parsed"""
+        self.fill(self.window)
+        self.attempt(lambda: (self.expect("MAIN"), self.expect("LBRACE")))
+        in_declarations = True
+        while len(self.errors) <= self.max_errors:
+            self.release()
+            if not self.exhausted:
+                self.fill(self.window)
+            token_type = self.current_token.type
+            if token_type == "RBRACE":
+                self.attempt(lambda: self.expect("RBRACE"))
+                return
+            if in_declarations and token_type in ("INT", "DOUBLE", "FLOAT"):
+                nodes = self.attempt(self.declaration)
+            else:
+                in_declarations = False
+                nodes = self.attempt(lambda: self.sentences(True))
+                if not nodes and self.current_token.type == "EOF":
+                    self.expect("RBRACE")
+                    return
+            yield from nodes
+
+
+class ParserSession:
+    """
+    Keeps the tree of a text up to date while it is edited.
+
+    The text is lexed by a LexerSession, which keeps the tokens of the
+    lines an edit does not reach. Every sentence parsed without errors is
+    kept by the index of its first token, and after an edit the ones made
+    of unchanged tokens are reused, so only the sentences the edit touches
+    and the blocks around them are parsed again. The tree and the errors
+    are the same a full parse of the text gives.
+    """
+
+    def __init__(self, text: str = "", max_errors=MAX_SYNTAX_ERRORS):
+        self.lexer = LexerSession(text)
+        self.max_errors = max_errors
+        self.tokens = []
+        self.reusable = {}
+        self.reparse()
+
+    def edit(self, first_line: int, last_line: int, text: str):
+        """
+        Replaces a range of lines with new text, like LexerSession.edit,
+        and updates the tree.
+
+        Returns:
+            int: The number of sentences parsed without errors, the rest
+            were reused or have errors
+        """
+        with gc_paused():
+            self.lexer.edit(first_line, last_line, text)
+            return self.reparse()
+
+    def reparse(self):
+        old_tokens = self.tokens
+        tokens, self.lexical_errors = self.lexer.get_lexical_analysis()
+        # The lexer session gives back the same Token objects for the lines
+        # it did not lex again, so the unchanged tokens at the start and at
+        # the end are found by identity.
+        unchanged_start = next(
+            compress(count(), map(is_not, old_tokens, tokens)),
+            min(len(old_tokens), len(tokens)),
+        )
+        unchanged_end = next(
+            compress(count(), map(is_not, reversed(old_tokens), reversed(tokens))),
+            min(len(old_tokens), len(tokens)),
+        )
+        unchanged_end = min(
+            unchanged_end, min(len(old_tokens), len(tokens)) - unchanged_start
+        )
+
+        # A sentence is parsed from its own tokens and the one after it, so
+        # it is reused if those are all before the edit or all after it.
+        shift = len(tokens) - len(old_tokens)
+        edit_end = len(old_tokens) - unchanged_end
+        if shift:
+            reusable = {
+                first: sentence
+                for first, sentence in self.reusable.items()
+                if sentence[1] + 1 < unchanged_start
+            }
+            reusable.update(
+                (first + shift, (node, last + shift))
+                for first, (node, last) in self.reusable.items()
+                if first >= edit_end
             )
-        return node
-
-    def component(self):
-        if self.current_token.type == "LPAREN":
-            self.eat("LPAREN")
-            node = self.expression()
-            self.eat("RPAREN")
-            return node
-        elif self.current_token.type in [
-            "INTEGER_NUMBER",
-            "REAL_NUMBER",
-            "NEGATIVE_INTEGER_NUMBER",
-            "NEGATIVE_REAL_NUMBER",
-        ]:
-            value = self.current_token.value
-            self.eat(self.current_token.type)
-            return Node(name="Number", value=value)
-        elif self.current_token.type == "IDENTIFIER":
-            identifier = self.current_token.value
-            self.eat("IDENTIFIER")
-            return Node(name="Identifier", value=identifier)
         else:
-            raise Exception(f"Unexpected token {self.current_token.type}")
-
-    def render_tree(self, ast):
-        tree_str = ""
-        for pre, _, node in RenderTree(ast):
-            tree_str += "%s%s\n" % (pre, node)
-        return tree_str
+            reusable = {
+                first: sentence
+                for first, sentence in self.reusable.items()
+                if sentence[1] + 1 < unchanged_start or first >= edit_end
+            }
+        reused = len(reusable)
+
+        parser = Parser(
+            tokens, recover=True, max_errors=self.max_errors, reusable=reusable
+        )
+        self.ast = parser.parse()
+        self.errors = parser.errors
+        self.tokens = tokens
+        self.reusable = reusable
+        return len(reusable) - reused
 
 
 # Example usage
 if __name__ == "__main__":
+    import argparse
     import sys
     from pathlib import Path
-    from anytree.exporter import DotExporter
-    from lexer import get_lexical_analysis
-
-    args = sys.argv
-    if len(args) < 2:
-        print("No arguments provided")
-    elif len(args) > 2:
-        print("Bad arguments")
+    from ast_render import render_dot, render_json
+    from compile_cache import CompileCache, compile_file
+    from lexer import get_lexical_analysis, iter_tokens
+    from parser_profile import RuleProfiler
+
+    arg_parser = argparse.ArgumentParser(description="Parses a source file")
+    arg_parser.add_argument("file", type=Path, help="Source to parse")
+    arg_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print every sentence as soon as it is parsed, in bounded memory",
+    )
+    arg_parser.add_argument(
+        "--no-cache", action="store_true", help="Compile the file again"
+    )
+    arg_parser.add_argument(
+        "--dot", type=Path, default=Path("ast.dot"), help="DOT file of the tree"
+    )
+    arg_parser.add_argument("--no-dot", action="store_true", help="Skip the DOT file")
+    arg_parser.add_argument("--json", type=Path, help="JSON file of the tree")
+    arg_parser.add_argument(
+        "--max-depth", type=int, help="Leave out the nodes deeper than this"
+    )
+    arg_parser.add_argument(
+        "--max-nodes", type=int, help="Stop every output after this many nodes"
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Parse without the cache and print the time spent in every rule",
+    )
+    arg_parser.add_argument(
+        "--profile-json", type=Path, help="JSON file of the profile"
+    )
+    arg_parser.add_argument(
+        "--flamegraph", type=Path, help="Collapsed stacks file of the profile"
+    )
+    args = arg_parser.parse_args()
+    limits = {"max_depth": args.max_depth, "max_nodes": args.max_nodes}
+    profiling = args.profile or args.profile_json or args.flamegraph
+    profiler = None
+
+    file_path = args.file
+    if not file_path.exists():
+        print("File does not exist")
+    elif args.stream:
+        parser = StreamingParser(iter_tokens(file_path), recover=True)
+        if profiling:
+            profiler = RuleProfiler(parser)
+        for node in parser.statements():
+            render_text(node, sys.stdout, **limits)
+            print()
+        for error in parser.lexical_errors:
+            print(f"Line {error.lineno}, column {error.lexpos}: {error.value}")
+        for error in parser.errors:
+            print(f"Line {error.lineno}, column {error.lexpos}: {error}")
+    elif profiling:
+        tkns, errs = get_lexical_analysis(file_path)
+        for error in errs:
+            print(f"Line {error.lineno}, column {error.lexpos}: {error.value}")
+        if not errs:
+            parser = Parser(tkns, recover=True)
+            profiler = RuleProfiler(parser)
+            parser.parse()
+            for error in parser.errors:
+                print(f"Line {error.lineno}, column {error.lexpos}: {error}")
     else:
-        file_path = Path(args[1])
-        if not file_path.exists():
-            print("File does not exist")
-        else:
-            tkns, errs = get_lexical_analysis(file_path)
-
-            parser = Parser(tkns)
-            ast = parser.parse()
-
-            # Render the tree as a string
-            tree_str = parser.render_tree(ast)
-
-            print(tree_str)
-
-            # Optionally, export the tree to a file (e.g., a dot file for visualization)
-            DotExporter(ast).to_dotfile("ast.dot")
+        # An unchanged file is read back from the compile cache
+        tkns, errs, ast, syntax_errors = compile_file(
+            file_path, cache=None if args.no_cache else CompileCache()
+        )
+        for error in errs:
+            print(f"Line {error.lineno}, column {error.lexpos}: {error.value}")
+        for error in syntax_errors:
+            print(f"Line {error.lineno}, column {error.lexpos}: {error}")
+
+        if ast is not None:
+            root = ast.root_view()
+            render_text(root, sys.stdout, **limits)
+
+            if not args.no_dot:
+                with open(args.dot, "w", encoding="utf-8") as f:
+                    render_dot(root, f, **limits)
+            if args.json is not None:
+                with open(args.json, "w", encoding="utf-8") as f:
+                    render_json(root, f, **limits)
+
+    if profiler is not None:
+        print(profiler.summary())
+        if args.profile_json is not None:
+            with open(args.profile_json, "w", encoding="utf-8") as f:
+                profiler.write_json(f)
+        if args.flamegraph is not None:
+            with open(args.flamegraph, "w", encoding="utf-8") as f:
+                profiler.write_collapsed(f)
@@ -0,0 +1,245 @@
+"""
+Semantic analysis of the tree of a program:
+
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    for error in analyzer.errors:
+        print(f"Line {error.lineno}, column {error.lexpos}: {error}")
+
+It checks that every variable is declared before it is used, also by cin,
+and that the types of assignments and expressions agree: a value may be
+assigned to a variable of its type or a wider one (int, float, double),
+% takes ints and arithmetic takes no booleans. The type of every node is
+computed once and kept in an array parallel to the arena.
+
+The AstArena adds every node after its children and in the order of the
+source, so the analysis is a single loop over the node indexes, the
+operands of every operator already typed when it is reached. Only the
+nodes reachable from the root are checked: a parser that recovers from
+errors leaves the nodes of the sentences it drops in the arena. Every
+node kind has its handler in a table, looked up with the kind code.
+"""
+
+from array import array
+import io
+
+from ast_arena import (
+    ASSIGNMENT,
+    IDENTIFIER,
+    INPUT,
+    NODE_KIND_CODES,
+    NODE_KINDS,
+    NO_NODE,
+    NUMBER,
+    VARIABLE_DECLARATION,
+    AstArena,
+    NodeView,
+)
+from ast_render import render_text
+from symbol_table import SymbolTable
+
+# Types of the nodes, the numeric ones from the narrowest to the widest
+NO_TYPE, INT, FLOAT, DOUBLE, BOOL, ERROR = range(6)
+TYPE_NAMES = (None, "int", "float", "double", "bool", "error")
+TYPE_CODES = {"int": INT, "float": FLOAT, "double": DOUBLE}
+
+ARITHMETIC = tuple(
+    NODE_KIND_CODES[kind] for kind in ("PLUS", "MINUS", "TIMES", "DIVIDE", "MOD", "POW")
+)
+MOD = NODE_KIND_CODES["MOD"]
+COMPARISONS = tuple(
+    NODE_KIND_CODES[kind] for kind in ("LT", "LE", "GT", "GE", "EQ", "NE", "AND", "OR")
+)
+
+
+class SemanticError(Exception):
+    """A semantic error, at the line and column of the node it was found at"""
+
+    def __init__(self, message, lineno, lexpos):
+        super().__init__(message)
+        self.message = message
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __reduce__(self):
+        return (SemanticError, (self.message, self.lineno, self.lexpos))
+
+    def as_dict(self):
+        return {
+            "type": "SemanticError",
+            "value": self.message,
+            "lineno": self.lineno,
+            "lexpos": self.lexpos,
+        }
+
+
+class SemanticAnalyzer:
+    """
+    Checks the tree of a program, declaring its variables in a
+    SymbolTable. After analyze, types holds the type code of every node
+    and errors the semantic errors, in the order of the source.
+    """
+
+    def __init__(self, ast: AstArena):
+        self.ast = ast
+        self.symbols = SymbolTable()
+        self.errors = []
+        self.types = array("B", bytes(len(ast)))
+        # Identifiers below this index are the names being declared
+        self.declarations_end = 0
+
+    def handlers(self):
+        """The handler of every node kind, indexed by the kind code"""
+        table = [None] * len(NODE_KINDS)
+        table[VARIABLE_DECLARATION] = self.variable_declaration
+        table[IDENTIFIER] = self.identifier
+        table[NUMBER] = self.number
+        table[ASSIGNMENT] = self.assignment
+        table[INPUT] = self.input
+        for kind in ARITHMETIC:
+            table[kind] = self.arithmetic
+        for kind in COMPARISONS:
+            table[kind] = self.comparison
+        return table
+
+    def analyze(self):
+        """
+        Returns:
+            array: The type code of every node, NO_TYPE for sentences
+        """
+        ast = self.ast
+        if ast.root == NO_NODE:
+            return self.types
+        # The declarations come first in main, so do their nodes
+        kinds = ast.kinds
+        for child in ast.children(ast.root):
+            if kinds[child] != VARIABLE_DECLARATION:
+                break
+            self.declarations_end = child + 1
+
+        reachable = bytearray(len(kinds))
+        for node, _ in ast.preorder():
+            reachable[node] = 1
+        handlers = self.handlers()
+        for index, kind in enumerate(kinds):
+            handler = handlers[kind]
+            if handler is not None and reachable[index]:
+                handler(index)
+        return self.types
+
+    def report(self, message, index):
+        lineno, lexpos, _, _ = self.ast.span(index)
+        self.errors.append(SemanticError(message, lineno, lexpos))
+
+    def variable_declaration(self, index):
+        ast = self.ast
+        type = ast.value(index)
+        for identifier in ast.children(index):
+            name = ast.value(identifier)
+            lineno, lexpos, _, _ = ast.span(identifier)
+            previous = self.symbols.declare(name, type, lineno, lexpos)
+            if previous is not None:
+                self.report(
+                    f"Variable {name} is already declared on line {previous.lineno}",
+                    identifier,
+                )
+            self.types[identifier] = TYPE_CODES[type]
+
+    def identifier(self, index):
+        if index < self.declarations_end:
+            return
+        ast = self.ast
+        name = ast.value(index)
+        lineno, lexpos, _, _ = ast.span(index)
+        symbol = self.symbols.use(name, lineno, lexpos)
+        if symbol is None:
+            self.report(f"Variable {name} is not declared", index)
+            self.types[index] = ERROR
+        else:
+            self.types[index] = TYPE_CODES[symbol.type]
+
+    def number(self, index):
+        self.types[index] = FLOAT if self.ast.is_real(index) else INT
+
+    def assignment(self, index):
+        first_children = self.ast.first_children
+        target = first_children[index]
+        expression = self.ast.next_siblings[target]
+        target_type = self.types[target]
+        value_type = self.types[expression]
+        if target_type == ERROR or value_type == ERROR:
+            return
+        if value_type == BOOL or value_type > target_type:
+            name = self.ast.value(target)
+            self.report(
+                f"Cannot assign a {TYPE_NAMES[value_type]} value to {name}, "
+                f"a {TYPE_NAMES[target_type]}",
+                index,
+            )
+
+    def input(self, index):
+        name = self.ast.target(index)
+        target = self.ast.input_target(index)
+        lineno, lexpos, _, _ = self.ast.span(target)
+        symbol = self.symbols.use(name, lineno, lexpos)
+        if symbol is None:
+            self.report(f"Variable {name} read by cin is not declared", target)
+            self.types[target] = ERROR
+        else:
+            self.types[target] = TYPE_CODES[symbol.type]
+
+    def arithmetic(self, index):
+        types = self.types
+        left = self.ast.first_children[index]
+        left_type = types[left]
+        right_type = types[self.ast.next_siblings[left]]
+        if left_type == ERROR or right_type == ERROR:
+            types[index] = ERROR
+        elif left_type == BOOL or right_type == BOOL:
+            self.report(
+                f"Operator {self.ast.value(index)} takes numbers, not bool", index
+            )
+            types[index] = ERROR
+        elif self.ast.kinds[index] == MOD and (left_type != INT or right_type != INT):
+            wider = max(left_type, right_type)
+            self.report(f"Operator % takes ints, not {TYPE_NAMES[wider]}", index)
+            types[index] = ERROR
+        else:
+            types[index] = max(left_type, right_type)
+
+    def comparison(self, index):
+        # A comparison is a bool whatever its operands, so an error in them
+        # is not reported again by the sentence around it
+        self.types[index] = BOOL
+
+    def type_name(self, index):
+        return TYPE_NAMES[self.types[index]]
+
+    def render_tree(self, max_nodes=None):
+        """The tree as text with the type of every expression"""
+        stream = io.StringIO()
+        render_text(TypedView(self, self.ast.root), stream, max_nodes=max_nodes)
+        return stream.getvalue()
+
+
+class TypedView(NodeView):
+    """A NodeView printed with the type the analyzer gave its node"""
+
+    __slots__ = ("analyzer",)
+
+    def __init__(self, analyzer: SemanticAnalyzer, index: int):
+        super().__init__(analyzer.ast, index)
+        self.analyzer = analyzer
+
+    @property
+    def children(self):
+        analyzer = self.analyzer
+        return tuple(
+            TypedView(analyzer, child) for child in self.arena.children(self.index)
+        )
+
+    def __str__(self):
+        type = self.analyzer.type_name(self.index)
+        if type is None:
+            return super().__str__()
+        return f"{super().__str__()} : {type}"
@@ -0,0 +1,157 @@
+"""
+Generator of synthetic programs in the language of the compiler, used to
+benchmark it with sources of any size:
+
+    python source_generator.py <size, e.g. 64KB or 1GB> [--seed N] > file
+"""
+
+import random
+import re
+
+TYPES = ("int", "float", "double")
+RELATIONAL_OPERATORS = ("<", "<=", ">", ">=", "==", "!=")
+ARITHMETIC_OPERATORS = ("+", "-", "*", "/", "%", "^")
+INVALID_CHARACTERS = ("@", "#", "$", "&", "?", "ñ", "~")
+WORDS = ("valor", "suma", "total", "contador", "indice", "dato", "resultado")
+
+
+def parse_size(size: str):
+    """Parses sizes like 512, 1KB, 16MB or 1GB into bytes"""
+    match = re.fullmatch(r"(\d+)\s*([KMG]?)B?", size.strip().upper())
+    if match is None:
+        raise ValueError(f"Invalid size {size}")
+    number, unit = match.groups()
+    return int(number) * 1024 ** " KMG".index(unit or " ")
+
+
+class SourceGenerator:
+    """
+    Writes a random program made of declarations, assignments, if/else,
+    while and do-while blocks, cin and cout sentences and comments.
+
+    With invalid_rate 0 the program has no lexical nor syntax errors,
+    otherwise about that fraction of the sentences get an invalid
+    character.
+    """
+
+    def __init__(self, seed=0, invalid_rate=0.0, max_depth=3):
+        self.random = random.Random(seed)
+        self.invalid_rate = invalid_rate
+        self.max_depth = max_depth
+        self.variables = []
+
+    def write(self, stream, size: int):
+        """Writes a program of about size bytes (at least a few) to stream"""
+        written = stream.write("main {\n")
+        for _ in range(self.random.randint(1, 4)):
+            written += stream.write(self.declaration())
+        while written < size - 2:
+            written += stream.write(self.sentence(1))
+        stream.write("}\n")
+
+    def declaration(self):
+        names = []
+        for _ in range(self.random.randint(1, 4)):
+            name = self.identifier()
+            self.variables.append(name)
+            names.append(name)
+        return f"    {self.random.choice(TYPES)} {', '.join(names)};\n"
+
+    def identifier(self):
+        return f"{self.random.choice(WORDS)}_{self.random.choice(WORDS)}"
+
+    def variable(self):
+        return self.random.choice(self.variables)
+
+    def number(self):
+        if self.random.random() < 0.3:
+            return f"{self.random.randint(0, 999)}.{self.random.randint(0, 99)}"
+        return str(self.random.randint(0, 9999))
+
+    def operand(self, depth):
+        choice = self.random.random()
+        if choice < 0.45:
+            return self.variable()
+        if choice < 0.85 or depth > self.max_depth:
+            return self.number()
+        return f"({self.expression(depth + 1)})"
+
+    def expression(self, depth=1):
+        text = self.operand(depth)
+        for _ in range(self.random.randint(0, 3)):
+            operator = self.random.choice(ARITHMETIC_OPERATORS)
+            operand = self.operand(depth)
+            # The lexer folds "-" into a number that follows anything but
+            # another number, so keep subtractions valid for the parser
+            if operator == "-" and operand[0].isdigit() and not text[-1].isdigit():
+                operand = f"({operand})"
+            text += f" {operator} {operand}"
+        return text
+
+    def condition(self, depth):
+        text = f"{self.expression(depth)} {self.random.choice(RELATIONAL_OPERATORS)} "
+        text += self.expression(depth)
+        if self.random.random() < 0.2:
+            text = f"({text}) {self.random.choice(('and', 'or'))} ({self.condition(depth)})"
+        return text
+
+    def block(self, depth):
+        return "".join(
+            self.sentence(depth + 1) for _ in range(self.random.randint(1, 4))
+        )
+
+    def sentence(self, depth):
+        indent = "    " * depth
+        choice = self.random.random()
+        if depth <= self.max_depth and choice < 0.08:
+            text = f"{indent}if ({self.condition(depth)}) {{\n{self.block(depth)}"
+            if self.random.random() < 0.5:
+                text += f"{indent}}} else {{\n{self.block(depth)}"
+            text += f"{indent}}}\n"
+        elif depth <= self.max_depth and choice < 0.12:
+            text = f"{indent}while ({self.condition(depth)}) {{\n"
+            text += f"{self.block(depth)}{indent}}}\n"
+        elif depth <= self.max_depth and choice < 0.15:
+            text = f"{indent}do {{\n{self.block(depth)}"
+            text += f"{indent}}} while ({self.condition(depth)})\n"
+        elif choice < 0.2:
+            text = f"{indent}cin {self.variable()};\n"
+        elif choice < 0.25:
+            text = f"{indent}cout {self.expression()};\n"
+        elif choice < 0.3:
+            text = f"{indent}{self.variable()}{self.random.choice(('++', '--'))};\n"
+        elif choice < 0.34:
+            text = f"{indent}// {' '.join(self.random.sample(WORDS, 3))}\n"
+        elif choice < 0.36:
+            text = f"{indent}/* {self.random.choice(WORDS)}\n"
+            text += f"{indent}   {self.random.choice(WORDS)} */\n"
+        else:
+            text = f"{indent}{self.variable()} = {self.expression()};\n"
+
+        if self.invalid_rate and self.random.random() < self.invalid_rate:
+            position = self.random.randrange(len(indent), len(text) - 1)
+            invalid = self.random.choice(INVALID_CHARACTERS)
+            text = text[:position] + invalid + text[position:]
+        return text
+
+
+def write_source(stream, size: int, seed=0, invalid_rate=0.0):
+    """Writes a random program of about size bytes to stream"""
+    SourceGenerator(seed, invalid_rate).write(stream, size)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    arg_parser = argparse.ArgumentParser(description="Writes a random program")
+    arg_parser.add_argument("size", type=parse_size, help="e.g. 1KB, 16MB or 1GB")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--invalid-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of sentences with an invalid character",
+    )
+    args = arg_parser.parse_args()
+    write_source(sys.stdout, args.size, args.seed, args.invalid_rate)
@@ -0,0 +1,305 @@
+"""
+Symbol table of a program, kept in an open addressing hash table:
+
+    tokens, errors, ast, syntax_errors = compile_file(path)
+    analyzer = SemanticAnalyzer(ast)
+    analyzer.analyze()
+    print(analyzer.symbols.lookup("contador"))
+
+HashTable keeps its keys in one array of slots and finds a key by probing
+the slots that follow the one its hash points to (linear probing). It
+grows to twice its size before it is MAX_LOAD_FACTOR full, so the probes
+stay short and a lookup is O(1) however many variables are declared, and
+it counts the probes and collisions so their cost can be seen.
+
+SymbolTable adds scopes on top: a symbol declared in an inner scope hides
+the one of the same name outside, which is visible again once the scope
+is left.
+"""
+
+INITIAL_CAPACITY = 8
+MAX_LOAD_FACTOR = 0.7
+
+
+class HashTable:
+    """
+    Map of strings to values with open addressing and linear probing.
+
+    The capacity is always a power of two, so a hash becomes a slot with a
+    mask. Deleting moves back the keys probed past the deleted one, so no
+    tombstones are left and lookups never get longer than inserts made
+    them.
+    """
+
+    __slots__ = (
+        "keys",
+        "values",
+        "hashes",
+        "count",
+        "mask",
+        "inserts",
+        "insert_probes",
+        "lookup_probes",
+        "lookups",
+        "collisions",
+        "resizes",
+        "longest_probe",
+    )
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        size = INITIAL_CAPACITY
+        while size < capacity:
+            size *= 2
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.hashes = [0] * size
+        self.count = 0
+        self.mask = size - 1
+        # Slots looked at by every insert and lookup, and how many of the
+        # inserts found their first slot taken
+        self.inserts = 0
+        self.insert_probes = 0
+        self.lookup_probes = 0
+        self.lookups = 0
+        self.collisions = 0
+        self.resizes = 0
+        self.longest_probe = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return self.mask + 1
+
+    @property
+    def load_factor(self):
+        return self.count / (self.mask + 1)
+
+    def find(self, key):
+        """The slot of key, or of the empty slot it would go in"""
+        keys = self.keys
+        mask = self.mask
+        slot = hash(key) & mask
+        probes = 1
+        while keys[slot] is not None and keys[slot] != key:
+            slot = (slot + 1) & mask
+            probes += 1
+        return slot, probes
+
+    def get(self, key, default=None):
+        slot, probes = self.find(key)
+        self.lookups += 1
+        self.lookup_probes += probes
+        if self.keys[slot] is None:
+            return default
+        return self.values[slot]
+
+    def __contains__(self, key):
+        return self.keys[self.find(key)[0]] is not None
+
+    def put(self, key, value):
+        slot, probes = self.find(key)
+        if self.keys[slot] is not None:
+            self.values[slot] = value
+            return
+        if (self.count + 1) > MAX_LOAD_FACTOR * (self.mask + 1):
+            self.resize((self.mask + 1) * 2)
+            slot, probes = self.find(key)
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.hashes[slot] = hash(key)
+        self.count += 1
+        self.inserts += 1
+        self.insert_probes += probes
+        if probes > 1:
+            self.collisions += 1
+        if probes > self.longest_probe:
+            self.longest_probe = probes
+
+    def delete(self, key):
+        """Removes key, which must be in the table"""
+        keys = self.keys
+        values = self.values
+        hashes = self.hashes
+        mask = self.mask
+        slot, _ = self.find(key)
+        if keys[slot] is None:
+            raise KeyError(key)
+        # Move back every key of the run after the slot that can be found
+        # from its own slot without passing over the emptied one
+        empty = slot
+        slot = (slot + 1) & mask
+        while keys[slot] is not None:
+            home = hashes[slot] & mask
+            if (slot - home) & mask >= (slot - empty) & mask:
+                keys[empty] = keys[slot]
+                values[empty] = values[slot]
+                hashes[empty] = hashes[slot]
+                empty = slot
+            slot = (slot + 1) & mask
+        keys[empty] = None
+        values[empty] = None
+        self.count -= 1
+
+    def resize(self, capacity):
+        keys = self.keys
+        values = self.values
+        hashes = self.hashes
+        self.keys = new_keys = [None] * capacity
+        self.values = new_values = [None] * capacity
+        self.hashes = new_hashes = [0] * capacity
+        self.mask = mask = capacity - 1
+        for key, value, key_hash in zip(keys, values, hashes):
+            if key is not None:
+                slot = key_hash & mask
+                while new_keys[slot] is not None:
+                    slot = (slot + 1) & mask
+                new_keys[slot] = key
+                new_values[slot] = value
+                new_hashes[slot] = key_hash
+        self.resizes += 1
+
+    def items(self):
+        for key, value in zip(self.keys, self.values):
+            if key is not None:
+                yield key, value
+
+    def occupied(self):
+        """Yields (slot, key, value, probe length) of the used slots"""
+        mask = self.mask
+        for slot, key in enumerate(self.keys):
+            if key is not None:
+                distance = (slot - self.hashes[slot]) & mask
+                yield slot, key, self.values[slot], distance + 1
+
+    def stats(self):
+        probe_lengths = {}
+        for _, _, _, probes in self.occupied():
+            probe_lengths[probes] = probe_lengths.get(probes, 0) + 1
+        return {
+            "entries": self.count,
+            "capacity": self.mask + 1,
+            "load_factor": self.load_factor,
+            "collisions": self.collisions,
+            "resizes": self.resizes,
+            "longest_probe": self.longest_probe,
+            "mean_insert_probes": self.insert_probes / max(self.inserts, 1),
+            "mean_lookup_probes": self.lookup_probes / max(self.lookups, 1),
+            "probe_lengths": dict(sorted(probe_lengths.items())),
+        }
+
+
+class Symbol:
+    """A declared variable, with the lines it is used on"""
+
+    __slots__ = ("name", "type", "scope", "lineno", "lexpos", "lines", "shadowed")
+
+    def __init__(self, name, type, scope, lineno, lexpos, shadowed=None):
+        self.name = name
+        self.type = type
+        self.scope = scope
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.lines = []
+        # The symbol of the same name this one hides
+        self.shadowed = shadowed
+
+    def __repr__(self):
+        return f"Symbol({self.name}, {self.type}, {self.scope}, {self.lineno})"
+
+
+class SymbolTable:
+    """
+    Scoped symbol table. Scope 0 is open from the start, and every
+    enter_scope opens one inside the innermost.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.table = HashTable(capacity)
+        # Names declared in every open scope
+        self.scopes = [[]]
+        # Every symbol declared, in order, also the ones of closed scopes
+        self.symbols = []
+        # Declarations of names already declared in their scope
+        self.redeclarations = []
+        # Uses of names that are not declared, as (name, line, column)
+        self.undeclared = []
+
+    @property
+    def depth(self):
+        return len(self.scopes) - 1
+
+    def enter_scope(self):
+        self.scopes.append([])
+
+    def exit_scope(self):
+        """Closes the innermost scope, showing the symbols it hid again"""
+        table = self.table
+        for name in reversed(self.scopes.pop()):
+            # find, unlike get, leaves the lookup statistics alone
+            shadowed = table.values[table.find(name)[0]].shadowed
+            if shadowed is None:
+                table.delete(name)
+            else:
+                table.put(name, shadowed)
+
+    def declare(self, name, type, lineno=0, lexpos=0):
+        """
+        Declares name in the innermost scope.
+
+        Returns:
+            Symbol: None, or the symbol already declared there with the name
+        """
+        current = self.table.get(name)
+        if current is not None and current.scope == self.depth:
+            self.redeclarations.append((name, lineno, lexpos))
+            return current
+        symbol = Symbol(name, type, self.depth, lineno, lexpos, current)
+        self.table.put(name, symbol)
+        self.scopes[-1].append(name)
+        self.symbols.append(symbol)
+        return None
+
+    def lookup(self, name):
+        """The symbol name refers to in the innermost scope, None if none"""
+        return self.table.get(name)
+
+    def use(self, name, lineno, lexpos=0):
+        """Records a use of name, returning its symbol or None if undeclared"""
+        symbol = self.table.get(name)
+        if symbol is None:
+            self.undeclared.append((name, lineno, lexpos))
+        else:
+            symbol.lines.append(lineno)
+        return symbol
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        """The visible symbols, in the order of their slots"""
+        return (symbol for _, symbol in self.table.items())
+
+
+def table_lines(symbols: SymbolTable):
+    """The statistics of the table and then one line per used slot"""
+    stats = symbols.table.stats()
+    probe_lengths = ", ".join(
+        f"{probes}: {count}" for probes, count in stats["probe_lengths"].items()
+    )
+    lines = [
+        f"{stats['entries']} symbols in {stats['capacity']} buckets, "
+        f"load factor {stats['load_factor']:.2f}, {stats['resizes']} resizes",
+        f"{stats['collisions']} collisions, longest probe {stats['longest_probe']}, "
+        f"{stats['mean_lookup_probes']:.2f} probes per lookup",
+        f"Probe lengths: {probe_lengths}",
+        f"{'Bucket':>8}  {'Probes':>6}  {'Name':<20}{'Type':<8}{'Line':>6}  Used on",
+    ]
+    for slot, name, symbol, probes in symbols.table.occupied():
+        used = " ".join(f"{line}" for line in symbol.lines)
+        lines.append(
+            f"{slot:>8}  {probes:>6}  {name:<20}{symbol.type:<8}"
+            f"{symbol.lineno:>6}  {used}"
+        )
+    return lines
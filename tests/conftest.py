@@ -0,0 +1,22 @@
+import io
+import sys
+from pathlib import Path
+
+# The modules of the compiler import each other from src
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+SAMPLES = tuple(
+    SRC.parent / name for name in ("test_lexico.txt", "test_sintactico.txt")
+)
+
+
+def parse_arena(text):
+    """The AstArena of a program without lexical nor syntax errors"""
+    from ast_arena import AstArena
+    from lexer import regex_scanner
+    from parser_s import Parser
+
+    tokens, errors = regex_scanner(io.StringIO(text))
+    assert not errors
+    return Parser(tokens, AstArena()).parse()
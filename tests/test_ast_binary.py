@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from conftest import SAMPLES
+from ast_arena import NUMBER, AstArena
+from ast_binary import HEADER, FormatError, load_ast, write_ast
+from lexer import regex_scanner
+from parser_s import Parser
+from source_generator import write_source
+
+
+def parse_arena(text):
+    tokens, _ = regex_scanner(io.StringIO(text))
+    return Parser(tokens, AstArena(), recover=True).parse()
+
+
+def nodes(arena):
+    return [
+        (
+            arena.name(index),
+            arena.value(index),
+            list(arena.children(index)),
+            arena.span(index),
+            arena.literal(index) if arena.kinds[index] == NUMBER else None,
+        )
+        for index in range(len(arena))
+    ]
+
+
+@pytest.fixture(params=["sample", "generated"])
+def arena(request):
+    if request.param == "sample":
+        return parse_arena(SAMPLES[1].read_text(encoding="utf-8"))
+    source = io.StringIO()
+    write_source(source, 64 * 1024, seed=3)
+    return parse_arena(source.getvalue())
+
+
+def test_loaded_tree_is_the_written_one(arena, tmp_path):
+    path = tmp_path / "tree.ast"
+    with open(path, "wb") as f:
+        written = write_ast(arena, f)
+    assert written == path.stat().st_size
+
+    with load_ast(path) as loaded:
+        assert len(loaded) == len(arena)
+        assert loaded.root == arena.root
+        assert nodes(loaded) == nodes(arena)
+        assert loaded.render_tree() == arena.render_tree()
+
+
+def test_truncated_file_is_rejected(arena, tmp_path):
+    data = io.BytesIO()
+    write_ast(arena, data)
+    data = data.getvalue()
+    path = tmp_path / "tree.ast"
+    for size in (0, HEADER.size - 1, HEADER.size, len(data) // 2, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(FormatError):
+            load_ast(path).close()
+
+
+def test_bad_magic_and_version_are_rejected(arena, tmp_path):
+    data = io.BytesIO()
+    write_ast(arena, data)
+    data = data.getvalue()
+    path = tmp_path / "tree.ast"
+    path.write_bytes(b"NOPE" + data[4:])
+    with pytest.raises(FormatError, match="not an AST file"):
+        load_ast(path)
+    path.write_bytes(data[:4] + b"\xff\xff" + data[6:])
+    with pytest.raises(FormatError, match="AST format"):
+        load_ast(path)
@@ -0,0 +1,26 @@
+import gc
+
+import pytest
+
+from collector import gc_paused
+
+
+def test_gc_paused_restores_the_collector():
+    assert gc.isenabled()
+    with gc_paused():
+        assert not gc.isenabled()
+        with gc_paused():
+            assert not gc.isenabled()
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_gc_paused_keeps_a_disabled_collector_disabled():
+    gc.disable()
+    try:
+        with pytest.raises(ValueError):
+            with gc_paused():
+                raise ValueError
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
@@ -0,0 +1,23 @@
+import os
+import stat
+
+import pytest
+
+from compile_cache import CompileCache
+
+
+def test_cache_directory_is_created_private(tmp_path):
+    cache = CompileCache(tmp_path / "cache")
+    cache.put("ab" * 32, [1, 2, 3])
+    assert stat.S_IMODE((tmp_path / "cache").stat().st_mode) == 0o700
+    assert cache.get("ab" * 32) == [1, 2, 3]
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="needs POSIX permissions")
+def test_cache_is_not_read_from_a_directory_others_can_write(tmp_path):
+    cache = CompileCache(tmp_path / "cache")
+    cache.put("ab" * 32, [1, 2, 3])
+    (tmp_path / "cache").chmod(0o777)
+    assert cache.get("ab" * 32) is None
+    cache.put("cd" * 32, [4])
+    assert not cache.path("cd" * 32).exists()
@@ -0,0 +1,116 @@
+import pytest
+
+from conftest import parse_arena
+from intermediate_code import COPY, CodeGenerator
+from semantic import SemanticAnalyzer
+
+
+def generate(text):
+    ast = parse_arena(text)
+    analyzer = SemanticAnalyzer(ast)
+    analyzer.analyze()
+    assert not analyzer.errors
+    return CodeGenerator(ast).generate()
+
+
+def code_lines(text):
+    return list(generate(text).lines())
+
+
+def test_assignment_sets_the_target_in_the_last_instruction():
+    code = generate("main { int x, y; x = 1 + 2 * (y + 3); }")
+    assert list(code.lines()) == [
+        "    t1 = y + 3",
+        "    t1 = 2 * t1",
+        "    x = 1 + t1",
+    ]
+    # No copy of the last temporary is left behind
+    assert COPY not in code.operations
+    assert code.results[-1] == code.intern("x")
+
+
+def test_assignment_of_a_name_or_literal_is_a_copy():
+    code = generate("main { int x, y; x = y; y = 7; }")
+    assert list(code.lines()) == ["    x = y", "    y = 7"]
+    assert list(code.operations) == [COPY, COPY]
+
+
+def test_temporaries_are_negative_and_reused_once_read():
+    code = generate("main { int x, y; y = (x + 1) * (y - x) - (x * y); }")
+    assert list(code.lines()) == [
+        "    t1 = x + 1",
+        "    t2 = y - x",
+        "    t1 = t1 * t2",
+        "    t2 = x * y",
+        "    y = t1 - t2",
+    ]
+    assert list(code.results) == [-1, -2, -1, -2, code.intern("y")]
+    assert list(code.lefts[2:]) == [-1, code.intern("x"), -1]
+    assert list(code.rights[2:]) == [-2, code.intern("y"), -2]
+
+
+def test_nested_if_else_and_loops_lay_out_labels_and_jumps():
+    assert code_lines(
+        "main { int x;\n"
+        "if (x > 1) { if (x < 5) { x = 1; } else { x = 2; } }\n"
+        "else { while (x != 0) { x--; } }\n"
+        "do { x++; } while (x < 3)\n"
+        "}"
+    ) == [
+        "    t1 = x > 1",
+        "    ifFalse t1 goto L1",
+        "    t1 = x < 5",
+        "    ifFalse t1 goto L3",
+        "    x = 1",
+        "    goto L4",
+        "L3:",
+        "    x = 2",
+        "L4:",
+        "    goto L2",
+        "L1:",
+        "L5:",
+        "    t1 = x != 0",
+        "    ifFalse t1 goto L6",
+        "    x = x - 1",
+        "    goto L5",
+        "L6:",
+        "L2:",
+        "L7:",
+        "    x = x + 1",
+        "    t1 = x < 3",
+        "    if t1 goto L7",
+    ]
+
+
+def test_if_without_else_jumps_past_its_block():
+    assert code_lines("main { int x; if (x == 2) { cout x; } x = 0; }") == [
+        "    t1 = x == 2",
+        "    ifFalse t1 goto L1",
+        "    write x",
+        "L1:",
+        "    x = 0",
+    ]
+
+
+def test_input_and_output():
+    assert code_lines(
+        "main { int x; float y; cin x; cin y; cout x + y; cout 2; }"
+    ) == [
+        "    read x",
+        "    read y",
+        "    t1 = x + y",
+        "    write t1",
+        "    write 2",
+    ]
+
+
+@pytest.mark.parametrize(
+    "sentence, line",
+    [("x++;", "    x = x + 1"), ("x--;", "    x = x - 1")],
+)
+def test_increment_and_decrement(sentence, line):
+    assert code_lines(f"main {{ int x; {sentence} }}") == [line]
+
+
+def test_declarations_make_no_code():
+    assert code_lines("main { int x; float y, z; }") == []
@@ -0,0 +1,173 @@
+import io
+import random
+
+import pytest
+
+from conftest import SAMPLES
+import lexer
+from lexer import (
+    LexerSession,
+    find_shards,
+    get_lexical_analysis,
+    legacy_scanner,
+    regex_scanner,
+    sharded_scanner,
+    split_lines,
+)
+from source_generator import write_source
+
+
+def as_tuples(tokens):
+    return [(token.type, token.value, token.lineno, token.lexpos) for token in tokens]
+
+
+def assert_same_analysis(analysis, expected):
+    assert as_tuples(analysis[0]) == as_tuples(expected[0])
+    assert as_tuples(analysis[1]) == as_tuples(expected[1])
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=lambda sample: sample.name)
+def test_regex_engine_matches_legacy_on_samples(sample):
+    assert_same_analysis(
+        get_lexical_analysis(sample, "regex"), get_lexical_analysis(sample, "legacy")
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_regex_engine_matches_legacy_on_generated_sources(seed):
+    source = io.StringIO()
+    write_source(source, 16 * 1024, seed=seed, invalid_rate=0.05)
+    lines = source.getvalue().splitlines(keepends=True)
+    assert_same_analysis(regex_scanner(lines), legacy_scanner(lines))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "x=-3; y = 2 -3; z=(-4.5)",
+        "a - - 2 @ -1",
+        "/* open\n still open */ int x; // done\n",
+        "3.x 4. .5 ñ ٣",
+        "/* never closed\n",
+        "if\tcin >= 10 != 11 <= 2",
+    ],
+)
+def test_regex_engine_matches_legacy_on_edge_cases(text):
+    lines = io.StringIO(text).readlines()
+    assert_same_analysis(regex_scanner(lines), legacy_scanner(lines))
+
+
+SNIPPETS = (
+    "int x;",
+    "x = -3 - 2;",
+    "\n",
+    "\r\n",
+    "\r",
+    "/*",
+    "*/",
+    "//",
+    "@",
+    " ",
+    "-",
+    "4.5",
+    "cout y\n",
+)
+
+
+def random_edit(rng, lines):
+    """A random edit of lines, as LexerSession.edit takes it"""
+    first_line = rng.randint(1, len(lines) + 1)
+    last_line = rng.randint(first_line - 1, min(first_line + 3, len(lines)))
+    text = "".join(rng.choice(SNIPPETS) for _ in range(rng.randint(0, 6)))
+    return first_line, last_line, text
+
+
+def apply_edit(text, first_line, last_line, new_text):
+    """The text after an edit, spliced from whole lines like a file"""
+    lines = split_lines(text)
+    return "".join(
+        lines[: first_line - 1] + split_lines(new_text) + lines[last_line:]
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_lexer_session_matches_full_lexing_after_random_edits(seed):
+    rng = random.Random(seed)
+    text = SAMPLES[seed % len(SAMPLES)].read_text(encoding="utf-8")
+    session = LexerSession(text)
+    for _ in range(50):
+        first_line, last_line, new_text = random_edit(rng, session.lines)
+        session.edit(first_line, last_line, new_text)
+        text = apply_edit(text, first_line, last_line, new_text)
+        expected = regex_scanner(io.StringIO(text))
+        assert_same_analysis(session.get_lexical_analysis(), expected)
+        assert session.error_count == len(expected[1])
+
+
+def test_lexer_session_reads_line_breaks_like_a_file():
+    text = "int x;\r\nx = 1;\rcout x;\r\n"
+    session = LexerSession(text)
+    assert session.lines == ["int x;\n", "x = 1;\n", "cout x;\n"]
+    assert_same_analysis(
+        session.get_lexical_analysis(), regex_scanner(io.StringIO(text, newline=None))
+    )
+
+
+def with_shard_seek_at(text):
+    """
+    The text without its | marker, padded with comments so that
+    find_shards, splitting it in two, seeks to where the marker was and
+    ends the first shard with that line.
+    """
+    marker = text.index("|")
+    text = text.replace("|", "", 1)
+    # Two shards seek to len(text) // 2 + 1: a comment of n bytes in front
+    # moves the marker by n and that point by n / 2
+    tail = "\n//" + "p" * max(0, 2 * marker - len(text) - 2)
+    text += tail
+    head = "//" + "p" * (len(text) - 2 * marker - 1) + "\n"
+    return head + text
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "int x;\nx = 1234|5678;\ncout x;\n",
+        "x = 2 -|\n3 * 4;\ny = 1;\n",
+        "x = (-|\n4.5);\nz = x - -\n1;\n",
+        "x = (- @ $|\n4.5);\ny = $$ 2;\n",
+        "x = 1; /* open|\nstill\nopen */ y = -\n2;\n",
+        "int x;\r\nx = 12|3;\r\ny = 1;\rcout x;\r\n",
+    ],
+    ids=["number", "held-minus", "held-minus-real", "error-line", "comment", "crlf"],
+)
+@pytest.mark.parametrize("shard_min_bytes", [3, 4])
+def test_sharded_engine_matches_regex_engine(
+    text, shard_min_bytes, tmp_path, monkeypatch
+):
+    # find_shards also counts the lines in reads of this size
+    monkeypatch.setattr(lexer, "SHARD_MIN_BYTES", shard_min_bytes)
+    source = tmp_path / "source.txt"
+    text = with_shard_seek_at(text)
+    source.write_bytes(text.encode("utf-8"))
+    (_, _, end, _), (_, start, _, lineno) = find_shards(source, 2)
+    # The first shard ends with the line the marker was in
+    assert start == end == text.index("\n", len(text) // 2 + 1) + 1
+    assert lineno == len(split_lines(text[:start])) + 1
+    assert_same_analysis(
+        sharded_scanner(source, 2), get_lexical_analysis(source, "regex")
+    )
+
+
+@pytest.mark.parametrize("jobs", [2, 3, 5])
+def test_sharded_engine_matches_regex_engine_on_generated_sources(
+    jobs, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(lexer, "SHARD_MIN_BYTES", 4)
+    source = tmp_path / "source.txt"
+    with open(source, "w", encoding="utf-8") as f:
+        write_source(f, 4 * 1024, seed=jobs, invalid_rate=0.05)
+    assert len(find_shards(source, jobs)) == jobs
+    assert_same_analysis(
+        sharded_scanner(source, jobs), get_lexical_analysis(source, "regex")
+    )
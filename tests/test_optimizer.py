@@ -0,0 +1,190 @@
+import pytest
+
+from ast_arena import NUMBER
+from conftest import parse_arena
+from intermediate_code import CodeGenerator
+from optimizer import ConstantFolder
+from semantic import FLOAT, INT, SemanticAnalyzer
+
+DECLARATIONS = "main\n├── int\n│   └── x\n├── float\n│   └── f\n"
+
+
+def fold(text):
+    ast = parse_arena(text)
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    assert not analyzer.errors
+    folder = ConstantFolder(ast, types)
+    return folder, folder.fold()
+
+
+def assignments(*pairs):
+    """The tree lines of assignments of leaves, the last one closing main"""
+    lines = []
+    for number, (target, value) in enumerate(pairs, start=1):
+        last = number == len(pairs)
+        lines.append(f"{'└' if last else '├'}── =\n")
+        indent = "    " if last else "│   "
+        lines.append(f"{indent}├── {target}\n{indent}└── {value}\n")
+    return "".join(lines)
+
+
+def numbers(folded):
+    """The text and value of the Number nodes, as the arena keeps them"""
+    return [
+        (folded.value(index), folded.literal(index))
+        for index in range(len(folded))
+        if folded.kinds[index] == NUMBER
+    ]
+
+
+def test_int_division_and_modulo_truncate_toward_zero():
+    folder, folded = fold(
+        "main { int x; float f;\n"
+        "x = 7 / 2; x = 7 / -2; x = 7 % -2; x = -7 % 2; x = 1 / 4;\n"
+        "}"
+    )
+    assert folded.render_tree() == DECLARATIONS + assignments(
+        ("x", "3"), ("x", "-3"), ("x", "1"), ("x", "-1"), ("x", "0")
+    )
+    assert (folder.folded, folder.removed) == (5, 10)
+    assert numbers(folded) == [("3", 3), ("-3", -3), ("1", 1), ("-1", -1), ("0", 0)]
+
+
+def test_division_with_a_float_is_a_float():
+    folder, folded = fold("main { int x; float f;\nf = 7.0 / 2; f = 7 / 2.0;\n}")
+    assert folded.render_tree() == DECLARATIONS + assignments(
+        ("f", "3.5"), ("f", "3.5")
+    )
+    assert (folder.folded, folder.removed) == (2, 4)
+    assert numbers(folded) == [("3.5", 3.5), ("3.5", 3.5)]
+    assert all(type(value) is float for _, value in numbers(folded))
+
+
+def test_division_by_zero_is_left_to_run():
+    folder, folded = fold("main { int x; float f;\nx = 1 / 0; f = 1.0 / 0;\n}")
+    assert (folder.folded, folder.removed) == (0, 0)
+    assert folded.render_tree().count("/") == 2
+
+
+def test_times_zero_of_an_int_is_zero():
+    folder, folded = fold("main { int x; float f;\nx = x * 0; x = 0 * x;\n}")
+    assert folded.render_tree() == DECLARATIONS + assignments(("x", "0"), ("x", "0"))
+    assert (folder.simplified, folder.removed) == (2, 4)
+
+
+def test_times_zero_of_a_float_is_kept():
+    # It is not 0 when f is infinite or not a number
+    folder, folded = fold("main { int x; float f;\nf = f * 0;\n}")
+    assert folded.render_tree() == DECLARATIONS + (
+        "└── =\n    ├── f\n    └── *\n        ├── f\n        └── 0\n"
+    )
+    assert (folder.simplified, folder.removed) == (0, 0)
+
+
+def test_power_zero_is_one_of_the_type_of_the_base():
+    folder, folded = fold("main { int x; float f;\nx = x ^ 0; f = f ^ 0;\n}")
+    assert folded.render_tree() == DECLARATIONS + assignments(
+        ("x", "1"), ("f", "1.0")
+    )
+    assert (folder.simplified, folder.removed) == (2, 4)
+    assert numbers(folded) == [("1", 1), ("1.0", 1.0)]
+
+
+def test_plus_zero_and_times_one_leave_the_variable():
+    folder, folded = fold(
+        "main { int x; float f;\nx = x + 0; f = 0 + f; x = x / 1; f = f * 1;\n}"
+    )
+    assert folded.render_tree() == DECLARATIONS + assignments(
+        ("x", "x"), ("f", "f"), ("x", "x"), ("f", "f")
+    )
+    assert (folder.simplified, folder.removed) == (4, 8)
+
+
+def test_identity_that_changes_the_type_is_kept():
+    # x + 0.0 is a float, so it cannot become x
+    folder, folded = fold("main { int x; float f;\nf = x + 0.0; x = 0 - x;\n}")
+    assert folded.render_tree() == DECLARATIONS + (
+        "├── =\n"
+        "│   ├── f\n"
+        "│   └── +\n"
+        "│       ├── x\n"
+        "│       └── 0.0\n"
+        "└── =\n"
+        "    ├── x\n"
+        "    └── -\n"
+        "        ├── 0\n"
+        "        └── x\n"
+    )
+    assert (folder.simplified, folder.removed) == (0, 0)
+
+
+@pytest.mark.parametrize("condition, kept", [("1 < 2", "1"), ("2 < 1", "2")])
+def test_if_with_a_constant_condition_keeps_the_branch_it_takes(condition, kept):
+    folder, folded = fold(
+        f"main {{ int x; float f;\nif ({condition}) {{ x = 1; }} else {{ x = 2; }}\n}}"
+    )
+    assert folded.render_tree() == DECLARATIONS + assignments(("x", kept))
+    # The if, the 3 nodes of its condition, both branches and the 3 nodes
+    # of the assignment not taken
+    assert (folder.branches, folder.removed) == (1, 9)
+
+
+def test_if_without_else_and_a_false_condition_is_dropped():
+    folder, folded = fold(
+        "main { int x; float f;\nif (0) { x = 5; }\ncout x;\n}"
+    )
+    assert folded.render_tree() == DECLARATIONS + "└── cout\n    └── x\n"
+    assert (folder.branches, folder.removed) == (1, 6)
+
+
+def test_while_that_never_runs_is_dropped():
+    folder, folded = fold(
+        "main { int x; float f;\nwhile (1 > 2) { x++; }\ncout x;\n}"
+    )
+    assert folded.render_tree() == DECLARATIONS + "└── cout\n    └── x\n"
+    assert (folder.branches, folder.removed) == (1, 6)
+
+
+def test_while_with_a_true_condition_is_kept():
+    folder, folded = fold("main { int x; float f;\nwhile (1) { x++; }\n}")
+    assert folded.render_tree() == DECLARATIONS + (
+        "└── while\n    ├── 1\n    └── ++\n        └── x\n"
+    )
+    assert (folder.branches, folder.removed) == (0, 0)
+
+
+def test_do_while_that_runs_once_leaves_its_body():
+    folder, folded = fold(
+        "main { int x; float f;\ndo { x--; cout x; } while (0)\n}"
+    )
+    assert folded.render_tree() == DECLARATIONS + (
+        "├── --\n│   └── x\n└── cout\n    └── x\n"
+    )
+    assert (folder.branches, folder.removed) == (1, 2)
+
+
+def test_later_stages_read_the_values_of_the_folded_tree():
+    folder, folded = fold("main { int x; float f;\nf = 3 / 2.0; x = 2 * 3;\n}")
+    # The Number nodes of the new tree carry their values and types
+    assert numbers(folded) == [("1.5", 1.5), ("6", 6)]
+    analyzer = SemanticAnalyzer(folded)
+    types = analyzer.analyze()
+    assert analyzer.errors == []
+    literals = [index for index in range(len(folded)) if folded.kinds[index] == NUMBER]
+    assert [types[index] for index in literals] == [FLOAT, INT]
+    assert list(CodeGenerator(folded).generate().lines()) == [
+        "    f = 1.5",
+        "    x = 6",
+    ]
+
+
+def test_int_wider_than_64_bits_is_not_folded():
+    folder, folded = fold(
+        "main { int x; float f;\nx = 99999999999999999999 - 99999999999999999998;\n}"
+    )
+    assert folder.folded == 0
+    assert numbers(folded) == [
+        ("99999999999999999999", None),
+        ("99999999999999999998", None),
+    ]
@@ -0,0 +1,234 @@
+import io
+import random
+
+import pytest
+
+from ast_arena import AstArena
+from conftest import SAMPLES
+from lexer import iter_tokens, regex_scanner, split_lines
+from parser_s import Parser, ParserSession, StreamingParser
+from source_generator import write_source
+
+SNIPPETS = (
+    "int w;\n",
+    "float q, r;\n",
+    "x = 1 + 2 * (y - 3);\n",
+    "if (x > 1) {\n",
+    "} else {\n",
+    "}\n",
+    "while (x != 0) { x--; }\n",
+    "do {\n",
+    "} while (x < 3)\n",
+    "cout x;\n",
+    "cin y;\n",
+    "main {\n",
+    "z++",
+    "x",
+    "3",
+    "-",
+    "else",
+    "{",
+    "}",
+    ";",
+    "(",
+    ")",
+    "=",
+    "// note\n",
+)
+
+
+def shape(node):
+    """The kind, text and number of children of every node, in order"""
+    nodes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        nodes.append((type(node).__name__, str(node), len(node.children)))
+        stack.extend(reversed(node.children))
+    return nodes
+
+
+def error_list(errors):
+    return [(str(error), error.lineno, error.lexpos) for error in errors]
+
+
+def full_parse(text):
+    tokens, lexical_errors = regex_scanner(io.StringIO(text))
+    parser = Parser(tokens, recover=True)
+    return parser.parse(), parser.errors, tokens, lexical_errors
+
+
+def base_text(seed):
+    """A sample file, or a generated program with many nested blocks"""
+    if seed % 2:
+        return SAMPLES[1].read_text(encoding="utf-8")
+    source = io.StringIO()
+    write_source(source, 2048, seed=seed)
+    return source.getvalue()
+
+
+def random_edit(rng, line_count):
+    first_line = rng.randint(1, line_count + 1)
+    last_line = rng.randint(first_line - 1, min(first_line + 2, line_count))
+    text = "".join(rng.choice(SNIPPETS) for _ in range(rng.randint(0, 4)))
+    return first_line, last_line, text
+
+
+def apply_edit(text, first_line, last_line, new_text):
+    lines = split_lines(text)
+    return "".join(lines[: first_line - 1] + split_lines(new_text) + lines[last_line:])
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_parser_session_matches_full_parse_after_random_edits(seed):
+    rng = random.Random(seed)
+    text = base_text(seed)
+    session = ParserSession(text)
+    for _ in range(40):
+        first_line, last_line, new_text = random_edit(rng, len(session.lexer.lines))
+        session.edit(first_line, last_line, new_text)
+        text = apply_edit(text, first_line, last_line, new_text)
+        ast, errors, _, lexical_errors = full_parse(text)
+        assert shape(session.ast) == shape(ast)
+        assert error_list(session.errors) == error_list(errors)
+        assert len(session.lexical_errors) == len(lexical_errors)
+
+
+def test_parser_session_parses_again_a_sentence_followed_by_the_edit():
+    text = "main {\nif (x > 1) {\nx = 1;\n}\ny = 2;\n}\n"
+    session = ParserSession(text)
+    session.edit(5, 4, "else {\n}\n")
+    ast, errors, _, _ = full_parse(apply_edit(text, 5, 4, "else {\n}\n"))
+    assert shape(session.ast) == shape(ast)
+    assert error_list(session.errors) == error_list(errors) == []
+
+
+@pytest.mark.parametrize("window", (1, 2, 3, 7, 64))
+@pytest.mark.parametrize("seed", range(10))
+def test_streaming_parser_matches_full_parse(seed, window):
+    rng = random.Random(seed)
+    text = base_text(seed)
+    for _ in range(rng.randint(0, 8)):
+        line_count = len(split_lines(text))
+        text = apply_edit(text, *random_edit(rng, line_count))
+    ast, errors, _, lexical_errors = full_parse(text)
+
+    parser = StreamingParser(iter_tokens(io.StringIO(text)), recover=True, window=window)
+    statements = list(parser.statements())
+    assert [shape(node) for node in statements] == [
+        shape(node) for node in ast.children
+    ]
+    assert error_list(parser.errors) == error_list(errors)
+    assert len(parser.lexical_errors) == len(lexical_errors)
+
+
+def recover(text, max_errors=None):
+    """
+    The AstArena parsed from a text with recovery and its errors, checking
+    that it renders like the tree of slotted nodes of the same parse
+    """
+    tokens, lexical_errors = regex_scanner(io.StringIO(text))
+    assert not lexical_errors
+    options = {"recover": True}
+    if max_errors is not None:
+        options["max_errors"] = max_errors
+    parser = Parser(tokens, AstArena(), **options)
+    ast = parser.parse()
+    tree_parser = Parser(tokens, **options)
+    tree = tree_parser.parse()
+    assert ast.render_tree() == tree_parser.render_tree(tree)
+    assert error_list(parser.errors) == error_list(tree_parser.errors)
+    return ast, [(str(error), error.lineno, error.lexpos) for error in parser.errors]
+
+
+def test_recovery_skips_to_the_next_semicolon():
+    ast, errors = recover("main { int x;\nx = 1 +;\nx 5;\nx = 2;\n}")
+    assert errors == [
+        ("Unexpected token SEMICOLON", 2, 8),
+        ("Unexpected token INTEGER_NUMBER", 3, 3),
+    ]
+    assert ast.render_tree() == (
+        "main\n"
+        "├── int\n"
+        "│   └── x\n"
+        "└── =\n"
+        "    ├── x\n"
+        "    └── 2\n"
+    )
+
+
+def test_recovery_stops_at_a_closing_brace():
+    ast, errors = recover("main { int x;\nwhile (x > 1) { x 5 }\nx = 3;\n}")
+    assert errors == [("Unexpected token INTEGER_NUMBER", 2, 19)]
+    # The brace still closes the block, and the sentence after it is kept
+    assert ast.render_tree() == (
+        "main\n"
+        "├── int\n"
+        "│   └── x\n"
+        "├── while\n"
+        "│   └── >\n"
+        "│       ├── x\n"
+        "│       └── 1\n"
+        "└── =\n"
+        "    ├── x\n"
+        "    └── 3\n"
+    )
+
+
+@pytest.mark.parametrize("error_count", [1, 2, 3])
+def test_recovery_stops_at_max_errors(error_count):
+    text = "main { int x;\n" + "x 5;\n" * error_count + "x = 1;\n}"
+    ast, errors = recover(text, max_errors=2)
+    found = [
+        ("Unexpected token INTEGER_NUMBER", lineno, 3)
+        for lineno in range(2, 2 + min(error_count, 2))
+    ]
+    if error_count < 2:
+        assert errors == found
+        assert ast.render_tree().endswith(
+            "└── =\n    ├── x\n    └── 1\n"
+        )
+    else:
+        # Once there are max_errors errors the rest of the tokens is skipped
+        stopped = ("Too many errors, parsing stopped after 2", 3, 3)
+        assert errors == found + [stopped]
+        assert ast.render_tree() == "main\n└── int\n    └── x\n"
+
+
+def test_recovery_closes_the_blocks_open_at_the_end_of_the_input():
+    ast, errors = recover(
+        "main { int x;\nwhile (x > 1) {\nif (x < 2) {\nx = 1;\nx 5"
+    )
+    assert errors == [
+        ("Unexpected token INTEGER_NUMBER", 5, 3),
+        ("Unexpected end of input, expected RBRACE", 5, 4),
+        ("Unexpected token EOF, expected RBRACE", 5, 4),
+    ]
+    # The blocks keep the sentences parsed before the end
+    assert ast.render_tree() == (
+        "main\n"
+        "├── int\n"
+        "│   └── x\n"
+        "└── while\n"
+        "    ├── >\n"
+        "    │   ├── x\n"
+        "    │   └── 1\n"
+        "    └── if\n"
+        "        ├── <\n"
+        "        │   ├── x\n"
+        "        │   └── 2\n"
+        "        └── true_branch\n"
+        "            └── =\n"
+        "                ├── x\n"
+        "                └── 1\n"
+    )
+
+
+def test_recovery_of_a_program_with_no_tokens():
+    ast, errors = recover("")
+    assert errors == [
+        ("Unexpected token EOF, expected MAIN", 1, 1),
+        ("Unexpected token EOF, expected LBRACE", 1, 1),
+        ("Unexpected token EOF, expected RBRACE", 1, 1),
+    ]
+    assert ast.render_tree() == "main\n"
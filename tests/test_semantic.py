@@ -0,0 +1,114 @@
+import io
+
+from ast_arena import INPUT_TARGET, AstArena
+from conftest import parse_arena
+from lexer import regex_scanner
+from parser_s import Parser
+from semantic import BOOL, ERROR, INT, SemanticAnalyzer
+
+
+def analyze(ast):
+    analyzer = SemanticAnalyzer(ast)
+    types = analyzer.analyze()
+    errors = [(str(error), error.lineno, error.lexpos) for error in analyzer.errors]
+    return analyzer, types, errors
+
+
+def errors_of(text):
+    return analyze(parse_arena(text))[2]
+
+
+def test_use_of_an_undeclared_variable():
+    assert errors_of("main { int x;\nx = y + 1;\ncout y;\n}") == [
+        ("Variable y is not declared", 2, 5),
+        ("Variable y is not declared", 3, 6),
+    ]
+
+
+def test_redeclaration():
+    assert errors_of("main { int x;\nfloat x;\nint y, y;\n}") == [
+        ("Variable x is already declared on line 1", 2, 7),
+        ("Variable y is already declared on line 3", 3, 8),
+    ]
+
+
+def test_assignment_of_a_wider_type():
+    assert errors_of(
+        "main { int x; float f; double d;\n"
+        "x = f;\n"
+        "x = 2.5;\n"
+        "f = x;\n"
+        "d = f * x;\n"
+        "f = d;\n"
+        "}"
+    ) == [
+        ("Cannot assign a float value to x, a int", 2, 1),
+        ("Cannot assign a float value to x, a int", 3, 1),
+        ("Cannot assign a double value to f, a float", 6, 1),
+    ]
+
+
+def test_comparison_is_a_bool_whatever_its_operands():
+    analyzer, types, errors = analyze(
+        parse_arena(
+            "main { int x; float f;\n"
+            "x = f < 2;\n"
+            "x = (x < 1) + 2;\n"
+            "cout f >= x;\n"
+            "cout z == 1;\n"
+            "}"
+        )
+    )
+    # The undeclared z is reported once, not again by the comparison
+    assert errors == [
+        ("Cannot assign a bool value to x, a int", 2, 1),
+        ("Operator + takes numbers, not bool", 3, 5),
+        ("Variable z is not declared", 5, 6),
+    ]
+    assert analyzer.render_tree().splitlines()[-8:] == [
+        "├── cout",
+        "│   └── >= : bool",
+        "│       ├── f : float",
+        "│       └── x : int",
+        "└── cout",
+        "    └── == : bool",
+        "        ├── z : error",
+        "        └── 1 : int",
+    ]
+
+
+def test_modulo_takes_ints():
+    assert errors_of("main { int x; float f;\nx = x % 2;\nf = f % 2;\n}") == [
+        ("Operator % takes ints, not float", 3, 5)
+    ]
+
+
+def test_cin_of_an_undeclared_variable():
+    ast = parse_arena("main { int x;\ncin y;\ncin x;\n}")
+    _, types, errors = analyze(ast)
+    assert errors == [("Variable y read by cin is not declared", 2, 5)]
+    targets = [index for index, kind in enumerate(ast.kinds) if kind == INPUT_TARGET]
+    assert [types[target] for target in targets] == [ERROR, INT]
+
+
+def test_nodes_dropped_by_recovery_are_not_checked():
+    tokens, _ = regex_scanner(
+        io.StringIO("main { int x;\nif (x < 1 { y = 2; }\nx = z;\n}")
+    )
+    parser = Parser(tokens, AstArena(), recover=True)
+    ast = parser.parse()
+    assert len(parser.errors) == 1
+    analyzer, types, errors = analyze(ast)
+    # The if was dropped with its condition and block, x = z is in the tree
+    assert errors == [("Variable z is not declared", 3, 5)]
+    assert [symbol.name for symbol in analyzer.symbols] == ["x"]
+    assert analyzer.symbols.lookup("x").lines == [3]
+
+
+def test_types_of_expressions():
+    ast = parse_arena("main { int x;\nx = (x + 1) * 2;\ncout x > 1;\n}")
+    _, types, errors = analyze(ast)
+    assert errors == []
+    typed = {ast.value(index): types[index] for index, _ in ast.preorder()}
+    assert typed["*"] == typed["+"] == INT
+    assert typed[">"] == BOOL
@@ -0,0 +1,112 @@
+import pytest
+
+from symbol_table import MAX_LOAD_FACTOR, HashTable, SymbolTable
+
+# An int hashes to itself, so these fill slots 6, 7, 0 and 1 of a table
+# of 8: 14 and 22 collide with 6, and the run wraps past the last slot
+CLUSTER = (6, 14, 7, 22)
+
+
+def cluster_table():
+    table = HashTable()
+    for key in CLUSTER:
+        table.put(key, f"value {key}")
+    assert table.capacity == 8
+    assert [table.find(key)[0] for key in CLUSTER] == [6, 7, 0, 1]
+    return table
+
+
+@pytest.mark.parametrize("deleted", CLUSTER)
+def test_delete_keeps_the_rest_of_a_wrapped_cluster_findable(deleted):
+    table = cluster_table()
+    table.delete(deleted)
+    assert len(table) == len(CLUSTER) - 1
+    assert deleted not in table
+    assert table.get(deleted) is None
+    for key in CLUSTER:
+        if key != deleted:
+            assert table.get(key) == f"value {key}"
+            # No key is left further from its slot than it was
+            slot, probes = table.find(key)
+            assert probes == (slot - (key & table.mask)) % table.capacity + 1
+    # Every slot the keys moved out of is empty, nothing is left behind
+    assert sorted(key for key, _ in table.items()) == sorted(
+        key for key in CLUSTER if key != deleted
+    )
+
+
+def test_delete_moves_back_only_the_keys_it_can():
+    table = cluster_table()
+    table.delete(6)
+    # 14 and 22 move toward slot 6, 7 stays in its own slot
+    assert [table.find(key) for key in (14, 7, 22)] == [(6, 1), (7, 1), (0, 3)]
+
+
+def test_delete_of_a_missing_key_raises():
+    table = cluster_table()
+    with pytest.raises(KeyError):
+        table.delete(30)
+
+
+def test_resize_keeps_every_key():
+    table = HashTable()
+    names = [f"name{index}" for index in range(200)]
+    for index, name in enumerate(names):
+        table.put(name, index)
+    assert table.resizes == 6
+    assert table.capacity == 512
+    assert table.load_factor <= MAX_LOAD_FACTOR
+    assert len(table) == len(names)
+    assert all(table.get(name) == index for index, name in enumerate(names))
+
+
+def test_mean_insert_probes_does_not_grow_with_deletes():
+    table = cluster_table()
+    # 1 + 2 + 2 + 4 slots looked at by the inserts
+    assert table.stats()["mean_insert_probes"] == 9 / 4
+    table.delete(14)
+    table.delete(6)
+    assert table.stats()["mean_insert_probes"] == 9 / 4
+
+
+def test_exit_scope_shows_the_shadowed_symbols_again():
+    symbols = SymbolTable()
+    symbols.declare("x", "int", 1)
+    symbols.declare("y", "int", 1)
+    symbols.enter_scope()
+    symbols.declare("x", "float", 2)
+    symbols.declare("z", "float", 2)
+    symbols.enter_scope()
+    symbols.declare("x", "double", 3)
+    assert symbols.lookup("x").type == "double"
+    symbols.exit_scope()
+    assert symbols.lookup("x").type == "float"
+    assert symbols.lookup("z").type == "float"
+    symbols.exit_scope()
+    assert symbols.lookup("x").type == "int"
+    assert symbols.lookup("y").type == "int"
+    assert symbols.lookup("z") is None
+    assert len(symbols) == 2
+    assert len(symbols.symbols) == 5
+
+
+def test_exit_scope_is_not_counted_as_lookups():
+    symbols = SymbolTable()
+    symbols.declare("x", "int")
+    symbols.enter_scope()
+    symbols.declare("x", "float")
+    symbols.declare("y", "float")
+    lookups = symbols.table.lookups
+    lookup_probes = symbols.table.lookup_probes
+    symbols.exit_scope()
+    assert symbols.table.lookups == lookups
+    assert symbols.table.lookup_probes == lookup_probes
+
+
+def test_redeclaration_in_the_same_scope_is_recorded():
+    symbols = SymbolTable()
+    assert symbols.declare("x", "int", 1, 5) is None
+    first = symbols.lookup("x")
+    assert symbols.declare("x", "float", 2, 7) is first
+    assert symbols.redeclarations == [("x", 2, 7)]
+    assert symbols.lookup("x").type == "int"